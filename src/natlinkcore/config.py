@@ -11,6 +11,9 @@ import natlink
 class NoGoodConfigFoundException(natlink.NatError):
     pass
 
+# the load priorities of grammar modules (section [load priorities] of natlink.ini), in load order:
+LOAD_PRIORITIES = {'critical': 0, 'normal': 1, 'low': 2, 'lazy': 3}
+
 class LogLevel(IntEnum):
     CRITICAL = logging.CRITICAL
     FATAL = logging.FATAL
@@ -38,6 +41,37 @@ class NatlinkConfig:
 
         #defaults for DAP configuration
         self.dap_enabled,self.dap_port,self.dap_wait_for_debugger_attach_on_startup = False,0,False
+
+        # watch the directories for changed grammar files in a background thread (see filewatcher.py):
+        self.watch_directories = False
+        self.watch_interval = 1.0   # seconds, only for the polling watcher
+
+        # milliseconds of loading per begin callback or natlinktimer tick, 0: load everything at once:
+        self.load_budget_ms = 0
+
+        # keep a snapshot of the loaded modules in the natlink settings directory, for the next start:
+        self.warm_start = False
+
+        # at a user change, only unload and load the modules that differ between the users:
+        self.diff_on_user_changed = False
+
+        # import from the grammar directories via an indexed sys.meta_path finder, instead of adding them to sys.path:
+        self.grammar_finder = False
+
+        # compile the grammar files to bytecode in parallel worker processes before the startup load:
+        self.precompile = False
+
+        # keep the compiled grammars (natlinkutils.GrammarBase) on disk in the natlink settings directory:
+        self.grammar_cache = False
+
+        # optimize the grammars (natlinkutils.GrammarBase) before packing them, see gramoptimizer:
+        self.optimize_grammars = False
+
+        # log the grammars whose exported rules accept more phrases than this, see gramanalysis (0: no check):
+        self.max_grammar_phrases = 0
+
+        # module name (lower case) -> load priority, see LOAD_PRIORITIES (default 'normal'):
+        self.load_priorities: Dict[str, str] = {}
         
     def __repr__(self) -> str:
         return  f'NatlinkConfig(directories_by_user={self.directories_by_user}, ...)'
@@ -105,7 +139,14 @@ class NatlinkConfig:
                         continue
                     directories.append(directory_expanded)
 
-                ret.directories_by_user[''] =  directories 
+                ret.directories_by_user[''] =  directories
+            elif section == 'load priorities':
+                for name, priority in config[section].items():
+                    priority = priority.strip().lower()
+                    if priority not in LOAD_PRIORITIES:
+                        print(f'====Invalid input in configuration file "natlink.ini", section "load priorities":\n\tSkip name: {name}, priority: {priority}\n\tValid priorities are: {", ".join(LOAD_PRIORITIES)}')
+                        continue
+                    ret.load_priorities[name.lower()] = priority
         if config.has_section('settings'):
             settings = config['settings']
             level = settings.get('log_level')
@@ -116,6 +157,16 @@ class NatlinkConfig:
                                                               fallback=ret.load_on_begin_utterance)
             ret.load_on_startup = settings.getboolean('load_on_startup', fallback=ret.load_on_startup)
             ret.load_on_user_changed = settings.getboolean('load_on_user_changed', fallback=ret.load_on_user_changed)
+            ret.watch_directories = settings.getboolean('watch_directories', fallback=ret.watch_directories)
+            ret.watch_interval = settings.getfloat('watch_interval', fallback=ret.watch_interval)
+            ret.load_budget_ms = settings.getint('load_budget_ms', fallback=ret.load_budget_ms)
+            ret.warm_start = settings.getboolean('warm_start', fallback=ret.warm_start)
+            ret.diff_on_user_changed = settings.getboolean('diff_on_user_changed', fallback=ret.diff_on_user_changed)
+            ret.grammar_finder = settings.getboolean('grammar_finder', fallback=ret.grammar_finder)
+            ret.precompile = settings.getboolean('precompile', fallback=ret.precompile)
+            ret.grammar_cache = settings.getboolean('grammar_cache', fallback=ret.grammar_cache)
+            ret.optimize_grammars = settings.getboolean('optimize_grammars', fallback=ret.optimize_grammars)
+            ret.max_grammar_phrases = settings.getint('max_grammar_phrases', fallback=ret.max_grammar_phrases)
 
         #default to no dap enabled.
 
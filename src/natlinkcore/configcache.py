@@ -0,0 +1,80 @@
+"""a shared cache of parsed ini files, keyed on (path, mtime, size)
+
+Reading an ini file (via readwritefile, handling encodings and bom marks) and parsing it is
+done again only when the file changed. The cache is bounded (least recently used files are dropped),
+and counts its hits and misses.
+
+```
+from natlinkcore.configcache import config_cache
+Config = config_cache.get_config(filepath)
+value = Config.get(section, option, fallback='')
+```
+
+Note: the returned ConfigParser instance is shared, do not change it.
+"""
+#pylint:disable=C0115, C0116
+import configparser
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+from natlinkcore.readwritefile import ReadWriteFile
+
+class ConfigCache:
+    """LRU cache of ConfigParser instances, invalidated when the mtime or size of the file changes
+    """
+    def __init__(self, maxsize: int = 16):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        # normalized path -> (st_mtime_ns, st_size, text, ConfigParser instance)
+        self._entries: 'OrderedDict[str, Tuple[int, int, str, configparser.ConfigParser]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_entry(self, filepath: Any) -> Tuple[int, int, str, configparser.ConfigParser]:
+        key = os.path.normcase(os.path.abspath(filepath))
+        st = os.stat(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[:2] == (st.st_mtime_ns, st.st_size):
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry
+            self.misses += 1
+        rwfile = ReadWriteFile()
+        text = rwfile.readAnything(key)
+        Config = configparser.ConfigParser()
+        Config.read_string(text)
+        entry = (st.st_mtime_ns, st.st_size, text, Config)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def get_config(self, filepath: Any) -> configparser.ConfigParser:
+        """return the parsed ini file, read again only when it changed
+        """
+        return self._get_entry(filepath)[3]
+
+    def get_text(self, filepath: Any) -> str:
+        """return the (decoded) text of the ini file
+        """
+        return self._get_entry(filepath)[2]
+
+    def get_text_and_config(self, filepath: Any) -> Tuple[str, configparser.ConfigParser]:
+        entry = self._get_entry(filepath)
+        return entry[2], entry[3]
+
+    def info(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxsize': self.maxsize}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+# the instance shared by natlinkmain (loader), natlinkstatus, etc.:
+config_cache = ConfigCache()
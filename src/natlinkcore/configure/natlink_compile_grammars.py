@@ -0,0 +1,75 @@
+"""parse and pack the grammars of the Natlink directories in parallel, and report the time and size of each
+
+Use this to find the grammars that slow down the start of Natlink, and, with --cache, to fill the grammar cache
+before Dragon starts (with the setting grammar_cache on, GrammarBase.load then skips parsing and packing).
+"""
+import argparse
+import sys
+from pathlib import Path
+
+from natlinkcore.gramcompile import compile_grammars, compile_report, find_grammars
+
+def natlink_config():
+    """the config of natlink.ini, as the loader finds natlink.ini
+    """
+    from natlinkcore.configure.natlinkconfigfunctions import NatlinkConfig as ConfigFunctions
+    from natlinkcore.config import NatlinkConfig
+    config_file = Path(ConfigFunctions().natlinkconfig_path)/"natlink.ini"
+    return NatlinkConfig.from_first_found_file([str(config_file)])
+
+def grammar_paths(paths):
+    """the python and .gram files directly in the directories, and the files given
+    """
+    result = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            result.extend(sorted(p for p in path.iterdir() if p.suffix.lower() in ('.py', '.gram') and p.is_file()))
+        else:
+            result.append(path)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=
+        f"""parses and packs the grammars of the grammar files in the directories of natlink.ini
+        (the gramSpecs of the self.load calls that are constant) and of .gram files, in parallel worker
+        processes, and reports the parse and pack time and the size of each grammar, the slowest first.
+        for example, to fill the grammar cache with the grammars of one directory:
+        {sys.argv[0]} --cache C:\\Users\\me\\Documents\\UserDirectory
+        """)
+    parser.add_argument('paths', nargs='*', help='directories or files (.py, .gram) to compile (default: the directories of natlink.ini)')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='number of worker processes (default: number of cpus)')
+    parser.add_argument('-c', '--cache', action='store_true', help='store the grammars in the grammar cache of the natlink settings directory')
+    parser.add_argument('-o', '--optimize', action=argparse.BooleanOptionalAction, default=None,
+                        help='optimize the grammars before packing (default: the setting optimize_grammars with --cache, else no)')
+    parser.add_argument('-n', '--lines', type=int, default=0, help='report only the slowest grammars (default: all)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only print errors')
+
+    args = parser.parse_args()
+
+    try:
+        config = natlink_config() if not args.paths or (args.cache and args.optimize is None) else None
+        paths = grammar_paths(args.paths or config.directories)
+        sources, skipped = find_grammars(paths)
+        optimize = args.optimize if args.optimize is not None else bool(config and config.optimize_grammars)
+        cache_directory = None
+        if args.cache:
+            from natlinkcore.config import expand_natlink_settingsdir
+            cache_directory = Path(expand_natlink_settingsdir())/'grammarcache'
+        result = compile_grammars(sources, max_workers=args.workers, cache_directory=cache_directory, optimize=optimize)
+    except Exception as e:
+        print(e)
+        sys.exit(-1)
+    if args.quiet:
+        for name, message in result['errors'].items():
+            print(f'cannot compile grammar {name}: {message}')
+    else:
+        print(compile_report(result, max_lines=args.lines))
+        for name, reason in skipped.items():
+            print(f'skipped {name}: {reason}')
+        if cache_directory:
+            print(f'stored {len(result["results"]) - len(result["errors"])} grammars in "{cache_directory}"')
+    sys.exit(1 if result['errors'] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""compile the grammar files of the Natlink directories to bytecode, in parallel
+
+Run this after updating or regenerating grammar files (for example after a pip upgrade of a grammar package),
+so the next start of Dragon does not need to compile them.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+from natlinkcore.precompile import precompile
+
+def natlink_directories():
+    """the directories of natlink.ini (all users), as the loader finds natlink.ini
+    """
+    from natlinkcore.configure.natlinkconfigfunctions import NatlinkConfig as ConfigFunctions
+    from natlinkcore.config import NatlinkConfig
+    config_file = Path(ConfigFunctions().natlinkconfig_path)/"natlink.ini"
+    return NatlinkConfig.from_first_found_file([str(config_file)]).directories
+
+def grammar_files(directories):
+    """the python files directly in the directories, as the loader loads them
+    """
+    paths = []
+    for directory in directories:
+        paths.extend(sorted(p for p in Path(directory).glob('*.py') if p.is_file()))
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description=
+        f"""compiles the grammar files in the directories of natlink.ini to bytecode (__pycache__),
+        in parallel worker processes. Files with valid bytecode are skipped, unless --force is given.
+        for example, to compile the files of one directory with 4 workers:
+        {sys.argv[0]} --workers 4 C:\\Users\\me\\Documents\\UserDirectory
+        """)
+    parser.add_argument('directories', nargs='*', help='directories to compile (default: the directories of natlink.ini)')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='number of worker processes (default: number of cpus)')
+    parser.add_argument('-f', '--force', action='store_true', help='also compile files with valid bytecode')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only print errors')
+
+    args = parser.parse_args()
+
+    try:
+        directories = args.directories or natlink_directories()
+        paths = grammar_files(directories)
+        result = precompile(paths, max_workers=args.workers, force=args.force)
+    except Exception as e:
+        print(e)
+        sys.exit(-1)
+    for path, message in result['errors'].items():
+        print(f'cannot compile "{path}":\n{message}')
+    if not args.quiet:
+        print(f"compiled {result['compiled']} of {len(paths)} files in {len(directories)} directories "
+              f"({result['fresh']} up to date, {len(result['errors'])} errors) in {result['time']:.2f} seconds")
+    sys.exit(1 if result['errors'] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""watch the grammar directories for changed, added or removed python files
+
+A watcher runs in a background thread and collects the paths of the `.py` files that
+changed since the last call of `take_changes`. The loader (NatlinkMain.trigger_load) can then
+(re)load only those files, instead of calling stat() on every grammar module at every trigger.
+
+On Linux inotify is used; elsewhere (or when inotify is not available) a polling thread compares
+the (mtime, size) of the files in the watched directories at a fixed interval.
+
+```
+watcher = create_watcher(directories)
+watcher.start()
+...
+changed, overflow = watcher.take_changes()
+# overflow True means: changes may have been missed, do a full scan
+...
+watcher.stop()
+```
+"""
+#pylint:disable=C0115, C0116, R0902, W0703
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Set, Tuple, Optional
+
+# inotify constants, from <sys/inotify.h>:
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+              IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+event_header = struct.Struct('iIII')   # wd, mask, cookie, len
+
+
+class FileWatcher:
+    """base class of the watchers, keeps the set of changed files
+
+    Subclasses implement `_run`, which is executed in a daemon thread until `self._stop_event` is set.
+    """
+    def __init__(self, directories: Iterable[str]):
+        self.directories = [str(d) for d in directories]
+        self._changed: Set[Path] = set()
+        self._overflow = False
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.is_running():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name=self.__class__.__name__, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def mark_changed(self, path: Path) -> None:
+        with self._lock:
+            self._changed.add(path)
+
+    def mark_overflow(self) -> None:
+        """changes may have been missed, the caller should do a full scan
+        """
+        with self._lock:
+            self._overflow = True
+
+    def has_changes(self) -> bool:
+        return bool(self._changed) or self._overflow
+
+    def take_changes(self) -> Tuple[Set[Path], bool]:
+        """return the changed paths and the overflow flag, and start collecting anew
+        """
+        with self._lock:
+            changed, self._changed = self._changed, set()
+            overflow, self._overflow = self._overflow, False
+        return changed, overflow
+
+    def _run(self) -> None:
+        raise NotImplementedError
+
+
+class PollingWatcher(FileWatcher):
+    """compare (mtime, size) of the python files in the directories every `interval` seconds
+    """
+    def __init__(self, directories: Iterable[str], interval: float = 1.0):
+        super().__init__(directories)
+        self.interval = interval
+
+    @staticmethod
+    def _snapshot(directory: str) -> Dict[str, Tuple[int, int]]:
+        result = {}
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.endswith('.py') and entry.is_file():
+                    st = entry.stat()
+                    result[entry.name] = (st.st_mtime_ns, st.st_size)
+        return result
+
+    def _run(self) -> None:
+        snapshots: Dict[str, Dict[str, Tuple[int, int]]] = {}
+        for d in self.directories:
+            try:
+                snapshots[d] = self._snapshot(d)
+            except OSError:
+                snapshots[d] = {}
+        while not self._stop_event.wait(self.interval):
+            for d in self.directories:
+                try:
+                    new = self._snapshot(d)
+                except OSError:
+                    self.mark_overflow()
+                    continue
+                old = snapshots[d]
+                if new == old:
+                    continue
+                for name in set(old).symmetric_difference(new):
+                    self.mark_changed(Path(d)/name)
+                for name in set(old).intersection(new):
+                    if old[name] != new[name]:
+                        self.mark_changed(Path(d)/name)
+                snapshots[d] = new
+
+
+class InotifyWatcher(FileWatcher):
+    """use the Linux inotify interface (via ctypes), raises OSError when this is not available
+    """
+    def __init__(self, directories: Iterable[str]):
+        super().__init__(directories)
+        if not sys.platform.startswith('linux'):
+            raise OSError('inotify is only available on Linux')
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._wd_to_dir: Dict[int, str] = {}
+        try:
+            for d in self.directories:
+                wd = self._libc.inotify_add_watch(self._fd, os.fsencode(d), WATCH_MASK)
+                if wd < 0:
+                    raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for "{d}"')
+                self._wd_to_dir[wd] = d
+        except OSError:
+            os.close(self._fd)
+            raise
+
+    def stop(self, timeout: float = 2.0) -> None:
+        super().stop(timeout)
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            readable, _, _ = select.select([self._fd], [], [], 0.5)
+            if not readable:
+                continue
+            try:
+                buf = os.read(self._fd, 64*1024)
+            except BlockingIOError:
+                continue
+            except OSError:
+                self.mark_overflow()
+                return
+            self._handle_events(buf)
+
+    def _handle_events(self, buf: bytes) -> None:
+        offset = 0
+        while offset + event_header.size <= len(buf):
+            wd, mask, _cookie, length = event_header.unpack_from(buf, offset)
+            offset += event_header.size
+            name = os.fsdecode(buf[offset:offset+length].rstrip(b'\0'))
+            offset += length
+            if mask & (IN_Q_OVERFLOW | IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                self.mark_overflow()
+                continue
+            directory = self._wd_to_dir.get(wd)
+            if directory and name.endswith('.py'):
+                self.mark_changed(Path(directory)/name)
+
+
+def create_watcher(directories: Iterable[str], interval: float = 1.0) -> FileWatcher:
+    """return an inotify watcher on Linux, otherwise (or if inotify fails) a polling watcher
+    """
+    directories = list(directories)
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(directories)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(directories, interval=interval)
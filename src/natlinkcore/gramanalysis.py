@@ -0,0 +1,183 @@
+"""the size and complexity of the rules of a grammar, and sample sentences, to spot grammars that are
+expensive to recognize before they are loaded
+
+GrammarAnalysis works on the ruleDefines (with knownWords, knownLists and knownRules) of a GramParser, or of
+an UnpackedGrammar read back from a binary (see gramparser.unpackGrammar). Referenced rules are inlined.
+
+Phrases are counted per path through a rule, as the recognizer has to consider them, with caps:
+
+- a repeat ("+") counts one up to maxRepeat repetitions
+- a list counts its items (lists), or one phrase "{name}" when its items are not given
+- an imported rule (<dgndictation>, <dgnletters>, ...) counts as one phrase "<name>"
+
+sentences enumerates the same phrases lazily, with the same caps, so the first samples of a huge
+grammar come without enumerating the rest. The metrics of a rule are:
+
+- phrases: the number of phrases
+- depth: the deepest nesting of groups ("(...)", "[...]", "+")
+- branching: the largest number of choices at one point (alternatives, a list, 2 for "[...]" and "+")
+- vocabulary: the number of different words
+
+```
+analysis = GrammarAnalysis(parser, maxRepeat=2, lists={'files': ['notes', 'todo']})
+print(analysis.report())                    # one line per exported rule
+for words in itertools.islice(analysis.sentences('start'), 10):
+    print(' '.join(words))
+```
+
+The natlink loader logs the grammars that accept more phrases than the setting max_grammar_phrases.
+"""
+#pylint:disable=C0115, C0116
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from natlinkcore.gramast import Alt, Leaf, Node, Opt, Rep, RuleRef, Seq, Word, Wrapper, unflatten
+from natlinkcore.gramparser import GrammarError
+
+class RuleMetrics:
+    """the number of phrases and the complexity of a rule, see the module docstring
+    """
+    __slots__ = ('ruleName', 'phrases', 'depth', 'branching', 'words')
+
+    def __init__(self, ruleName: str, phrases: int, depth: int, branching: int, words: FrozenSet[str]):
+        self.ruleName = ruleName
+        self.phrases = phrases
+        self.depth = depth
+        self.branching = branching
+        self.words = words
+
+    @property
+    def vocabulary(self) -> int:
+        return len(self.words)
+
+    def __str__(self) -> str:
+        return (f'<{self.ruleName}>: {self.phrases} phrases, depth {self.depth}, branching {self.branching}, '
+                f'{self.vocabulary} words')
+
+
+class GrammarAnalysis:
+    """the trees of the rules of a grammar, with the metrics of each rule computed on demand
+    """
+    def __init__(self, grammar: Any, maxRepeat: int = 2, lists: Optional[Dict[str, Iterable[str]]] = None):
+        if maxRepeat < 1:
+            raise ValueError(f'maxRepeat should be at least 1, not {maxRepeat}')
+        self.maxRepeat = maxRepeat
+        self.lists: Dict[str, List[str]] = {name: list(items) for name, items in (lists or {}).items()}
+        names = {'word': {number: name for name, number in grammar.knownWords.items()},
+                 'list': {number: name for name, number in grammar.knownLists.items()},
+                 'rule': {number: name for name, number in grammar.knownRules.items()}}
+        self.trees: Dict[str, Node] = {}
+        for ruleName, definition in grammar.ruleDefines.items():
+            try:
+                self.trees[ruleName] = unflatten(definition, names)
+            except ValueError as exc:
+                raise GrammarError(f"rule '{ruleName}': {exc}") from exc
+        self.exportRules = [ruleName for ruleName in grammar.exportRules if ruleName in self.trees]
+        self._metrics: Dict[str, RuleMetrics] = {}
+
+    # the metrics:
+    def ruleMetrics(self, ruleName: str) -> RuleMetrics:
+        return self._ruleMetrics(ruleName, ())
+
+    def countPhrases(self, ruleName: str) -> int:
+        return self.ruleMetrics(ruleName).phrases
+
+    def metrics(self) -> Dict[str, RuleMetrics]:
+        """the metrics of the exported rules
+        """
+        return {ruleName: self.ruleMetrics(ruleName) for ruleName in self.exportRules}
+
+    def totalPhrases(self) -> int:
+        return sum(self.countPhrases(ruleName) for ruleName in self.exportRules)
+
+    def report(self) -> str:
+        """the metrics of the exported rules, the rule with the most phrases first
+        """
+        metrics = sorted(self.metrics().values(), key=lambda m: -m.phrases)
+        return '\n'.join(map(str, metrics))
+
+    def _ruleMetrics(self, ruleName: str, stack: Tuple[str, ...]) -> RuleMetrics:
+        if ruleName not in self._metrics:
+            if ruleName in stack:
+                raise GrammarError(f"rule '{ruleName}' is recursive, its phrases cannot be counted")
+            phrases, depth, branching, words = self._measure(self.trees[ruleName], stack + (ruleName,))
+            self._metrics[ruleName] = RuleMetrics(ruleName, phrases, depth, branching, words)
+        return self._metrics[ruleName]
+
+    def _measure(self, node: Node, stack: Tuple[str, ...]) -> Tuple[int, int, int, FrozenSet[str]]:
+        """the phrases, depth, branching and words of a node
+        """
+        if isinstance(node, Leaf):
+            if isinstance(node, Word):
+                return 1, 0, 1, frozenset([node.name])
+            if isinstance(node, RuleRef):
+                if node.name not in self.trees:
+                    # imported:
+                    return 1, 0, 1, frozenset()
+                metrics = self._ruleMetrics(node.name, stack)
+                return metrics.phrases, metrics.depth, metrics.branching, metrics.words
+            items = self.lists.get(node.name)
+            return (len(items), 0, len(items), frozenset(items)) if items else (1, 0, 1, frozenset())
+
+        measured = [self._measure(item, stack) for item in node.children()]
+        depth = 1 + max((m[1] for m in measured), default=0)
+        branching = max((m[2] for m in measured), default=1)
+        words = frozenset().union(*(m[3] for m in measured))
+        if isinstance(node, Wrapper):
+            n = measured[0][0]
+            phrases = 1 + n if isinstance(node, Opt) else sum(n**k for k in range(1, self.maxRepeat + 1))
+            return phrases, depth, max(branching, 2), words
+        if isinstance(node, Alt):
+            return sum(m[0] for m in measured), depth, max(branching, len(measured)), words
+        phrases = 1
+        for m in measured:
+            phrases *= m[0]
+        return phrases, depth, branching, words
+
+    # the sentences:
+    def sentences(self, ruleName: str) -> Iterator[Tuple[str, ...]]:
+        """the phrases of a rule as tuples of words, one at a time, in the order of the grammar
+
+        Lists without items give "{name}", imported rules "<name>".
+        """
+        return self._sentences(self.trees[ruleName], (ruleName,))
+
+    def _sentences(self, node: Node, stack: Tuple[str, ...]) -> Iterator[Tuple[str, ...]]:
+        if isinstance(node, Word):
+            yield (node.name,)
+        elif isinstance(node, RuleRef):
+            if node.name not in self.trees:
+                yield (f'<{node.name}>',)
+            elif node.name in stack:
+                raise GrammarError(f"rule '{node.name}' is recursive, its phrases cannot be enumerated")
+            else:
+                yield from self._sentences(self.trees[node.name], stack + (node.name,))
+        elif isinstance(node, Leaf):
+            for item in self.lists.get(node.name) or [f'{{{node.name}}}']:
+                yield (item,)
+        elif isinstance(node, Opt):
+            yield ()
+            yield from self._sentences(node.item, stack)
+        elif isinstance(node, Rep):
+            for k in range(1, self.maxRepeat + 1):
+                yield from self._sequence((node.item,)*k, stack)
+        elif isinstance(node, Alt):
+            for item in node.items:
+                yield from self._sentences(item, stack)
+        else:
+            assert isinstance(node, Seq)
+            yield from self._sequence(node.items, stack)
+
+    def _sequence(self, items: Sequence[Node], stack: Tuple[str, ...]) -> Iterator[Tuple[str, ...]]:
+        if not items:
+            yield ()
+            return
+        for head in self._sentences(items[0], stack):
+            for tail in self._sequence(items[1:], stack):
+                yield head + tail
+
+
+def countGrammarPhrases(grammar: Any, maxRepeat: int = 2) -> Dict[str, int]:
+    """the number of phrases of each exported rule of a grammar (a GramParser or an UnpackedGrammar)
+    """
+    analysis = GrammarAnalysis(grammar, maxRepeat)
+    return {ruleName: analysis.countPhrases(ruleName) for ruleName in analysis.exportRules}
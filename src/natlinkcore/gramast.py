@@ -0,0 +1,186 @@
+"""the syntax tree of a parsed grammar rule, built by gramparser.GramParser
+
+GramParser.ruleAsts maps every defined rule name to its tree, built from these node classes:
+
+- Word, List, RuleRef: the leaves, with the name and the number the parser gave it
+- Seq, Alt: a sequence or alternatives of two or more nodes
+- Rep, Opt: a repeated ("+") or optional ("[...]") node
+
+Parentheses make no node, so "(a | b) | c" gives an Alt inside an Alt, exactly as the
+ruleDefines of the parser have the start/end markers. `flatten` produces that flat list
+in one pass over the tree, `unflatten` builds the tree of a flat list again:
+
+```
+parser = GramParser('<start> exported = hello (world | [big] {names});')
+parser.doParse()
+tree = parser.ruleAsts['start']   # Seq(Word('hello', 1), Alt(Word('world', 2), Seq(Opt(Word('big', 3)), List('names', 1))))
+assert flatten(tree) == parser.ruleDefines['start']
+assert unflatten(parser.ruleDefines['start'], names) == tree   # names: kind -> number -> name
+```
+"""
+#pylint:disable=C0115, C0116
+import typing
+from typing import Dict, Iterator, Tuple
+
+# the element codes of the start and end markers, as in gramparser.ElementCode:
+SeqCode, AltCode, RepCode, OptCode = 1, 2, 3, 4
+
+Definition = typing.List[Tuple[str, int]]
+
+class Node:
+    __slots__ = ()
+    fields: Tuple[str, ...] = ()
+
+    def emit(self, out: Definition) -> None:
+        """append the flat (element type, value) items of this node to out
+        """
+        raise NotImplementedError
+
+    def children(self) -> Tuple['Node', ...]:
+        return ()
+
+    def walk(self) -> Iterator['Node']:
+        """this node and all nodes below it, depth first
+        """
+        stack: typing.List[Node] = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children()))
+
+    def __eq__(self, other: object) -> bool:
+        return type(self) is type(other) and all(getattr(self, name) == getattr(other, name)
+                                                 for name in self.fields)
+
+    def __hash__(self) -> int:
+        return hash((type(self).__name__,) + tuple(getattr(self, name) for name in self.fields))
+
+
+class Leaf(Node):
+    __slots__ = fields = ('name', 'number')
+    kind = ''
+
+    def __init__(self, name: str, number: int):
+        self.name = name
+        self.number = number
+
+    def emit(self, out: Definition) -> None:
+        out.append((self.kind, self.number))
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.name!r}, {self.number})'
+
+
+class Word(Leaf):
+    __slots__ = ()
+    kind = 'word'
+
+
+class List(Leaf):
+    __slots__ = ()
+    kind = 'list'
+
+
+class RuleRef(Leaf):
+    __slots__ = ()
+    kind = 'rule'
+
+
+class Group(Node):
+    __slots__ = fields = ('items',)
+    code = 0
+
+    def __init__(self, *items: Node):
+        self.items = items
+
+    def children(self) -> Tuple[Node, ...]:
+        return self.items
+
+    def emit(self, out: Definition) -> None:
+        out.append(('start', self.code))
+        for item in self.items:
+            item.emit(out)
+        out.append(('end', self.code))
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({", ".join(map(repr, self.items))})'
+
+
+class Seq(Group):
+    __slots__ = ()
+    code = SeqCode
+
+
+class Alt(Group):
+    __slots__ = ()
+    code = AltCode
+
+
+class Wrapper(Node):
+    __slots__ = fields = ('item',)
+    code = 0
+
+    def __init__(self, item: Node):
+        self.item = item
+
+    def children(self) -> Tuple[Node, ...]:
+        return (self.item,)
+
+    def emit(self, out: Definition) -> None:
+        out.append(('start', self.code))
+        self.item.emit(out)
+        out.append(('end', self.code))
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.item!r})'
+
+
+class Rep(Wrapper):
+    __slots__ = ()
+    code = RepCode
+
+
+class Opt(Wrapper):
+    __slots__ = ()
+    code = OptCode
+
+
+def flatten(node: Node) -> Definition:
+    """the flat ruleDefines representation of a tree, as packGrammar needs it
+    """
+    out: Definition = []
+    node.emit(out)
+    return out
+
+
+leafClasses = {'word': Word, 'list': List, 'rule': RuleRef}
+groupClasses = {SeqCode: Seq, AltCode: Alt, RepCode: Rep, OptCode: Opt}
+
+def unflatten(definition: Definition, names: Dict[str, Dict[int, str]]) -> Node:
+    """the tree of a flat rule definition, the inverse of flatten
+
+    names gives the name of the numbers per kind of leaf ('word', 'list', 'rule'),
+    unknown numbers get the name "#<number>". Raises ValueError for an invalid definition.
+    """
+    # the items of the open groups, and their codes:
+    stack: typing.List[typing.List[Node]] = [[]]
+    codes: typing.List[int] = []
+    for kind, value in definition:
+        if kind in leafClasses:
+            stack[-1].append(leafClasses[kind](names[kind].get(value, f'#{value}'), value))
+        elif kind == 'start' and value in groupClasses:
+            stack.append([])
+            codes.append(value)
+        elif kind == 'end' and codes and codes[-1] == value:
+            items = stack.pop()
+            codes.pop()
+            groupClass = groupClasses[value]
+            if issubclass(groupClass, Wrapper):
+                stack[-1].append(groupClass(items[0] if len(items) == 1 else Seq(*items)))
+            else:
+                stack[-1].append(groupClass(*items))
+        else:
+            raise ValueError(f'invalid element in rule definition: {(kind, value)}')
+    if codes or len(stack[0]) != 1:
+        raise ValueError('rule definition is not one balanced element')
+    return stack[0][0]
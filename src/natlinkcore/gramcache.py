@@ -0,0 +1,221 @@
+"""a cache of compiled (parsed and packed) grammars, for GrammarBase.load
+
+The key is a hash of the normalized gramSpec (see gramparser.splitApartLines), the encoding used
+for packing and the cache format version. A hit returns the packed binary and the exportRules,
+knownLists and knownRules of the parser, so parsing is skipped completely.
+
+There are two tiers: a bounded in-memory LRU, and (when a directory is set) one json file per
+grammar on disk, for the next session. The natlink loader sets the directory to "grammarcache"
+in the natlink settings directory when the setting grammar_cache is on.
+
+With optimize set (the setting optimize_grammars), the grammars are optimized (see gramoptimizer)
+before packing, and optimize_report gives the size reduction of each grammar.
+
+```
+from natlinkcore.gramcache import grammar_cache
+compiled = grammar_cache.get(gramSpec, grammarName)
+gramObj.load(compiled.gramBin)
+print(grammar_cache.report())
+```
+"""
+#pylint:disable=C0115, C0116
+import base64
+import hashlib
+import json
+import os
+import struct
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from natlinkcore import gramparser
+from natlinkcore.gramoptimizer import optimizeGrammar
+
+CACHE_VERSION = 1
+
+class CompiledGrammar:
+    """the result of parsing and packing a gramSpec
+    """
+    __slots__ = ('gramBin', 'exportRules', 'knownLists', 'knownRules', 'compileTime', 'unoptimizedSize')
+
+    def __init__(self, gramBin: bytes, exportRules: Dict[str, int], knownLists: Dict[str, int],
+                 knownRules: Dict[str, int], compileTime: float, unoptimizedSize: Optional[int] = None):
+        self.gramBin = gramBin
+        self.exportRules = exportRules
+        self.knownLists = knownLists
+        self.knownRules = knownRules
+        self.compileTime = compileTime    # seconds of parsing and packing, the time a cache hit saves
+        # the size of gramBin without optimizing:
+        self.unoptimizedSize = len(gramBin) if unoptimizedSize is None else unoptimizedSize
+
+    @classmethod
+    def from_parser(cls, parser: gramparser.GramParser, compileTime: float,
+                    unoptimizedSize: Optional[int] = None) -> 'CompiledGrammar':
+        return cls(gramparser.packGrammar(parser), dict(parser.exportRules), dict(parser.knownLists),
+                   dict(parser.knownRules), compileTime, unoptimizedSize)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {'version': CACHE_VERSION, 'gramBin': base64.b64encode(self.gramBin).decode('ascii'),
+                'exportRules': self.exportRules, 'knownLists': self.knownLists,
+                'knownRules': self.knownRules, 'compileTime': self.compileTime,
+                'unoptimizedSize': self.unoptimizedSize}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> Optional['CompiledGrammar']:
+        if not isinstance(data, dict) or data.get('version') != CACHE_VERSION:
+            return None
+        try:
+            # the names as the shared interned objects, like a parser has them:
+            exportRules, knownLists, knownRules = ({sys.intern(name): number for name, number in data[key].items()}
+                                                   for key in ('exportRules', 'knownLists', 'knownRules'))
+            return cls(base64.b64decode(data['gramBin']), exportRules, knownLists, knownRules,
+                       data.get('compileTime', 0.0), data.get('unoptimizedSize'))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return None
+
+
+class GrammarCache:
+    """memory LRU of CompiledGrammar instances, backed by an optional directory on disk
+    """
+    def __init__(self, maxsize: int = 128, directory: Any = None, optimize: bool = False):
+        self.maxsize = maxsize
+        self.directory: Optional[Path] = Path(directory) if directory else None
+        self.optimize = optimize
+        # grammar name -> (size without, size with optimizing), of the grammars got with optimize on:
+        self.optimized_sizes: Dict[str, Tuple[int, int]] = {}
+        self._entries: 'OrderedDict[str, CompiledGrammar]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = self.disk_hits = self.misses = 0
+        self.saved_time = 0.0       # seconds of compiling saved by hits
+        self.compile_time = 0.0     # seconds spent compiling at misses
+        self.disk_errors = 0
+
+    def key(self, gramSpec: Union[str, List[str]]) -> str:
+        text = '\n'.join(gramparser.splitApartLines(gramSpec))
+        salt = f'{CACHE_VERSION}\0{gramparser.preferredencoding}\0{struct.calcsize("L")}\0{int(self.optimize)}\0'
+        return hashlib.blake2b((salt + text).encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+
+    def _disk_path(self, key: str) -> Optional[Path]:
+        return self.directory/f'{key}.json' if self.directory else None
+
+    def _read_disk(self, key: str) -> Optional[CompiledGrammar]:
+        path = self._disk_path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                return CompiledGrammar.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            self.disk_errors += 1
+            return None
+
+    def _write_disk(self, key: str, compiled: CompiledGrammar) -> None:
+        path = self._disk_path(key)
+        if path is None:
+            return
+        tmp_path = Path(str(path) + f'.{os.getpid()}.tmp')
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(compiled.as_dict(), f)
+            os.replace(tmp_path, path)
+        except OSError:
+            self.disk_errors += 1
+
+    def _remember(self, key: str, compiled: CompiledGrammar) -> None:
+        with self._lock:
+            self._entries[key] = compiled
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, gramSpec: Union[str, List[str]], grammarName: Optional[str] = None) -> CompiledGrammar:
+        """return the compiled grammar, from memory, from disk, or by parsing and packing the gramSpec
+
+        Errors of the gramparser (GrammarParserError) are raised, and not cached.
+        """
+        key = self.key(gramSpec)
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                self.saved_time += compiled.compileTime
+        if compiled is None:
+            compiled = self._read_disk(key)
+            if compiled is not None:
+                self.disk_hits += 1
+                self.saved_time += compiled.compileTime
+                self._remember(key, compiled)
+        if compiled is None:
+            t0 = time.perf_counter()
+            parser = gramparser.GramParser(gramSpec, grammarName=grammarName)
+            parser.doParse()
+            parser.checkForErrors()
+            unoptimizedSize = optimizeGrammar(parser).bytesBefore if self.optimize else None
+            compiled = CompiledGrammar.from_parser(parser, time.perf_counter() - t0, unoptimizedSize)
+            self.misses += 1
+            self.compile_time += compiled.compileTime
+            self._remember(key, compiled)
+            self._write_disk(key, compiled)
+        if self.optimize:
+            self.optimized_sizes[grammarName or key[:8]] = (compiled.unoptimizedSize, len(compiled.gramBin))
+        return compiled
+
+    def put(self, gramSpec: Union[str, List[str]], compiled: CompiledGrammar) -> None:
+        """store a grammar compiled elsewhere (see gramcompile), in memory and on disk
+        """
+        key = self.key(gramSpec)
+        self._remember(key, compiled)
+        self._write_disk(key, compiled)
+
+    def info(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {'memory_hits': self.memory_hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                'hit_rate': (self.memory_hits + self.disk_hits)/lookups if lookups else 0.0,
+                'saved_time': self.saved_time, 'compile_time': self.compile_time,
+                'size': len(self._entries), 'maxsize': self.maxsize, 'disk_errors': self.disk_errors,
+                'directory': str(self.directory) if self.directory else None}
+
+    def report(self) -> str:
+        info = self.info()
+        return (f'--- grammar cache: {info["memory_hits"]} memory hits, {info["disk_hits"]} disk hits, '
+                f'{info["misses"]} misses (hit rate {info["hit_rate"]:.0%}), '
+                f'saved {info["saved_time"]*1000:.1f} ms of parsing and packing '
+                f'(spent {info["compile_time"]*1000:.1f} ms)')
+
+    def optimize_report(self) -> str:
+        """the size reduction of each optimized grammar, the largest reduction first
+        """
+        if not self.optimized_sizes:
+            return '--- grammar optimizer: no grammars optimized'
+        before = sum(size for size, _ in self.optimized_sizes.values())
+        after = sum(size for _, size in self.optimized_sizes.values())
+        L = [f'--- grammar optimizer: {len(self.optimized_sizes)} grammars, {before} -> {after} bytes '
+             f'(-{1 - after/before:.0%})']
+        for name, (size, optimized) in sorted(self.optimized_sizes.items(), key=lambda item: item[1][1] - item[1][0]):
+            L.append(f'{name}: {size} -> {optimized} bytes (-{1 - optimized/size:.0%})')
+        return '\n'.join(L)
+
+    def clear(self, disk: bool = False) -> None:
+        """forget the grammars in memory and the statistics, with disk=True also remove the files on disk
+        """
+        with self._lock:
+            self._entries.clear()
+            self.memory_hits = self.disk_hits = self.misses = self.disk_errors = 0
+            self.saved_time = self.compile_time = 0.0
+            self.optimized_sizes.clear()
+        if disk and self.directory and self.directory.is_dir():
+            for path in self.directory.glob('*.json'):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+# the instance shared by all grammars (natlinkutils.GrammarBase.load):
+grammar_cache = GrammarCache()
@@ -0,0 +1,227 @@
+"""parse and pack the grammars of grammar files in a process pool, with the time and size of each grammar
+
+The gramSpecs are found without importing the grammar files (which need Dragon): the arguments of the
+`load` calls (GrammarBase.load) are read from the source, when they are string constants, lists of them,
+or names of module or class attributes that are. A `.gram` file holds the text of one gramSpec.
+
+With a cache directory, the compiled grammars are stored in the grammar cache (see gramcache), so
+GrammarBase.load gets them from disk at the next start of Dragon, when the setting grammar_cache is on.
+
+```
+sources, skipped = find_grammars(paths)
+result = compile_grammars(sources, cache_directory=directory)
+print(compile_report(result))
+```
+"""
+#pylint:disable=C0116
+import ast
+import concurrent.futures
+import multiprocessing
+import struct
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from natlinkcore import gramparser
+from natlinkcore.gramcache import CompiledGrammar, GrammarCache
+from natlinkcore.gramoptimizer import optimizeGrammar
+from natlinkcore.precompile import python_executable
+
+GramSpec = Union[str, List[str]]
+
+def _constant_value(node: Optional[ast.AST], names: Dict[str, ast.AST], depth: int = 0) -> Optional[GramSpec]:
+    """the string or list of strings of an expression, None when it is not constant
+    """
+    if node is None or depth > 10:
+        return None
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, (ast.List, ast.Tuple)):
+        values = [_constant_value(elt, names, depth + 1) for elt in node.elts]
+        if all(isinstance(value, str) for value in values):
+            return values
+        return None
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        left = _constant_value(node.left, names, depth + 1)
+        right = _constant_value(node.right, names, depth + 1)
+        if isinstance(left, str) and isinstance(right, str):
+            return left + right
+        if isinstance(left, list) and isinstance(right, list):
+            return left + right
+        return None
+    if isinstance(node, ast.Name):
+        return _constant_value(names.get(node.id), names, depth + 1)
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id in ('self', 'cls'):
+        return _constant_value(names.get(node.attr), names, depth + 1)
+    return None
+
+def _assignments(body: Iterable[ast.stmt]) -> Dict[str, ast.AST]:
+    """name -> value of the simple assignments in a module or class body
+    """
+    names: Dict[str, ast.AST] = {}
+    for stmt in body:
+        if isinstance(stmt, ast.Assign):
+            for target in stmt.targets:
+                if isinstance(target, ast.Name):
+                    names[target.id] = stmt.value
+        elif isinstance(stmt, ast.AnnAssign) and isinstance(stmt.target, ast.Name) and stmt.value is not None:
+            names[stmt.target.id] = stmt.value
+    return names
+
+def _load_calls(node: ast.AST) -> Iterable[Tuple[ast.Call, List[ast.expr]]]:
+    """the calls self.load(...) and Base.load(self, ...) below node, with their arguments after self
+    """
+    for call in ast.walk(node):
+        if not (isinstance(call, ast.Call) and isinstance(call.func, ast.Attribute) and call.func.attr == 'load'):
+            continue
+        if isinstance(call.func.value, ast.Name) and call.func.value.id == 'self':
+            yield call, call.args
+        elif call.args and isinstance(call.args[0], ast.Name) and call.args[0].id == 'self':
+            yield call, call.args[1:]
+
+def gramspecs_of_source(source: str, module_name: str) -> Tuple[List[Tuple[str, GramSpec]], List[str]]:
+    """the (grammar name, gramSpec) of the load calls in the source of a grammar file,
+    and the descriptions of the load calls with a gramSpec that is not constant
+    """
+    tree = ast.parse(source)
+    module_names = _assignments(tree.body)
+    found: List[Tuple[str, GramSpec]] = []
+    skipped: List[str] = []
+    counts: Dict[str, int] = {}
+
+    def add(call: ast.Call, args: List[ast.expr], names: Dict[str, ast.AST], owner: str) -> None:
+        keywords = {keyword.arg: keyword.value for keyword in call.keywords}
+        spec_node = args[0] if args else keywords.get('gramSpec')
+        if spec_node is None:
+            # another load, like GramClassBase.load(self, allResults=1) of a selection grammar
+            return
+        gramspec = _constant_value(spec_node, names)
+        if gramspec is None:
+            skipped.append(f'{owner}, line {call.lineno}: {ast.unparse(spec_node)}')
+            return
+        grammar_name = _constant_value(keywords.get('grammarName'), names)
+        name = grammar_name if isinstance(grammar_name, str) else owner
+        counts[name] = counts.get(name, 0) + 1
+        if counts[name] > 1:
+            name = f'{name}#{counts[name]}'
+        found.append((name, gramspec))
+
+    in_classes = set()
+    for stmt in tree.body:
+        if isinstance(stmt, ast.ClassDef):
+            names = dict(module_names)
+            names.update(_assignments(stmt.body))
+            for call, args in _load_calls(stmt):
+                in_classes.add(id(call))
+                add(call, args, names, f'{module_name}.{stmt.name}')
+    for call, args in _load_calls(tree):
+        if id(call) not in in_classes:
+            add(call, args, module_names, module_name)
+    return found, skipped
+
+def find_grammars(paths: Iterable[Any]) -> Tuple[List[Tuple[str, GramSpec]], Dict[str, str]]:
+    """the (grammar name, gramSpec) of the python grammar files and .gram files,
+    and {name or path: reason} of the grammars that cannot be compiled without importing
+    """
+    sources: List[Tuple[str, GramSpec]] = []
+    skipped: Dict[str, str] = {}
+    for path in map(Path, paths):
+        try:
+            text = path.read_text(encoding='utf-8')
+        except (OSError, UnicodeDecodeError) as exc:
+            skipped[str(path)] = str(exc)
+            continue
+        if path.suffix.lower() == '.gram':
+            sources.append((path.stem, text))
+            continue
+        try:
+            found, not_constant = gramspecs_of_source(text, path.stem)
+        except SyntaxError as exc:
+            skipped[str(path)] = f'SyntaxError: {exc}'
+            continue
+        sources.extend(found)
+        for description in not_constant:
+            skipped[description] = 'gramSpec is not a constant'
+    return sources, skipped
+
+def compile_grammar(args: Tuple[str, GramSpec, Optional[str], bool]) -> Dict[str, Any]:
+    """parse and pack one grammar, and store it in the cache directory (if not None)
+
+    Runs in the worker processes, so it is a module level function. Return a dict with the 'name',
+    the 'parse' and 'pack' time in seconds, the 'size' of the binary in bytes and the 'error' message.
+    """
+    name, gramspec, cache_directory, optimize = args
+    result: Dict[str, Any] = {'name': name, 'parse': 0.0, 'pack': 0.0, 'size': 0, 'error': None}
+    t0 = time.perf_counter()
+    try:
+        parser = gramparser.GramParser(gramspec, grammarName=name)
+        parser.doParse()
+        parser.checkForErrors()
+        t1 = time.perf_counter()
+        result['parse'] = t1 - t0
+        unoptimized_size = optimizeGrammar(parser).bytesBefore if optimize else None
+        compiled = CompiledGrammar.from_parser(parser, 0.0, unoptimized_size)
+        t2 = time.perf_counter()
+        result['pack'] = t2 - t1
+        compiled.compileTime = t2 - t0
+    except (gramparser.GrammarParserError, UnicodeError, ValueError, struct.error) as exc:
+        # a grammar that cannot be parsed, or packed (a word that cannot be encoded, a number that does not fit):
+        result['error'] = f'{type(exc).__name__}: {exc}'
+        return result
+    result['size'] = len(compiled.gramBin)
+    if cache_directory:
+        GrammarCache(directory=cache_directory, optimize=optimize).put(gramspec, compiled)
+    return result
+
+def _compile_in_pool(work: List[Tuple[str, GramSpec, Optional[str], bool]],
+                     max_workers: Optional[int]) -> List[Dict[str, Any]]:
+    ctx = multiprocessing.get_context('spawn')
+    ctx.set_executable(python_executable())
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx) as executor:
+        return list(executor.map(compile_grammar, work, chunksize=max(1, len(work)//32)))
+
+def compile_grammars(sources: Iterable[Tuple[str, GramSpec]], max_workers: Optional[int] = None,
+                     cache_directory: Any = None, optimize: bool = False, min_parallel: int = 4) -> Dict[str, Any]:
+    """parse and pack the (grammar name, gramSpec) sources, in parallel when there are enough
+
+    cache_directory: store the compiled grammars there, as the grammar cache of the loader does
+    optimize: optimize the grammars before packing, as the setting optimize_grammars does
+    min_parallel: with fewer grammars, compile them in this process
+
+    Return a dict with the 'results' (see compile_grammar, the slowest grammar first), 'errors'
+    ({name: message}), 'parallel' (True if a process pool was used) and the wall 'time' in seconds.
+    """
+    t0 = time.perf_counter()
+    directory = str(cache_directory) if cache_directory else None
+    work = [(name, gramspec, directory, optimize) for name, gramspec in sources]
+    parallel = len(work) >= min_parallel and max_workers != 1
+    results: List[Dict[str, Any]] = []
+    if parallel:
+        try:
+            results = _compile_in_pool(work, max_workers)
+        except (OSError, concurrent.futures.process.BrokenProcessPool, RuntimeError):
+            # no worker processes possible, compile here
+            parallel = False
+    if not parallel:
+        results = [compile_grammar(item) for item in work]
+    results.sort(key=lambda result: -(result['parse'] + result['pack']))
+    errors = {result['name']: result['error'] for result in results if result['error']}
+    return {'results': results, 'errors': errors, 'parallel': parallel, 'time': time.perf_counter() - t0}
+
+def compile_report(result: Dict[str, Any], max_lines: int = 0) -> str:
+    """the results of compile_grammars as a table, the slowest grammar first, with max_lines grammars (0: all)
+    """
+    results = result['results']
+    lines = [f'{"parse ms":>9} {"pack ms":>9} {"bytes":>9}  grammar']
+    for item in results[:max_lines or None]:
+        if item['error']:
+            lines.append(f'{item["parse"]*1000:9.1f} {"":>9} {"":>9}  {item["name"]}: {item["error"]}')
+        else:
+            lines.append(f'{item["parse"]*1000:9.1f} {item["pack"]*1000:9.1f} {item["size"]:9}  {item["name"]}')
+    parse = sum(item['parse'] for item in results)
+    pack = sum(item['pack'] for item in results)
+    size = sum(item['size'] for item in results)
+    lines.append(f'{parse*1000:9.1f} {pack*1000:9.1f} {size:9}  total of {len(results)} grammars, '
+                 f'{len(result["errors"])} errors, {result["time"]:.2f} seconds'
+                 f'{" in parallel" if result["parallel"] else ""}')
+    return '\n'.join(lines)
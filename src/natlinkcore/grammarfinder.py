@@ -0,0 +1,134 @@
+"""a sys.meta_path finder for the grammar directories, instead of prepending them to sys.path
+
+With the grammar directories in front of sys.path, every import in the process (stdlib included)
+first probes each grammar directory. GrammarFinder keeps a dict index from module name to file
+(or package) for the grammar directories, so a lookup is one dict access, and other imports fall
+through to the normal PathFinder.
+
+The index of a directory is built again only after `invalidate(directory)` (the loader does this when
+its directory scan sees a changed directory), or after `importlib.invalidate_caches()` (all directories).
+
+```
+finder = GrammarFinder(directories)
+finder.install()
+...
+finder.invalidate(directory)
+...
+finder.uninstall()
+```
+"""
+#pylint:disable=C0115, C0116, W0613
+import importlib.abc
+import importlib.machinery
+import importlib.util
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Set
+
+# preference within a directory, as with the FileFinder of importlib: extension modules, source, bytecode
+MODULE_SUFFIXES = (importlib.machinery.EXTENSION_SUFFIXES + importlib.machinery.SOURCE_SUFFIXES +
+                   importlib.machinery.BYTECODE_SUFFIXES)
+
+def normalize_dir(directory: Any) -> str:
+    return os.path.normcase(os.path.normpath(str(directory)))
+
+class GrammarFinder(importlib.abc.MetaPathFinder):
+    """find top level modules and packages in the grammar directories via a dict index
+
+    As with sys.path.insert(0, directory) for each directory, a later directory takes precedence.
+    Submodules of packages are found by the normal finders, via the __path__ of the package.
+    """
+    def __init__(self, directories: Iterable[Any]):
+        self.directories: List[str] = [normalize_dir(d) for d in directories]
+        self._dir_index: Dict[str, Dict[str, Path]] = {}   # directory -> {module name: file or package dir}
+        self._index: Dict[str, Path] = {}
+        self._dirty: Set[str] = set(self.directories)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.rescans = 0
+
+    @staticmethod
+    def _scan(directory: str) -> Dict[str, Path]:
+        modules: Dict[str, Path] = {}
+        ranks: Dict[str, int] = {}
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return modules
+        for entry in entries:
+            name = entry.name
+            if entry.is_dir():
+                if name.isidentifier() and os.path.isfile(os.path.join(entry.path, '__init__.py')):
+                    modules[name] = Path(entry.path)
+                    ranks[name] = -1
+                continue
+            for rank, suffix in enumerate(MODULE_SUFFIXES):
+                if name.endswith(suffix):
+                    mod_name = name[:-len(suffix)]
+                    if mod_name.isidentifier() and rank < ranks.get(mod_name, len(MODULE_SUFFIXES)):
+                        modules[mod_name] = Path(entry.path)
+                        ranks[mod_name] = rank
+                    break
+        return modules
+
+    def _refresh(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            for directory in self._dirty:
+                self._dir_index[directory] = self._scan(directory)
+                self.rescans += 1
+            self._dirty.clear()
+            index: Dict[str, Path] = {}
+            for directory in self.directories:
+                index.update(self._dir_index.get(directory, {}))
+            self._index = index
+
+    def find_spec(self, fullname: str, path: Any = None, target: Any = None) -> Any:
+        if path is not None:
+            # a submodule, found via the __path__ of its package
+            return None
+        if self._dirty:
+            self._refresh()
+        location = self._index.get(fullname)
+        if location is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if location.is_dir():
+            return importlib.util.spec_from_file_location(fullname, location/'__init__.py',
+                                                          submodule_search_locations=[str(location)])
+        return importlib.util.spec_from_file_location(fullname, location)
+
+    def invalidate(self, directory: Any) -> None:
+        """build the index of this directory again at the next lookup
+        """
+        directory = normalize_dir(directory)
+        if directory in self.directories:
+            self._dirty.add(directory)
+
+    def invalidate_caches(self) -> None:
+        """called by importlib.invalidate_caches()
+        """
+        self._dirty.update(self.directories)
+
+    def module_names(self) -> List[str]:
+        if self._dirty:
+            self._refresh()
+        return sorted(self._index)
+
+    def install(self) -> None:
+        """insert in sys.meta_path, just before the PathFinder (so after the builtin and frozen importers)
+        """
+        if self in sys.meta_path:
+            return
+        for i, finder in enumerate(sys.meta_path):
+            if finder is importlib.machinery.PathFinder:
+                sys.meta_path.insert(i, self)
+                return
+        sys.meta_path.append(self)
+
+    def uninstall(self) -> None:
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
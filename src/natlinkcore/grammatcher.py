@@ -0,0 +1,275 @@
+"""an offline recognizer for the grammars of GramParser, to test and benchmark grammars without Dragon
+
+GrammarMatcher compiles the rules of a grammar (a GramParser, or an UnpackedGrammar read back from a binary,
+see gramparser.unpackGrammar) into a nondeterministic automaton. match takes the recognized words and returns
+the list of (word, ruleNumber) that Dragon gives to GrammarBase.resultsCallback, or None when the words do not
+match one of the active exported rules. Each word gets the number of the innermost rule it belongs to.
+
+Referenced rules are inlined, imported rules are matched as:
+
+- <dgndictation>: one or more words
+- <dgnwords>: one word
+- <dgnletters>: one or more letters ("a" or "a\\\\letter")
+
+Other imported rules never match, unless importedRules gives them one of these kinds. A list matches
+one word (an item of the list, which can contain spaces), the lists are filled with setList and appendList,
+like those of a loaded grammar.
+
+```
+matcher = GrammarMatcher.fromGramSpec('<dgndictation> imported; <start> exported = open {files} | close <dgndictation>;')
+matcher.setList('files', ['notes', 'todo'])
+matcher.match(['open', 'todo'])            # [('open', 2), ('todo', 2)]
+matcher.match(['close', 'this', 'file'])   # [('close', 2), ('this', 1), ('file', 1)]
+matcher.recognize(grammar, ['open', 'notes'])   # calls grammar.resultsCallback as Dragon would
+```
+"""
+#pylint:disable=C0115, C0116
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from natlinkcore import gramparser
+from natlinkcore.gramparser import ElementCode, GrammarError
+
+# the kinds of imported rules, see the module docstring:
+builtinImports = {'dgndictation': 'dictation', 'dgnwords': 'word', 'dgnletters': 'letters'}
+
+WordsAndNums = List[Tuple[str, int]]
+# the start states (with paths), the targets of their words, and the start states with other transitions:
+StartStates = Tuple[Dict[int, Any], Dict[str, List[Tuple[int, int]]], List[int]]
+
+def isLetterWord(word: str) -> bool:
+    return len(word.split('\\', 1)[0]) == 1
+
+
+class GrammarMatcher:
+    """the automaton of the exported rules of a grammar, and the contents of its lists
+    """
+    def __init__(self, grammar: Any, importedRules: Optional[Dict[str, str]] = None):
+        self.exportRules: Dict[str, int] = dict(grammar.exportRules)
+        self.ruleDefines: Dict[str, gramparser.Definition] = grammar.ruleDefines
+        self.ruleNumbers: Dict[str, int] = dict(grammar.knownRules)
+        self.ruleNames = {number: name for name, number in grammar.knownRules.items()}
+        self.wordNames = {number: name for name, number in grammar.knownWords.items()}
+        self.listNames = {number: name for name, number in grammar.knownLists.items()}
+        self.lists: Dict[str, Set[str]] = {name: set() for name in grammar.knownLists}
+        self.importKinds = dict(builtinImports)
+        self.importKinds.update(importedRules or {})
+        self.importRules = set(grammar.importRules)
+
+        # per state: the targets of the words, the other transitions (kind, key, ruleNumber, target),
+        # and the states reached without a word:
+        self.wordEdges: List[Dict[str, List[Tuple[int, int]]]] = []
+        self.otherEdges: List[List[Tuple[str, Optional[str], int, int]]] = []
+        self.epsilon: List[List[int]] = []
+        # exported rule name -> (start state, final state):
+        self.fragments: Dict[str, Tuple[int, int]] = {}
+        for ruleName in self.exportRules:
+            if ruleName in self.ruleDefines:
+                self.fragments[ruleName] = self.ruleFragment(ruleName, ())
+        # the closures, with only the states that have a transition or are final:
+        finals = {end for _, end in self.fragments.values()}
+        useful = [bool(self.wordEdges[state] or self.otherEdges[state]) or state in finals
+                  for state in range(len(self.epsilon))]
+        self.closures = [tuple(s for s in self.closure(state) if useful[s]) for state in range(len(self.epsilon))]
+        # the result of makeStartStates by tuple of active rules:
+        self.startStates: Dict[Tuple[str, ...], StartStates] = {}
+
+    @classmethod
+    def fromGramSpec(cls, gramSpec: Union[str, List[str]], importedRules: Optional[Dict[str, str]] = None
+                     ) -> 'GrammarMatcher':
+        parser = gramparser.GramParser(gramSpec)
+        parser.doParse()
+        parser.checkForErrors()
+        return cls(parser, importedRules)
+
+    @classmethod
+    def fromBinary(cls, gramBin: bytes, importedRules: Optional[Dict[str, str]] = None) -> 'GrammarMatcher':
+        """the matcher of a packed grammar, like the gramBin of a loaded GrammarBase
+        """
+        return cls(gramparser.unpackGrammar(gramBin), importedRules)
+
+    # building the automaton:
+    def newState(self) -> int:
+        self.wordEdges.append({})
+        self.otherEdges.append([])
+        self.epsilon.append([])
+        return len(self.epsilon) - 1
+
+    def ruleFragment(self, ruleName: str, stack: Tuple[str, ...]) -> Tuple[int, int]:
+        if ruleName in stack:
+            raise GrammarError(f"rule '{ruleName}' is recursive, this cannot be matched")
+        definition = self.ruleDefines[ruleName]
+        number = self.ruleNumbers[ruleName]
+        i, start, end = self.elementFragment(definition, 0, number, stack + (ruleName,))
+        if i != len(definition):
+            raise GrammarError(f"invalid definition of rule '{ruleName}'")
+        return start, end
+
+    def elementFragment(self, definition: gramparser.Definition, i: int, number: int,
+                        stack: Tuple[str, ...]) -> Tuple[int, int, int]:
+        """the fragment of the element (a word, list, rule, or group) at position i,
+        return the position after it, and the start and end states
+        """
+        kind, value = definition[i]
+        if kind in ('word', 'list'):
+            start, end = self.newState(), self.newState()
+            if kind == 'word':
+                self.wordEdges[start].setdefault(self.wordNames[value], []).append((number, end))
+            else:
+                self.otherEdges[start].append(('list', self.listNames[value], number, end))
+            return i + 1, start, end
+        if kind == 'rule':
+            ruleName = self.ruleNames[value]
+            if ruleName in self.ruleDefines:
+                start, end = self.ruleFragment(ruleName, stack)
+            elif ruleName in self.importRules:
+                start, end = self.importFragment(ruleName, value)
+            else:
+                raise GrammarError(f"rule '{ruleName}' was not defined or imported")
+            return i + 1, start, end
+        if kind != 'start':
+            raise GrammarError(f"invalid element in rule definition: {definition[i]}")
+
+        children = []
+        i += 1
+        while definition[i][0] != 'end':
+            i, start, end = self.elementFragment(definition, i, number, stack)
+            children.append((start, end))
+        if definition[i][1] != value:
+            raise GrammarError(f"unbalanced start and end in rule definition at element {i}")
+        start, end = self.newState(), self.newState()
+        if value == ElementCode.SeqCode:
+            self.epsilon[start].append(children[0][0])
+            for (_, childEnd), (childStart, _) in zip(children, children[1:]):
+                self.epsilon[childEnd].append(childStart)
+            self.epsilon[children[-1][1]].append(end)
+        else:
+            for childStart, childEnd in children:
+                self.epsilon[start].append(childStart)
+                self.epsilon[childEnd].append(end)
+            if value == ElementCode.RepCode:
+                for childStart, childEnd in children:
+                    self.epsilon[childEnd].append(childStart)
+            elif value == ElementCode.OptCode:
+                self.epsilon[start].append(end)
+        return i + 1, start, end
+
+    def importFragment(self, ruleName: str, number: int) -> Tuple[int, int]:
+        start, end = self.newState(), self.newState()
+        kind = self.importKinds.get(ruleName)
+        if kind == 'word':
+            self.otherEdges[start].append(('any', None, number, end))
+        elif kind == 'dictation':
+            self.otherEdges[start].append(('any', None, number, end))
+            self.otherEdges[end].append(('any', None, number, end))
+        elif kind == 'letters':
+            self.otherEdges[start].append(('letter', None, number, end))
+            self.otherEdges[end].append(('letter', None, number, end))
+        return start, end
+
+    def closure(self, state: int) -> Tuple[int, ...]:
+        """the states reachable from state without a word, in the order they are found
+        """
+        seen = {state: None}
+        stack = [state]
+        while stack:
+            for target in reversed(self.epsilon[stack.pop()]):
+                if target not in seen:
+                    seen[target] = None
+                    stack.append(target)
+        return tuple(seen)
+
+    # the lists:
+    def setList(self, listName: str, words: Iterable[str]) -> None:
+        if listName not in self.lists:
+            raise GrammarError(f"list '{listName}' is not used in the grammar")
+        self.lists[listName] = set([words] if isinstance(words, str) else words)
+
+    def appendList(self, listName: str, words: Iterable[str]) -> None:
+        if listName not in self.lists:
+            raise GrammarError(f"list '{listName}' is not used in the grammar")
+        self.lists[listName].update([words] if isinstance(words, str) else words)
+
+    def emptyList(self, listName: str) -> None:
+        self.setList(listName, [])
+
+    # matching:
+    def makeStartStates(self, ruleNames: List[str]) -> StartStates:
+        states: Dict[int, Any] = {}
+        for ruleName in ruleNames:
+            for state in self.closures[self.fragments[ruleName][0]]:
+                states.setdefault(state, None)
+        words: Dict[str, List[Tuple[int, int]]] = {}
+        for state in states:
+            for word, targets in self.wordEdges[state].items():
+                words.setdefault(word, []).extend(targets)
+        return states, words, [state for state in states if self.otherEdges[state]]
+
+    def match(self, words: Iterable[str], activeRules: Optional[Iterable[str]] = None) -> Optional[WordsAndNums]:
+        """return the (word, ruleNumber) list of words for the active exported rules (default all),
+        or None if the words do not match
+
+        When the words can be matched in more than one way, a word of the grammar wins over a list,
+        a list over dictation or letters, and otherwise the alternative written first.
+        """
+        ruleNames = list(self.fragments) if activeRules is None else [name for name in activeRules
+                                                                        if name in self.fragments]
+        closures, wordEdges, otherEdges, lists = self.closures, self.wordEdges, self.otherEdges, self.lists
+        key = tuple(ruleNames)
+        if key not in self.startStates:
+            self.startStates[key] = self.makeStartStates(ruleNames)
+        # state -> the path to it, as nested (previous path, (word, ruleNumber)) pairs:
+        startStates, startWords, startOthers = self.startStates[key]
+        current = startStates
+        nWords = 0
+        for word in words:
+            nWords += 1
+            if current is startStates:
+                wordTargets = [(None, number, target) for number, target in startWords.get(word, ())]
+                others = startOthers
+            else:
+                wordTargets = [(path, number, target) for state, path in current.items()
+                               for number, target in wordEdges[state].get(word, ())]
+                others = [state for state in current if otherEdges[state]]
+            # the words of the grammar first, then the lists, then dictation and letters:
+            following: Dict[int, Any] = {}
+            for path, number, target in wordTargets:
+                newPath = (path, (word, number))
+                for s in closures[target]:
+                    following.setdefault(s, newPath)
+            for state in others:
+                for kind, listName, number, target in otherEdges[state]:
+                    if kind == 'list' and word in lists[listName]:
+                        newPath = (current[state], (word, number))
+                        for s in closures[target]:
+                            following.setdefault(s, newPath)
+            for state in others:
+                for kind, _, number, target in otherEdges[state]:
+                    if kind == 'any' or (kind == 'letter' and isLetterWord(word)):
+                        newPath = (current[state], (word, number))
+                        for s in closures[target]:
+                            following.setdefault(s, newPath)
+            if not following:
+                return None
+            current = following
+        if not nWords:
+            return None
+        for ruleName in ruleNames:
+            final = self.fragments[ruleName][1]
+            if final in current:
+                wordsAndNums: WordsAndNums = []
+                path = current[final]
+                while path is not None:
+                    path, item = path
+                    wordsAndNums.append(item)
+                wordsAndNums.reverse()
+                return wordsAndNums
+        return None
+
+    def recognize(self, grammar: Any, words: Iterable[str], resObj: Any = None) -> Optional[WordsAndNums]:
+        """match the words against the active rules of grammar (a natlinkutils.GrammarBase),
+        and call its resultsCallback with the result, as Dragon does
+        """
+        wordsAndNums = self.match(words, activeRules=list(grammar.activeRules))
+        if wordsAndNums is not None:
+            grammar.resultsCallback(wordsAndNums, resObj)
+        return wordsAndNums
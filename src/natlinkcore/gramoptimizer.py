@@ -0,0 +1,146 @@
+"""an optional optimization pass over a parsed grammar, between GramParser.doParse and packGrammar
+
+The syntax tree of each rule (GramParser.ruleAsts, see gramast) is rewritten to an equivalent, smaller tree:
+
+- nested sequences and alternatives are flattened: "a (b c)" -> "a b c", "(a | b) | c" -> "a | b | c",
+  groups of one item disappear, and "[[a]]" becomes "[a]"
+- duplicate alternatives are removed: "a | b | a" -> "a | b"
+- common prefixes of alternatives are factored out, when that makes the rule smaller:
+  "a b | a c | a" -> "a [b | c]"
+
+The rules, their numbers and the words of each rule stay the same, so the recognition results, and the
+gotResults_XXX callbacks, do not change. Words that no longer occur stay in knownWords, with their numbers.
+
+```
+parser = GramParser(gramSpec)
+parser.doParse()
+parser.checkForErrors()
+report = optimizeGrammar(parser, grammarName)
+gramBin = packGrammar(parser)
+print(report)      # grammarName: 1200 -> 800 bytes (-33%), 140 -> 90 elements
+```
+
+natlinkutils.GrammarBase uses this via the grammar cache, when the setting optimize_grammars is on.
+"""
+#pylint:disable=C0115, C0116
+from typing import Dict, List, Optional
+
+from natlinkcore import gramparser
+from natlinkcore.gramast import Alt, Group, Leaf, Node, Opt, Seq, Wrapper, flatten
+
+class OptimizeReport:
+    """the size of a grammar before and after optimizeGrammar
+    """
+    __slots__ = ('grammarName', 'bytesBefore', 'bytesAfter', 'elementsBefore', 'elementsAfter')
+
+    def __init__(self, grammarName: str, bytesBefore: int, bytesAfter: int, elementsBefore: int, elementsAfter: int):
+        self.grammarName = grammarName
+        self.bytesBefore = bytesBefore
+        self.bytesAfter = bytesAfter
+        self.elementsBefore = elementsBefore
+        self.elementsAfter = elementsAfter
+
+    @property
+    def reduction(self) -> float:
+        """the fraction of bytes saved
+        """
+        return 1 - self.bytesAfter/self.bytesBefore if self.bytesBefore else 0.0
+
+    def __str__(self) -> str:
+        return (f'{self.grammarName or "grammar"}: {self.bytesBefore} -> {self.bytesAfter} bytes '
+                f'(-{self.reduction:.0%}), {self.elementsBefore} -> {self.elementsAfter} elements')
+
+
+def optimizeGrammar(parser: gramparser.GramParser, grammarName: Optional[str] = None) -> OptimizeReport:
+    """optimize the rules of a parsed grammar in place (ruleAsts and ruleDefines), and return the sizes
+    """
+    elementsBefore = sum(map(len, parser.ruleDefines.values()))
+    bytesBefore = len(gramparser.packGrammar(parser))
+    for ruleName, tree in parser.ruleAsts.items():
+        tree = optimizeNode(tree)
+        parser.ruleAsts[ruleName] = tree
+        parser.ruleDefines[ruleName] = flatten(tree)
+    elementsAfter = sum(map(len, parser.ruleDefines.values()))
+    # only the rule definitions changed:
+    bytesAfter = bytesBefore + (elementsAfter - elementsBefore)*gramparser.elementSize
+    return OptimizeReport(grammarName or parser.grammarName, bytesBefore, bytesAfter, elementsBefore, elementsAfter)
+
+
+def optimizeNode(node: Node) -> Node:
+    """return the optimized equivalent of a tree, the tree itself is not changed
+    """
+    if isinstance(node, Leaf):
+        return node
+    if isinstance(node, Wrapper):
+        item = optimizeNode(node.item)
+        if type(item) is type(node):
+            # [[a]] -> [a], (a+)+ -> a+
+            return item
+        return type(node)(item)
+    assert isinstance(node, Group)
+    items = [optimizeNode(item) for item in node.items]
+    if isinstance(node, Seq):
+        return makeSeq(items)
+    return makeAlt(items)
+
+
+def nodeSize(node: Node) -> int:
+    """the number of elements of the node in the rule definition
+    """
+    return sum(2 if isinstance(item, (Group, Wrapper)) else 1 for item in node.walk())
+
+
+def makeSeq(items: List[Node]) -> Node:
+    """a sequence of the items, with nested sequences flattened
+    """
+    flat: List[Node] = []
+    for item in items:
+        if isinstance(item, Seq):
+            flat.extend(item.items)
+        else:
+            flat.append(item)
+    if len(flat) == 1:
+        return flat[0]
+    return Seq(*flat)
+
+
+def makeAlt(items: List[Node]) -> Node:
+    """alternatives of the items, with nested alternatives flattened, duplicates removed
+    and common prefixes factored out
+    """
+    unique: Dict[Node, None] = {}
+    for item in items:
+        for alternative in (item.items if isinstance(item, Alt) else (item,)):
+            unique.setdefault(alternative, None)
+
+    # the alternatives as sequences, grouped by their first item:
+    groups: Dict[Node, List[List[Node]]] = {}
+    for alternative in unique:
+        sequence = list(alternative.items) if isinstance(alternative, Seq) else [alternative]
+        groups.setdefault(sequence[0], []).append(sequence)
+
+    alternatives: List[Node] = []
+    for sequences in groups.values():
+        if len(sequences) == 1:
+            alternatives.append(makeSeq(sequences[0]))
+            continue
+        n = 1
+        while all(len(sequence) > n and sequence[n] == sequences[0][n] for sequence in sequences):
+            n += 1
+        rests = [makeSeq(sequence[n:]) for sequence in sequences if len(sequence) > n]
+        rest = makeAlt(rests)
+        if len(rests) < len(sequences):
+            # one of the alternatives is the prefix itself:
+            rest = rest if isinstance(rest, Opt) else Opt(rest)
+        factored = makeSeq(sequences[0][:n] + [rest])
+        separate = [makeSeq(sequence) for sequence in sequences]
+        # the start and end markers of the new groups can cost more than a short prefix saves,
+        # when all alternatives have the prefix, the markers of this Alt are saved too:
+        if nodeSize(factored) < sum(map(nodeSize, separate)) + (2 if len(groups) == 1 else 0):
+            alternatives.append(factored)
+        else:
+            alternatives.extend(separate)
+
+    if len(alternatives) == 1:
+        return alternatives[0]
+    return Alt(*alternatives)
@@ -48,17 +48,43 @@ import os
 import os.path
 import pprint
 import re
+import sys
+from array import array
 from collections import OrderedDict
 from enum import unique, IntEnum
-from struct import pack
+from struct import Struct, calcsize, iter_unpack, pack_into
+from struct import error as StructError
 
 from typing import Optional, List, Iterator, Tuple, Dict, Iterable, Union, Any, Generator, TypeVar, Generic
 
+from natlinkcore import gramast
+
 preferredencoding = locale.getpreferredencoding()
 
 reAlphaNumeric = re.compile(r'\w+$')
 reValidName = re.compile(r'^[a-zA-Z0-9-_]+$')
 
+# for GramScanner: whitespace (as str.strip() sees it), and the tokens of the text, each with its leading whitespace.
+# The lines are joined with newlines (see GramScanner.tokenize), so quoted words, names and comments end at the
+# end of their line. The name of the matching group is the token, 'error' is a character that starts no token.
+# A 'word' can contain characters that are numeric, but not a digit, these are cut off in GramScanner.tokenize.
+reWhiteSpace = re.compile(r'\s*')
+reTokens = re.compile(r'''(\s*)(?:
+      (?P<punct>[()\[\]|+=;\0])
+    | "(?P<dqword>[^"\n]*)"
+    | '(?P<sqword>[^'\n]*)'
+    | <(?P<rule>[^>\n]*)>
+    | \{(?P<list>[^}\n]*)\}
+    | (?P<word>[^\W_]+)
+    | (?P<comment>\#[^\n]*)
+    | (?P<error>\S)
+    )''', re.VERBOSE)
+# the token and the error message for an opening character without its closing character:
+unclosedTokens = {'"': ('dqword', "expecting closing quote in word name"),
+                  "'": ('sqword', "expecting closing quote in word name"),
+                  '<': ('rule', "expecting closing angle bracket in rule name"),
+                  '{': ('list', "expecting closing brace in list name")}
+
 
 class GrammarParserError(Exception):
     """these exceptions all expect the scanObj as second parameter
@@ -170,6 +196,9 @@ class GramScanner:
 
     After every call to getAnotherToken or testAndEatToken the variables token
     and value will contain the details about the next token in the input stream.
+
+    The tokens are found in one pass over the text (see tokenize), getAnotherToken
+    takes them one by one.
     """
 
     def __init__(self, text: Optional[List[str]] = None, grammarName: Optional[str] = None) -> None:
@@ -187,6 +216,11 @@ class GramScanner:
         self.lastWhiteSpace: str = ""  # for gramscannerreverse
         self.grammarName: str = grammarName or ""
         self.phase: str = "before"
+        # (line, start, token, value, end) from tokenize, the index of the next one,
+        # and the (line, char) position they continue from:
+        self.tokens: List[Tuple[int, int, str, Optional[str], int]] = []
+        self.tokenIndex: int = 0
+        self.tokensPos: Optional[Tuple[int, int]] = None
 
     def newText(self, text: List[str]) -> None:
         GramScanner.__init__(self, text)
@@ -216,16 +250,14 @@ class GramScanner:
         ch = self.char
         oldPos = ch
         oldLine = self.line
+        text = self.text
         while 1:
-            ln = self.text[self.line]
-            lnLen = len(ln)
-            while ch < lnLen and not ln[ch].strip():  # in string.whitespace:
-                ch = ch + 1
-            if ch < lnLen and ln[ch] != '#':
+            ln = text[self.line]
+            ch = reWhiteSpace.match(ln, ch).end()
+            if ch < len(ln) and ln[ch] != '#':
                 break
             self.line = self.line + 1
-            self.text[self.line] = self.text[self.line].replace('\t', ' ')
-            self.text[self.line] = self.text[self.line].replace('\n', ' ')
+            text[self.line] = text[self.line].replace('\t', ' ').replace('\n', ' ')
             ch = 0
         self.char = ch
         if self.line == oldLine:
@@ -254,67 +286,88 @@ class GramScanner:
 
         self.value = None
 
-        self.skipWhiteSpace()  # now leaves self.lastWhiteSpace
-        ch = self.char
-        ln = self.text[self.line]
-        lnLen = len(ln)
-
-        self.start = ch
-
-        if ln[ch] in ['(', ')', '[', ']', '|', '+', '=', ';', '\0']:
-            self.token = ln[ch]
-            ch = ch + 1
-
-        elif ln[ch] == '"':
-            self.token = 'dqword'
-            ch = ch + 1
-            while ch < lnLen and ln[ch] != '"':
-                ch = ch + 1
-            if ch >= lnLen:
-                raise LexicalError("expecting closing quote in word name", self)
-            self.value = ln[self.start + 1:ch]
-            ch = ch + 1
-
-        elif ln[ch] == "'":
-            self.token = 'sqword'
-            ch = ch + 1
-            while ch < lnLen and ln[ch] != "'":
-                ch = ch + 1
-            if ch >= lnLen:
-                raise LexicalError("expecting closing quote in word name", self)
-            self.value = ln[self.start + 1:ch]
-            ch = ch + 1
-
-        elif ln[ch] == '<':
-            self.token = 'rule'
-            ch = ch + 1
-            while ch < lnLen and ln[ch] != '>':
-                ch = ch + 1
-            if ch >= lnLen:
-                raise LexicalError("expecting closing angle bracket in rule name", self)
-            self.value = ln[self.start + 1:ch]
-            ch = ch + 1
-
-        elif ln[ch] == '{':
-            self.token = 'list'
-            ch = ch + 1
-            while ch < lnLen and ln[ch] != '}':
-                ch = ch + 1
-            if ch >= lnLen:
-                raise LexicalError("expecting closing brace in list name", self)
-            self.value = ln[self.start + 1:ch]
-            ch = ch + 1
-
-        elif isCharOrDigit(ln[ch]):
-            self.token = 'word'
-            while ch < lnLen and isCharOrDigit(ln[ch]):
-                ch = ch + 1
-            self.value = ln[self.start:ch]
-
+        if self.tokensPos != (self.line, self.char):
+            # the first token, or the position was changed from outside:
+            self.tokens, self.tokenIndex = self.tokenize(), 0
+        line, start, token, value, end = self.tokens[self.tokenIndex]
+        self.tokenIndex += 1
+
+        # the leading whitespace and comments, as skipWhiteSpace would find them:
+        text = self.text
+        oldLine, oldPos = self.line, self.char
+        if line == oldLine:
+            self.lastWhiteSpace = text[line][oldPos:start]
         else:
+            for l in range(oldLine + 1, line + 1):
+                text[l] = text[l].replace('\t', ' ').replace('\n', ' ')
+            self.lastWhiteSpace = '\n'.join([text[oldLine][oldPos:]] + text[oldLine + 1:line] + [text[line][:start]])
+        self.line = line
+        self.start = self.char = start
+
+        if token == 'error':
+            ch = text[line][start]
+            if ch in unclosedTokens:
+                self.token, message = unclosedTokens[ch]
+                raise LexicalError(message, self)
             raise LexicalError("unknown character found", self)
 
-        self.char = ch
+        self.token = token
+        self.value = value
+        self.char = end
+        self.tokensPos = (line, end)
+
+    def tokenize(self) -> List[Tuple[int, int, str, Optional[str], int]]:
+        """return the (line, start, token, value, end) tuples from the current position
+
+        The list ends with the '\\0' token, or with an 'error' token at an invalid character.
+        The lines after the current line are taken with tabs and newlines replaced by spaces,
+        as getAnotherToken does with self.text, and joined with newlines, so the regex runs
+        once over the whole text. The line of a token is counted from the line lengths.
+        """
+        tokens: List[Tuple[int, int, str, Optional[str], int]] = []
+        text = self.text
+        line = firstLine = self.line
+        # the newlines of the current line are kept in self.text, but do not end a line here:
+        first = text[line]
+        lines = [first.replace('\n', ' ')] + [ln.replace('\t', ' ').replace('\n', ' ') for ln in text[line + 1:]]
+        newlinesInFirst = '\n' in first
+        # the offset of the current line in the joined text, and of the line after it:
+        lineStart, nextStart = 0, len(first) + 1
+        for m in reTokens.finditer('\n'.join(lines), self.char):
+            token = m.lastgroup
+            start = m.end(1)
+            while start >= nextStart:
+                line += 1
+                lineStart, nextStart = nextStart, nextStart + len(text[line]) + 1
+            start -= lineStart
+            # the most frequent token first:
+            if token == 'word':
+                value = m.group(token)
+                if not (value.isascii() or value.isalpha() or value.isdigit()):
+                    # \w also matches characters that are numeric, but no digit:
+                    for i, c in enumerate(value):
+                        if not isCharOrDigit(c):
+                            if i:
+                                tokens.append((line, start, token, value[:i], start + i))
+                            tokens.append((line, start + i, 'error', None, start + i))
+                            return tokens
+                tokens.append((line, start, token, value, start + len(value)))
+            elif token == 'punct':
+                token = m.group(token)
+                tokens.append((line, start, token, None, start + 1))
+                if token == '\0':
+                    return tokens
+            elif token == 'error':
+                tokens.append((line, start, token, None, start))
+                return tokens
+            elif token != 'comment':
+                value = m.group(token)
+                if newlinesInFirst and line == firstLine:
+                    # a quoted word or name with the newlines of the current line:
+                    value = first[start + 1:start + 1 + len(value)]
+                # the value and its quotes or brackets:
+                tokens.append((line, start, token, value, start + len(value) + 2))
+        return tokens
 
 
 class GramScannerReverse(GramScanner):
@@ -389,6 +442,10 @@ class GramParser:
     The definition of a rule is an array which contains tuples.  The array
     contains the rule elements in sequence.  The tuples are pairs of element
     type and element value
+
+    The parse methods build the syntax tree of each rule (ruleAsts, see gramast),
+    the definition is made from it in one pass, so parsing is linear in the size
+    of a rule.
     """
 
     def __init__(self, text: Union[str, List[str]], grammarName: Optional[str] = None):
@@ -401,6 +458,7 @@ class GramParser:
         self.exportRules: Dict[str, int] = dict()
         self.importRules: Dict[str, int] = dict()
         self.ruleDefines: Dict[str, Definition] = dict()
+        self.ruleAsts: Dict[str, gramast.Node] = dict()
         self.grammarName: str = grammarName or ""
         text = splitApartLines(text)
 
@@ -421,6 +479,7 @@ class GramParser:
             raise GrammarSyntaxError("expecting rule name to start rule definition", self.scanObj)
         ruleName = self.scanObj.value
         assert isinstance(ruleName, str)
+        ruleName = sys.intern(ruleName)
         if not isValidListOrRulename(ruleName):
             raise GrammarSyntaxError('rulename may may only contain ascii letters, digits or - or _: "%s"' % ruleName,
                                      self.scanObj)
@@ -443,42 +502,35 @@ class GramParser:
                 self.exportRules[ruleName] = ruleNumber
                 self.scanObj.getAnotherToken()
             self.scanObj.testAndEatToken('=')
-            self.ruleDefines[ruleName] = self.parseExpr()
+            self.ruleAsts[ruleName] = self.parseExpr()
+            self.ruleDefines[ruleName] = gramast.flatten(self.ruleAsts[ruleName])
         self.scanObj.testAndEatToken(';')
 
-    def parseExpr(self) -> Definition:
-        definition: Definition = []
-        moreThanOne = 0
-        while 1:
-            definition = definition + self.parseExpr2()
-            if self.scanObj.token != '|':
-                break
+    def parseExpr(self) -> gramast.Node:
+        items = [self.parseExpr2()]
+        while self.scanObj.token == '|':
             self.scanObj.getAnotherToken()
-            moreThanOne = 1
-        if moreThanOne:
-            return [('start', ElementCode.AltCode.value)] + definition + [('end', ElementCode.AltCode.value)]
-        return definition
-
-    def parseExpr2(self) -> Definition:
-        definition: Definition = []
-        moreThanOne = 0
-        while 1:
-            definition = definition + self.parseExpr3()
-            if self.scanObj.token not in ('word', 'sqword', 'dqword', 'rule', 'list', '(', '['):
-                break
-            moreThanOne = 1
-        if moreThanOne:
-            return [('start', ElementCode.SeqCode.value)] + definition + [('end', ElementCode.SeqCode.value)]
-        return definition
-
-    def parseExpr3(self) -> Definition:
-        definition = self.parseExpr4()
+            items.append(self.parseExpr2())
+        if len(items) > 1:
+            return gramast.Alt(*items)
+        return items[0]
+
+    def parseExpr2(self) -> gramast.Node:
+        items = [self.parseExpr3()]
+        while self.scanObj.token in ('word', 'sqword', 'dqword', 'rule', 'list', '(', '['):
+            items.append(self.parseExpr3())
+        if len(items) > 1:
+            return gramast.Seq(*items)
+        return items[0]
+
+    def parseExpr3(self) -> gramast.Node:
+        node = self.parseExpr4()
         if self.scanObj.token == '+':
             self.scanObj.getAnotherToken()
-            return [('start', ElementCode.RepCode.value)] + definition + [('end', ElementCode.RepCode.value)]
-        return definition
+            return gramast.Rep(node)
+        return node
 
-    def parseExpr4(self) -> Definition:
+    def parseExpr4(self) -> gramast.Node:
         if self.scanObj.token in ['word', 'sqword', 'dqword']:
             wordName = self.scanObj.value
             if not wordName:
@@ -490,7 +542,7 @@ class GramParser:
                 self.nextWord = self.nextWord + 1
                 self.knownWords[wordName] = wordNumber
             self.scanObj.getAnotherToken()
-            return [('word', wordNumber)]
+            return gramast.Word(wordName, wordNumber)
 
         if self.scanObj.token == 'list':
             listName = self.scanObj.value
@@ -505,9 +557,10 @@ class GramParser:
             else:
                 listNumber = self.nextList
                 self.nextList = self.nextList + 1
+                listName = sys.intern(listName)
                 self.knownLists[listName] = listNumber
             self.scanObj.getAnotherToken()
-            return [('list', listNumber)]
+            return gramast.List(listName, listNumber)
 
         if self.scanObj.token == 'rule':
             ruleName = self.scanObj.value
@@ -522,22 +575,23 @@ class GramParser:
             else:
                 ruleNumber = self.nextRule
                 self.nextRule = self.nextRule + 1
+                ruleName = sys.intern(ruleName)
                 self.knownRules[ruleName] = ruleNumber
             self.scanObj.getAnotherToken()
-            return [('rule', ruleNumber)]
+            return gramast.RuleRef(ruleName, ruleNumber)
 
         if self.scanObj.token == '(':
             self.scanObj.getAnotherToken()
-            definition = self.parseExpr()
+            node = self.parseExpr()
             self.scanObj.testAndEatToken(')')
-            return definition
+            return node
 
         if self.scanObj.token == '[':
             self.scanObj.getAnotherToken()
-            definition = self.parseExpr()
+            node = self.parseExpr()
             self.scanObj.testAndEatToken(']')
-            # self.reportOptionalRule(definition)
-            return [('start', ElementCode.OptCode.value)] + definition + [('end', ElementCode.OptCode.value)]
+            # self.reportOptionalRule(gramast.flatten(node))
+            return gramast.Opt(node)
 
         raise GrammarSyntaxError("expecting expression (word, rule, etc.)", self.scanObj)
 
@@ -635,6 +689,86 @@ class GramParser:
         raise ValueError('invalid item in nicenItem: %s' % i)
 
 
+# the native formats of the binary grammar: a pair of DWORDs (chunk headers and rule headers),
+# a word entry (a pair of DWORDs and the padded name) and the element of a rule definition.
+# Sizes in the headers are counted with 4 byte DWORDs, as on Windows.
+headerStruct = Struct("LL")
+elementFormat = "HHL"
+elementSize = calcsize(elementFormat)
+elemType = {'start': 1, 'end': 2, 'word': 3, 'rule': 4, 'list': 6}
+# on a little endian machine an element (type, 0, value) has the memory layout of two unsigned longs
+# (type, value), so the elements of a rule can be written as one array:
+elementsAsLongs = sys.byteorder == 'little' and elementSize == 2*array('L').itemsize == 2*calcsize('L')
+# the structs of word entries, by padded length of the name:
+entryStructs: Dict[int, Struct] = {}
+
+
+class EncodedNames:
+    """a bounded cache of the struct, padded length and encoded bytes of the chunk entries of the rule
+    and list names of the grammars
+
+    packGrammar encodes a rule or list name once while it is in the cache, which keeps the last
+    maxEntries names encoded, in the encoding of the last pack. Words are encoded at each pack,
+    there are too many of them to keep.
+
+    The rule and list names themselves are shared with sys.intern (by GramParser and the compiled
+    grammars of the grammar cache), so the grammars keep one str object per name, freed with the
+    last grammar that uses it.
+    """
+    def __init__(self, maxEntries: int = 4096) -> None:
+        self.maxEntries = maxEntries
+        self.encoding = preferredencoding
+        self.entries: 'OrderedDict[str, Tuple[Struct, int, bytes]]' = OrderedDict()
+
+    def encodedEntries(self, encoding: str) -> 'OrderedDict[str, Tuple[Struct, int, bytes]]':
+        """the cached chunk entries (see entry) of the names, for the encoding
+        """
+        if encoding != self.encoding:
+            self.entries.clear()
+            self.encoding = encoding
+        return self.entries
+
+    def entry(self, name: str, encoding: str) -> Tuple[Struct, int, bytes]:
+        """the struct, padded length and encoded name of the chunk entry of name
+        """
+        entries = self.encodedEntries(encoding)
+        cached = entries.get(name)
+        if cached is None:
+            word = name.encode(encoding)
+            paddedLen = (len(word) + 4) & 0xFFFC
+            struct = entryStructs.get(paddedLen)
+            if struct is None:
+                struct = entryStructs[paddedLen] = Struct("LL%ds" % paddedLen)
+            cached = (struct, paddedLen, word)
+            if self.maxEntries > 0:
+                while len(entries) >= self.maxEntries:
+                    # the name encoded first:
+                    entries.popitem(last=False)
+                entries[name] = cached
+        return cached
+
+    def retainedBytes(self) -> int:
+        """the size of the cached entries: the names, their encoded bytes and the tuples
+        """
+        return sum(sys.getsizeof(name) + sys.getsizeof(entry) + sys.getsizeof(entry[2])
+                   for name, entry in self.entries.items())
+
+    def info(self) -> Dict[str, int]:
+        return {'entries': len(self.entries), 'max_entries': self.maxEntries,
+                'retained_bytes': self.retainedBytes()}
+
+    def report(self) -> str:
+        info = self.info()
+        return (f'--- encoded grammar names: {info["entries"]} of at most {info["max_entries"]} cached, '
+                f'{info["retained_bytes"]} bytes retained')
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+# the cache shared by all grammars of this process:
+encodedNames = EncodedNames()
+
+
 def packGrammar(parseObj: GramParser) -> bytes:
     """
     This function takes a GramParser class which contains the parse of a grammar
@@ -648,78 +782,284 @@ def packGrammar(parseObj: GramParser) -> bytes:
 
     The fifth chunk contains the details of the elements which make up each
     defined rule.
+
+    The chunks are measured first, and then written into one preallocated buffer.
     """
+    chunks = []
+    for chunktype, chunkdict in ((4, parseObj.exportRules), (5, parseObj.importRules),
+                                 (6, parseObj.knownLists), (2, parseObj.knownWords)):
+        if chunkdict:
+            entries = chunkEntries(chunkdict, cacheNames=chunktype != 2)
+            chunks.append((chunkSize(entries), packChunkInto, (chunktype, entries)))
+    if parseObj.ruleDefines:
+        chunks.append((rulesSize(parseObj.ruleDefines), packRulesInto,
+                       (3, parseObj.knownRules, parseObj.ruleDefines)))
+
     # header:
     #   DWORD dwType  = 0
     #   DWORD dwFlags = 0
-    output = [pack("LL", 0, 0)]
-
-    # various chunks
-    if parseObj.exportRules:
-        output.append(packGrammarChunk(4, parseObj.exportRules))
-    if parseObj.importRules:
-        output.append(packGrammarChunk(5, parseObj.importRules))
-    if parseObj.knownLists:
-        output.append(packGrammarChunk(6, parseObj.knownLists))
-    if parseObj.knownWords:
-        output.append(packGrammarChunk(2, parseObj.knownWords))
-    if parseObj.ruleDefines:
-        output.append(packGrammarRules(3, parseObj.knownRules, parseObj.ruleDefines))
-    return b"".join(output)
+    buffer = bytearray(headerStruct.size + sum(size for size, _, _ in chunks))
+    headerStruct.pack_into(buffer, 0, 0, 0)
+    offset = headerStruct.size
+    for _, packInto, args in chunks:
+        offset = packInto(buffer, offset, *args)
+    return bytes(buffer)
 
 
 def packGrammarChunk(chunktype: int, chunkdict: Dict) -> bytes:
-    output: List[bytes] = []
-    totalLen = 0
+    entries = chunkEntries(chunkdict, cacheNames=chunktype != 2)
+    buffer = bytearray(chunkSize(entries))
+    packChunkInto(buffer, 0, chunktype, entries)
+    return bytes(buffer)
 
+
+def chunkEntries(chunkdict: Dict, cacheNames: bool = True) -> List[Tuple[Struct, int, int, bytes]]:
+    """the struct, the padded length of the name, the number and the encoded name of the chunk entries
+
+    cacheNames: take the entries of the names from encodedNames (rule and list names), else encode them
+    here (words, there are too many of them to cache)
+    """
+    entries = []
+    cached = encodedNames.encodedEntries(preferredencoding) if cacheNames else {}
     for word, value in chunkdict.items():
-        if isinstance(word, str):
-            word = word.encode(preferredencoding)
-        # if type(value) == str: value = value.encode()
-        # chunk data entry
-        #   DWORD dwSize = number of bytes in entry
-        #   DWORD dwNum  = ID number for this rule/word
-        #   DWORD szName = name of rule/word, zero-term'd and padded to dword
-        paddedLen = (len(word) + 4) & 0xFFFC
-        output.append(pack("LL%ds" % paddedLen, paddedLen + 8, value, word))
-        totalLen = totalLen + paddedLen + 8
+        entry = cached.get(word)
+        if entry is not None:
+            struct, paddedLen, word = entry
+        elif cacheNames and isinstance(word, str):
+            struct, paddedLen, word = encodedNames.entry(word, preferredencoding)
+        else:
+            if isinstance(word, str):
+                word = word.encode(preferredencoding)
+            paddedLen = (len(word) + 4) & 0xFFFC
+            struct = entryStructs.get(paddedLen)
+            if struct is None:
+                struct = entryStructs[paddedLen] = Struct("LL%ds" % paddedLen)
+        entries.append((struct, paddedLen, value, word))
+    return entries
+
+
+def chunkSize(entries: List[Tuple[Struct, int, int, bytes]]) -> int:
+    return headerStruct.size + sum(struct.size for struct, _, _, _ in entries)
+
 
+def packChunkInto(buffer: bytearray, offset: int, chunktype: int,
+                  entries: List[Tuple[Struct, int, int, bytes]]) -> int:
+    """write the chunk at offset, and return the offset after it
+    """
     # chunk header
     #   DWORD dwChunkID = type
     #   DWORD dwChunkSize = number of bytes in chunk not including this header
-    output.insert(0, pack("LL", chunktype, totalLen))
-    return b"".join(output)
+    headerStruct.pack_into(buffer, offset, chunktype, sum(paddedLen + 8 for _, paddedLen, _, _ in entries))
+    offset += headerStruct.size
+    for struct, paddedLen, value, word in entries:
+        # chunk data entry
+        #   DWORD dwSize = number of bytes in entry
+        #   DWORD dwNum  = ID number for this rule/word
+        #   DWORD szName = name of rule/word, zero-term'd and padded to dword
+        struct.pack_into(buffer, offset, paddedLen + 8, value, word)
+        offset += struct.size
+    return offset
 
 
 def packGrammarRules(chunktype: int, names: Dict[str, int], chunkdict: Dict[str, Definition]) -> bytes:
-    output: List[bytes] = []
-    totalLen = 0
-    elemType = {'start': 1, 'end': 2, 'word': 3, 'rule': 4, 'list': 6}
-
-    for word, _ in chunkdict.items():
-        ruleDef: List[bytes] = []
-        ruleLen = 0
-
-        for element in chunkdict[word]:
-            # repeated element:
-            #   WORD wType    = element type
-            #   WORD wProb    = 0
-            #   DWORD dwValue = element value
-            ruleDef.append(pack("HHL", elemType[element[0]], 0, element[1]))
-            ruleLen = ruleLen + 8
+    buffer = bytearray(rulesSize(chunkdict))
+    packRulesInto(buffer, 0, chunktype, names, chunkdict)
+    return bytes(buffer)
 
-        # rule definition:
-        #   DWORD dwSize = number of bytes in rule definition
-        #   DWORD dwnum  = ID number of rule
-        output.append(pack("LL", ruleLen + 8, names[word]))
-        output.append(b"".join(ruleDef))
-        totalLen = totalLen + ruleLen + 8
 
+def rulesSize(chunkdict: Dict[str, Definition]) -> int:
+    return headerStruct.size*(len(chunkdict) + 1) + elementSize*sum(map(len, chunkdict.values()))
+
+
+def packRulesInto(buffer: bytearray, offset: int, chunktype: int, names: Dict[str, int],
+                  chunkdict: Dict[str, Definition]) -> int:
+    """write the rules chunk at offset, and return the offset after it
+
+    The elements of a rule are written at once, as an array or with one pack_into call.
+    """
     # chunk header:
     #   DWORD dwChunkID = type
     #   DWORD dwChunkSize = number of bytes in chunk not including this header
-    output.insert(0, pack("LL", chunktype, totalLen))
-    return b"".join(output)
+    headerStruct.pack_into(buffer, offset, chunktype, sum(8*len(definition) + 8 for definition in chunkdict.values()))
+    offset += headerStruct.size
+
+    for word, definition in chunkdict.items():
+        # rule definition:
+        #   DWORD dwSize = number of bytes in rule definition
+        #   DWORD dwnum  = ID number of rule
+        headerStruct.pack_into(buffer, offset, 8*len(definition) + 8, names[word])
+        offset += headerStruct.size
+        # repeated element:
+        #   WORD wType    = element type
+        #   WORD wProb    = 0
+        #   DWORD dwValue = element value
+        n = len(definition)
+        if not n:
+            continue
+        kinds, values = zip(*definition)
+        if elementsAsLongs:
+            longs = array('L', bytes(elementSize*n))
+            longs[0::2] = array('L', map(elemType.__getitem__, kinds))
+            longs[1::2] = array('L', values)
+            buffer[offset:offset + elementSize*n] = longs
+        else:
+            pack_into(elementFormat*n, buffer, offset,
+                      *[x for kind, value in definition for x in (elemType[kind], 0, value)])
+        offset += elementSize*n
+    return offset
+
+
+class UnpackedGrammar:
+    """the structures of a binary grammar, as read back by unpackGrammar
+
+    It has the attributes of a GramParser that packGrammar uses, so
+    packGrammar(unpackGrammar(gramBin)) == gramBin for the output of packGrammar.
+
+    Rules that are defined, but not exported or imported, have no name in the binary,
+    they get the name "#<number>".
+    """
+    def __init__(self) -> None:
+        self.header: Tuple[int, int] = (0, 0)
+        self.exportRules: Dict[str, int] = dict()
+        self.importRules: Dict[str, int] = dict()
+        self.knownLists: Dict[str, int] = dict()
+        self.knownWords: Dict[str, int] = dict()
+        self.knownRules: Dict[str, int] = dict()
+        self.ruleDefines: Dict[str, Definition] = dict()
+        self.otherChunks: Dict[int, Dict[str, int]] = dict()   # other chunk types, like in selection grammars
+
+    def niceDefinitions(self) -> Dict[str, List[Tuple[str, str]]]:
+        """the rule definitions with names instead of numbers, as in GramParser.dumpStringNice
+        """
+        rulesRev = {v: k for k, v in self.knownRules.items()}
+        wordsRev = {v: k for k, v in self.knownWords.items()}
+        listsRev = {v: k for k, v in self.knownLists.items()}
+        codeRev = {code.value: code.name for code in ElementCode}
+        return {ruleName: [GramParser.nicenItem(item, rulesRev, wordsRev, listsRev, codeRev) for item in definition]
+                for ruleName, definition in self.ruleDefines.items()}
+
+
+# the element types of the binary grammar, by number:
+elemNames = {v: k for k, v in elemType.items()}
+# the attributes of UnpackedGrammar for the chunks of names and numbers:
+chunkAttributes = {4: 'exportRules', 5: 'importRules', 6: 'knownLists', 2: 'knownWords'}
+
+
+def unpackGrammar(gramBin: bytes) -> UnpackedGrammar:
+    """read a binary grammar, as made by packGrammar, back into its structures
+
+    Raises GrammarError if the binary is not a valid grammar.
+    """
+    grammar = UnpackedGrammar()
+    headerSize = headerStruct.size
+    if len(gramBin) < headerSize:
+        raise GrammarError("binary grammar is too short")
+    grammar.header = headerStruct.unpack_from(gramBin, 0)
+    offset = headerSize
+    rules: Dict[int, Definition] = {}
+    try:
+        while offset < len(gramBin):
+            chunktype, chunkSize = headerStruct.unpack_from(gramBin, offset)
+            offset += headerSize
+            if chunktype == 3:
+                offset = unpackRulesFrom(gramBin, offset, chunkSize, rules)
+            else:
+                names: Dict[str, int] = {}
+                offset = unpackChunkFrom(gramBin, offset, chunkSize, names)
+                if chunktype in chunkAttributes:
+                    setattr(grammar, chunkAttributes[chunktype], names)
+                else:
+                    grammar.otherChunks[chunktype] = names
+    except (StructError, KeyError, UnicodeDecodeError) as exc:
+        raise GrammarError(f"invalid binary grammar at byte {offset}: {exc!r}") from exc
+    if offset != len(gramBin):
+        raise GrammarError("binary grammar is truncated")
+
+    grammar.knownRules.update(grammar.exportRules)
+    grammar.knownRules.update(grammar.importRules)
+    ruleNames = {v: k for k, v in grammar.knownRules.items()}
+    for number, definition in rules.items():
+        if number not in ruleNames:
+            ruleNames[number] = f'#{number}'
+            grammar.knownRules[ruleNames[number]] = number
+        grammar.ruleDefines[ruleNames[number]] = definition
+    return grammar
+
+
+def unpackChunkFrom(gramBin: bytes, offset: int, chunkSize: int, names: Dict[str, int]) -> int:
+    """read the names and numbers of a chunk into names, and return the offset after the chunk
+    """
+    counted = 0
+    while counted < chunkSize:
+        entrySize, value = headerStruct.unpack_from(gramBin, offset)
+        paddedLen = entrySize - 8
+        start = offset + headerStruct.size
+        offset = start + paddedLen
+        if paddedLen <= 0 or offset > len(gramBin):
+            raise GrammarError(f"invalid entry in binary grammar at byte {start - headerStruct.size}")
+        name = gramBin[start:offset]
+        names[name[:name.index(b'\0')].decode(preferredencoding)] = value
+        counted += entrySize
+    return offset
+
+
+def unpackRulesFrom(gramBin: bytes, offset: int, chunkSize: int, rules: Dict[int, Definition]) -> int:
+    """read the rule definitions (by rule number) into rules, and return the offset after the chunk
+    """
+    counted = 0
+    while counted < chunkSize:
+        ruleSize, number = headerStruct.unpack_from(gramBin, offset)
+        n = (ruleSize - 8)//8
+        start = offset + headerStruct.size
+        offset = start + elementSize*n
+        if n < 0 or offset > len(gramBin):
+            raise GrammarError(f"invalid rule definition in binary grammar at byte {start - headerStruct.size}")
+        if elementsAsLongs:
+            longs = array('L', gramBin[start:offset])
+            rules[number] = list(zip(map(elemNames.__getitem__, longs[0::2]), longs[1::2]))
+        else:
+            rules[number] = [(elemNames[kind], value) for kind, _, value in
+                             iter_unpack(elementFormat, gramBin[start:offset])]
+        counted += ruleSize
+    return offset
+
+
+def diffGrammars(gramBin1: bytes, gramBin2: bytes) -> List[str]:
+    """compare two binary grammars, and return the differences as lines of text
+
+    An empty list means the binaries are identical. The rules are compared by their definitions
+    with names, so only renumbering of words, lists or rules gives a single line. Rules that are
+    not exported or imported are only known by number ("#<number>", see unpackGrammar).
+    """
+    if gramBin1 == gramBin2:
+        return []
+    grammar1, grammar2 = unpackGrammar(gramBin1), unpackGrammar(gramBin2)
+    L: List[str] = []
+    for name, label in (('exportRules', 'exported rules'), ('importRules', 'imported rules'),
+                        ('knownLists', 'lists'), ('knownWords', 'words')):
+        names1, names2 = getattr(grammar1, name), getattr(grammar2, name)
+        removed = [n for n in names1 if n not in names2]
+        added = [n for n in names2 if n not in names1]
+        if removed:
+            L.append(f'{label} removed: {", ".join(removed)}')
+        if added:
+            L.append(f'{label} added: {", ".join(added)}')
+    definitions1, definitions2 = grammar1.niceDefinitions(), grammar2.niceDefinitions()
+    for ruleName, definition in definitions1.items():
+        if ruleName not in definitions2:
+            L.append(f'rule removed: {ruleName}')
+        elif definition != definitions2[ruleName]:
+            L.append(f'rule changed: {ruleName}')
+    for ruleName in definitions2:
+        if ruleName not in definitions1:
+            L.append(f'rule added: {ruleName}')
+    if grammar1.header != grammar2.header:
+        L.append(f'header changed: {grammar1.header} -> {grammar2.header}')
+    if grammar1.otherChunks != grammar2.otherChunks:
+        L.append('other chunks changed')
+    if not L:
+        L.append('same grammar, with other numbers or order')
+    return L
 
 
 #
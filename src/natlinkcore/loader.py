@@ -1,5 +1,7 @@
 #pylint:disable=C0114, C0115, C0116, R1705, R0902, R0904, R0911, R0912, R0915, W0703, E1101, W1203, W0719
 #pylint:disable=R1710, W0603
+import builtins
+import graphlib
 import importlib
 import importlib.machinery
 import importlib.util
@@ -10,18 +12,29 @@ import sys
 import time
 import traceback
 import winreg
-import configparser
+import hashlib
+from collections import deque
+from contextlib import contextmanager
 from pathlib import Path
 from types import ModuleType
-from typing import List, Dict, Set, Iterable, Any, Tuple, Callable
+from typing import List, Dict, Set, Iterable, Any, Tuple, Callable, Deque, Iterator
 from pydebugstring import outputDebugString,OutputDebugStringHandler
 import debugpy
 
 import natlink
-from natlinkcore.config import LogLevel, NatlinkConfig, expand_path
-from natlinkcore.natlinkutils import idd_reload, idd_exit
-from natlinkcore.readwritefile import ReadWriteFile
+from natlinkcore.config import LogLevel, NatlinkConfig, LOAD_PRIORITIES, expand_path, expand_natlink_settingsdir
+from natlinkcore.natlinkutils import (idd_reload, idd_exit, checkLazyGrammars, loadedGrammarBins, retainGrammars,
+                                     releaseRetainedGrammars)
+from natlinkcore.configcache import config_cache
 from natlinkcore.callbackhandler import CallbackHandler
+from natlinkcore.filewatcher import FileWatcher, create_watcher
+from natlinkcore.gramanalysis import GrammarAnalysis
+from natlinkcore.gramcache import grammar_cache
+from natlinkcore.gramparser import GrammarError, diffGrammars, encodedNames, unpackGrammar
+from natlinkcore.grammarfinder import GrammarFinder
+from natlinkcore.loadstats import LoadStats
+from natlinkcore.loadsnapshot import LoadSnapshot
+from natlinkcore.precompile import precompile
 from natlinkcore.singleton import Singleton
 # the possible languages (for get_user_language) (runs at start and on_change_callback, user)
 # default is "enx", being one of the English dialects...
@@ -69,12 +82,56 @@ class NatlinkMain(metaclass=Singleton):
         self._on_mic_on_callback = CallbackHandler('on_mic_on')
         self._on_mic_off_callback = CallbackHandler('on_mic_off')
         self._on_begin_utterance_callback = CallbackHandler('on_begin_utterance')
+        self._on_user_changed_callback = CallbackHandler('on_user_changed')
         self.seen: Set[Path] = set()     # start empty in trigger_load
         self.bom = self.encoding = self.config_text = ''   # getconfigsetting and writeconfigsetting
         self.dap_started=False
         # for shorter logger.debug messages
         self.prev_module_info = None
-
+        # directory scan cache for _module_paths_in_dirs, keyed on the directory name,
+        # value: (st_mtime_ns of the directory, sorted .py files with __init__.py first,
+        #         index from program name to the program specific files)
+        self._scan_cache: Dict[str, Tuple[int, List[Path], Dict[str, List[Path]]]] = {}
+        self.scan_cache_hits = 0
+        self.scan_cache_misses = 0
+        # optional background watcher of the directories (config setting watch_directories):
+        self.file_watcher: Any = None
+        self._full_load_done: Any = None    # user of the last full load
+        # timing of imports, reloads and unloads per module, and of each load pass:
+        self.load_stats = LoadStats()
+        # budgeted loading (config setting load_budget_ms): the modules that still have to be (re)loaded,
+        # processed at the next begin callbacks and natlinktimer ticks:
+        self._pending_loads: Deque[Path] = deque()
+        self._pending_load_state: Any = None
+        self._pending_budget_ms: float = 0
+        self._post_load_pending = False
+        self._user_changed_pending = False  # the on_user_changed callbacks wait for the pending loads
+        self._pending_timer_on = False
+        self.pending_load_interval = 100   # milliseconds between natlinktimer ticks
+        # milliseconds per natlinktimer tick for the low priority and lazy modules, when load_budget_ms is 0:
+        self.background_load_budget_ms = 50
+        # modules with load priority "lazy" that were never loaded, queued at the next begin callback:
+        self._lazy_loads: Deque[Path] = deque()
+        # seconds from start() until the critical grammars are loaded ('critical'), control goes back
+        # to Dragon ('ready', the time to first command) and all grammars are loaded ('complete'):
+        self.startup_timing: Dict[str, float] = {}
+        self._startup_t0: Any = None
+        # (size, st_mtime_ns, hash) of the source of each loaded module, to skip reloads of unchanged sources:
+        self._fingerprints: Dict[Path, Tuple[int, int, bytes]] = {}
+        # the modules in the grammar directories that are imported by grammar modules (helpers),
+        # recorded while importing: importer path -> imported helper paths,
+        # and helper path -> (module name, st_mtime_ns when imported)
+        self._import_graph: Dict[Path, Set[Path]] = {}
+        self._helper_modules: Dict[Path, Tuple[str, int]] = {}
+        self._stale_modules: Set[Path] = set()   # grammar modules that import a changed helper
+        # warm start (config setting warm_start): the snapshot of the previous session,
+        # used at the first full load, and the timing of the startup load:
+        self.snapshot_path: Any = None
+        self._snapshot: Any = None
+        self._startup_load_start: Any = None
+        self.warm_start_info: Dict[str, Any] = {}
+        # sys.meta_path finder for the grammar directories (config setting grammar_finder), instead of sys.path:
+        self.grammar_finder: Any = None
 
 
     def set_on_begin_utterance_callback(self, func: Callable[[], None]) -> None:
@@ -92,9 +149,21 @@ class NatlinkMain(metaclass=Singleton):
     def set_post_load_callback(self, func: Callable[[], None]) -> None:
         self._post_load_callback.set(func)
 
+    def set_on_user_changed_callback(self, func: Callable[[], None]) -> None:
+        """func is called after another user profile is chosen (and the modules are loaded),
+
+        the new user, profile and language are then in natlinkmain.user, .profile and .language.
+        With budgeted or background loading, func is called when the pending modules are loaded
+        (the lazy modules may still wait for a begin callback).
+        """
+        self._on_user_changed_callback.set(func)
+
     def delete_on_begin_utterance_callback(self, func: Callable[[], None]) -> None:
         self._on_begin_utterance_callback.delete(func)
 
+    def delete_on_user_changed_callback(self, func: Callable[[], None]) -> None:
+        self._on_user_changed_callback.delete(func)
+
     def delete_on_mic_on_callback(self, func: Callable[[], None]) -> None:
         self._on_mic_on_callback.delete(func)
     
@@ -222,32 +291,102 @@ class NatlinkMain(metaclass=Singleton):
     # 
     #     return mod_paths
 
-    def _module_paths_in_dirs(self, directories: Iterable[str]) -> List[Path]:
+    def _scan_directory(self, directory: Any) -> List[Path]:
+        """return the python files of a directory, sorted, with __init__.py first
+        
+        The result is cached, keyed on the mtime of the directory. This mtime changes
+        when files are added, removed or renamed, so an unchanged directory is not walked again.
+        
+        Note: the returned list is shared with the cache, do not change it.
+        """
+        dir_name = str(directory)
+        mtime = os.stat(dir_name).st_mtime_ns
+        cached = self._scan_cache.get(dir_name)
+        if cached is not None and cached[0] == mtime:
+            self.scan_cache_hits += 1
+            return cached[1]
+
+        self.scan_cache_misses += 1
+        if self.grammar_finder is not None:
+            self.grammar_finder.invalidate(dir_name)
+        dir_path = Path(dir_name)
+        with os.scandir(dir_name) as entries:
+            scripts = sorted(dir_path/entry.name for entry in entries
+                             if entry.name.endswith('.py') and entry.is_file())
+        scripts = [f for f in scripts if f.suffix == '.py']
+        init_path = dir_path.joinpath('__init__.py')
+        if init_path in scripts:
+            scripts.remove(init_path)
+            scripts.insert(0, init_path)
+        prog_index: Dict[str, List[Path]] = {}
+        for f in scripts:
+            if not f.stem.startswith('_'):
+                for prog_name in self._prog_names_of(f.stem):
+                    prog_index.setdefault(prog_name, []).append(f)
+        self._scan_cache[dir_name] = (mtime, scripts, prog_index)
+        return scripts
+
+    def _program_index(self, directory: Any) -> Dict[str, List[Path]]:
+        """return the index from program name to the program specific files of a directory
+        
+        Like _scan_directory, the result is cached on the mtime of the directory.
+        """
+        self._scan_directory(directory)
+        return self._scan_cache[str(directory)][2]
 
-        def is_script(f: Path) -> bool:
-            if not f.is_file():
-                return False
-            if not f.suffix == '.py':
-                return False
-            
-            if f.stem.startswith('_'):
-                return True
-            for prog_name in self.prog_names_visited:
-                if f.stem == prog_name or f.stem.startswith( prog_name + '_'):
-                    return True
-            return False
+    @staticmethod
+    def _prog_names_of(stem: str) -> List[str]:
+        """return the program names a (not "_" prefixed) grammar file belongs to
+        
+        "calc_extra_more" belongs to "calc", "calc_extra" and "calc_extra_more".
+        """
+        parts = stem.split('_')
+        return ['_'.join(parts[:i]) for i in range(1, len(parts)+1)]
 
-        init = '__init__.py'
+    def get_scan_cache_info(self) -> Dict[str, int]:
+        """return the hits and misses of the directory scan cache, and the number of directories cached
+        """
+        return {'hits': self.scan_cache_hits,
+                'misses': self.scan_cache_misses,
+                'directories': len(self._scan_cache)}
 
+    def clear_scan_cache(self) -> None:
+        """forget all cached directory scans, the next scan walks each directory again
+        """
+        self._scan_cache.clear()
+
+    def _is_script(self, f: Path) -> bool:
+        """a python file is loaded if it starts with "_" or belongs to a program that has been visited
+        """
+        if f.stem.startswith('_'):
+            return True
+        return not self.prog_names_visited.isdisjoint(self._prog_names_of(f.stem))
+
+    def module_paths_for_program(self, prog_name: str) -> List[Path]:
+        """return the program specific files of the user directories for prog_name
+        """
+        mod_paths: List[Path] = []
+        for d in self.config.directories_for_user(self.user):
+            mod_paths.extend(self._program_index(d).get(prog_name, []))
+        return mod_paths
+
+    def load_modules_for_program(self, prog_name: str) -> None:
+        """load the program specific modules when a new program is visited, without a full load
+        """
+        with self.load_stats.measure_pass(f'load for program "{prog_name}"') as pass_stats:
+            self.seen.clear()
+            self._pre_load_callback.run()
+            mod_paths = self.module_paths_for_program(prog_name)
+            if mod_paths:
+                self.logger.debug(f'loading {len(mod_paths)} module(s) for program "{prog_name}"')
+            self.load_or_reload_modules(mod_paths)
+            self._post_load_callback.run()
+        self.logger.debug(pass_stats.summary())
+
+    def _module_paths_in_dirs(self, directories: Iterable[str]) -> List[Path]:
         mod_paths: List[Path] = []
         for d in directories:
-            dir_path = Path(d)
-            scripts = sorted(filter(is_script, dir_path.iterdir()))
-            init_path = dir_path.joinpath(init)
-            if init_path in scripts:
-                scripts.remove(init_path)
-                scripts.insert(0, init_path)
-            mod_paths.extend(scripts)
+            mod_paths.extend(filter(self._is_script, self._scan_directory(d)))
 
         return mod_paths
 
@@ -265,6 +404,40 @@ class NatlinkMain(metaclass=Singleton):
             if d_expanded in sys.path:
                 sys.path.remove(d_expanded)
 
+    def install_grammar_finder(self, directories: Iterable[str]) -> None:
+        """make the grammar directories importable via a GrammarFinder in sys.meta_path, leaving sys.path alone
+        """
+        self.uninstall_grammar_finder()
+        self.grammar_finder = GrammarFinder([expand_path(d) for d in directories])
+        self.grammar_finder.install()
+
+    def uninstall_grammar_finder(self) -> None:
+        if self.grammar_finder is not None:
+            self.grammar_finder.uninstall()
+            self.grammar_finder = None
+
+    def precompile_modules(self) -> Dict[str, Any]:
+        """compile the grammar files of the current user to bytecode, in parallel worker processes
+
+        Files with valid bytecode in __pycache__ are skipped, so after the first start this costs only the checks.
+        """
+        mod_paths = self.module_paths_for_user
+        result = precompile(mod_paths)
+        self.logger.info(f'precompiled {result["compiled"]} of {len(mod_paths)} grammar files '
+                         f'({result["fresh"]} up to date) in {result["time"]*1000:.0f} ms')
+        for path, message in result['errors'].items():
+            self.logger.warning(f'precompile, cannot compile "{path}":\n{message}')
+        return result
+
+    def _invalidate_import_caches(self, mod_paths: Iterable[Path]) -> None:
+        """after removing modules: with the grammar finder only their directories, otherwise all import caches
+        """
+        if self.grammar_finder is None:
+            importlib.invalidate_caches()
+            return
+        for directory in {mod_path.parent for mod_path in mod_paths}:
+            self.grammar_finder.invalidate(directory)
+
     def _call_and_catch_all_exceptions(self, fn: Callable[[], None]) -> None:
         try:
             fn()
@@ -272,12 +445,36 @@ class NatlinkMain(metaclass=Singleton):
             self.logger.exception(traceback.format_exc())
 
     def unload_module(self, module: ModuleType) -> None:
+        # also when the module is removed, or not for this user (_forget_module, remove_modules_that_no_longer_exist):
+        loadedGrammarBins.pop(module.__name__, None)
         unload = getattr(module, 'unload', None)
         if unload is None:
             self.logger.info(f'cannot unload module {module.__name__}')
             return
         self.logger.debug(f'unloading module: {module.__name__}')
-        self._call_and_catch_all_exceptions(unload)
+        with self.load_stats.measure(getattr(module, '__file__', None) or module.__name__, 'unload'):
+            self._call_and_catch_all_exceptions(unload)
+
+    def get_load_stats(self) -> Dict[str, Any]:
+        """return the timing statistics of the modules and of the latest load passes
+
+        'modules': {module path: {operation: {'count', 'wall', 'cpu', 'blocks', 'max_wall', 'last_wall'}}},
+        operation being 'import', 'reload' or 'unload', times in seconds;
+        'passes': [{'name', 'wall', 'cpu', 'blocks', 'counts'}] for the latest load passes.
+        """
+        return self.load_stats.as_dict()
+
+    def get_load_stats_string(self, max_lines: int = 0) -> str:
+        """return the load statistics as text, the most expensive modules first, the grammar cache statistics
+        and the memory retained by the cache of encoded grammar names
+        """
+        report = self.load_stats.report(max_lines=max_lines) + '\n' + grammar_cache.report()
+        if grammar_cache.optimize:
+            report += '\n' + grammar_cache.optimize_report()
+        return report + '\n' + encodedNames.report()
+
+    def reset_load_stats(self) -> None:
+        self.load_stats.clear()
         
 
     @staticmethod
@@ -295,6 +492,154 @@ class NatlinkMain(metaclass=Singleton):
         loader.exec_module(module)
         return module
 
+    def _import_recording_dependencies(self, mod_path: Path) -> ModuleType:
+        with self._recording_imports(mod_path):
+            return self._import_module_from_path(mod_path)
+
+    @contextmanager
+    def _recording_imports(self, importer: Path) -> Iterator[None]:
+        """record the helper modules imported while executing the importer (and the helpers it imports)
+        """
+        self._import_graph[importer] = set()
+        grammar_dirs = {Path(expand_path(d)) for d in self.config.directories}
+        original_import = builtins.__import__
+
+        def recording_import(name, globals=None, locals=None, fromlist=(), level=0):
+            #pylint:disable=W0622
+            module = original_import(name, globals, locals, fromlist, level)
+            importing_file = (globals or {}).get('__file__')
+            if importing_file:
+                try:
+                    full_name = importlib.util.resolve_name('.'*level + name, globals.get('__package__'))
+                except (ImportError, ValueError):
+                    full_name = module.__name__
+                imported = [sys.modules.get(full_name, module)]
+                imported.extend(sys.modules.get(f'{full_name}.{item}') for item in fromlist or ())
+                for mod in imported:
+                    self._record_import(Path(importing_file), mod, grammar_dirs)
+            return module
+
+        builtins.__import__ = recording_import
+        try:
+            yield
+        finally:
+            builtins.__import__ = original_import
+
+    def _record_import(self, importer: Path, module: Any, grammar_dirs: Set[Path]) -> None:
+        mod_file = getattr(module, '__file__', None)
+        if not mod_file:
+            return
+        path = Path(mod_file)
+        if path == importer or grammar_dirs.isdisjoint(path.parents):
+            return
+        self._import_graph.setdefault(importer, set()).add(path)
+        if path not in self._helper_modules:
+            self._helper_modules[path] = (module.__name__, path.stat().st_mtime_ns)
+
+    def _reload_changed_helpers(self) -> None:
+        """reload the changed helper modules, and mark the grammar modules that import them as stale
+
+        The helpers are reloaded in topological order (the helpers they import first), the stale grammar
+        modules are reloaded by load_or_reload_module.
+        """
+        changed = set()
+        for path, (_name, mtime_ns) in self._helper_modules.items():
+            try:
+                if path.stat().st_mtime_ns == mtime_ns:
+                    continue
+            except OSError:
+                pass
+            changed.add(path)
+        if not changed:
+            return
+        dependents: Dict[Path, Set[Path]] = {}
+        for importer, imported in self._import_graph.items():
+            for path in imported:
+                dependents.setdefault(path, set()).add(importer)
+
+        def importers(paths: Iterable[Path], skip: Set[Path]) -> Set[Path]:
+            # the paths and the modules that import them, directly or indirectly, except via skip:
+            found: Set[Path] = set()
+            todo = [path for path in paths if path not in skip]
+            while todo:
+                path = todo.pop()
+                if path not in found:
+                    found.add(path)
+                    todo.extend(dependents.get(path, set()) - skip)
+            return found
+
+        affected = importers(changed, set())
+        helpers = {path for path in affected if path in self._helper_modules}
+        sorter = graphlib.TopologicalSorter({path: self._import_graph.get(path, set()) & helpers for path in helpers})
+        try:
+            order = list(sorter.static_order())
+        except graphlib.CycleError:
+            self.logger.warning('import cycle between helper modules, reload them in arbitrary order')
+            order = sorted(helpers)
+        failed: Set[Path] = set()
+        for path in order:
+            if self._import_graph.get(path, set()) & failed:
+                # imports a helper that could not be reloaded, wait until that one is fixed:
+                failed.add(path)
+            elif not self._reload_helper(path):
+                failed.add(path)
+        # the failed helpers are tried again at the next load pass, their importers are not stale yet:
+        self._stale_modules.update(path for path in importers(changed, failed)
+                                   if path in self.loaded_modules or path in self.bad_modules)
+
+    def _reload_helper(self, path: Path) -> bool:
+        """reload a changed helper module, return False if the reload failed
+
+        The modification time is recorded after a successful reload only, so a failed reload is tried again.
+        """
+        name, _mtime_ns = self._helper_modules[path]
+        module = sys.modules.get(name)
+        if module is None or not path.is_file():
+            self.logger.info(f'helper module was removed: {name}')
+            self._helper_modules.pop(path)
+            self._import_graph.pop(path, None)
+            sys.modules.pop(name, None)
+            return True
+        self.logger.info(f'reloading helper module: {name}')
+        mtime_ns = path.stat().st_mtime_ns
+        try:
+            with self.load_stats.measure(path, 'reload'), self._recording_imports(path):
+                importlib.reload(module)
+        except Exception:
+            self.logger.exception(traceback.format_exc())
+            return False
+        self._helper_modules[path] = (name, mtime_ns)
+        return True
+
+    @staticmethod
+    def _fingerprint(mod_path: Path) -> Tuple[int, int, bytes]:
+        """return (size, st_mtime_ns, hash) of the source of a module
+        """
+        st = mod_path.stat()
+        digest = hashlib.blake2b(mod_path.read_bytes(), digest_size=16).digest()
+        return st.st_size, st.st_mtime_ns, digest
+
+    def _source_unchanged(self, mod_path: Path) -> bool:
+        """return True if the source is byte-identical to the source of the loaded module
+
+        Compare the size first, and the hash only when the size is equal.
+        The stored fingerprint gets the new mtime, so the hash is not computed again.
+        """
+        fingerprint = self._fingerprints.get(mod_path)
+        if fingerprint is None:
+            return False
+        size, mtime_ns, digest = fingerprint
+        st = mod_path.stat()
+        if st.st_size != size:
+            return False
+        if st.st_mtime_ns == mtime_ns:
+            return True
+        new_fingerprint = self._fingerprint(mod_path)
+        if new_fingerprint[2] != digest:
+            return False
+        self._fingerprints[mod_path] = new_fingerprint
+        return True
+
     def load_or_reload_module(self, mod_path: Path, force_load: bool = False) -> None:
         mod_name = mod_path.stem
         if mod_path in self.seen:
@@ -314,20 +659,27 @@ class NatlinkMain(metaclass=Singleton):
         
         last_attempt_time = self.load_attempt_times.get(mod_path, 0.0)
         self.load_attempt_times[mod_path] = time.time()
+        # a helper module it imports has changed:
+        stale = mod_path in self._stale_modules
+        self._stale_modules.discard(mod_path)
         
         try:
             if mod_path in self.bad_modules:
                 self.logger.debug(f'mod_path: {mod_path}, in self.bad_modules...')
                 last_modified_time = mod_path.stat().st_mtime
-                if force_load or last_attempt_time < last_modified_time:
+                if force_load or stale or last_attempt_time < last_modified_time:
                     self.logger.info(f'loading previously bad module: {mod_name}')
-                    module = self._import_module_from_path(mod_path)
+                    fingerprint = self._fingerprint(mod_path)
+                    with self.load_stats.measure(mod_path, 'import'):
+                        module = self._import_recording_dependencies(mod_path)
+                    self._fingerprints[mod_path] = fingerprint
                     try:
                         self.bad_modules.remove(mod_path)
                     except KeyError:
                         # added QH, I think it should not come here:
                         self.logger.warning(f'load_or_reload_module, unexpected, cannot remove key {mod_path} from self.bad_modules:\n\t{self.bad_modules}\n\t====\n')
                     self.loaded_modules[mod_path] = module
+                    self.log_large_grammars(module.__name__)
                     return
                 else:
                     # self.logger.debug(f'skipping unchanged bad module: {mod_name}')
@@ -337,24 +689,49 @@ class NatlinkMain(metaclass=Singleton):
                 # remove force_load here, in favor of below:
                 if maybe_module is None:
                     self.logger.info(f'loading module: {mod_name}')
-                    module = self._import_module_from_path(mod_path)
+                    fingerprint = self._fingerprint(mod_path)
+                    with self.load_stats.measure(mod_path, 'import'):
+                        module = self._import_recording_dependencies(mod_path)
+                    self._fingerprints[mod_path] = fingerprint
                     self.loaded_modules[mod_path] = module
+                    self.log_large_grammars(module.__name__)
                     return
 
                 module = maybe_module
                 last_modified_time = mod_path.stat().st_mtime
                 diff = last_modified_time - last_attempt_time  # check for -0.1 instead of 0, a ???
                                                                # _pre_load_callback may need this..
-                if force_load or diff > 0:
+                if not (force_load or stale) and diff > 0 and self._source_unchanged(mod_path):
+                    self.logger.debug(f'skipping reload of module with unchanged source: {mod_name}')
+                    self.load_stats.note(mod_path, 'elided')
+                    return
+                if force_load or stale or diff > 0:
                     if force_load:
                         self.logger.info(f'reloading module: {mod_name}, force_load: {force_load}')
+                    elif stale and diff <= 0:
+                        self.logger.info(f'reloading module: {mod_name}, an imported module has changed')
                     else:
                         self.logger.info(f'reloading module: {mod_name}')
-                        
-                    self.unload_module(module)
-                    del module
-                    module = self._import_module_from_path(mod_path)
+
+                    fingerprint = self._fingerprint(mod_path)
+                    module_name = module.__name__
+                    old_grammar_bins = loadedGrammarBins.pop(module_name, {})
+                    # grammars that load the same binary again keep their gramObj (natlinkutils.GramClassBase):
+                    retainGrammars(module_name)
+                    try:
+                        # unload_module measures the unload, so the reload time is the time of the import:
+                        self.unload_module(module)
+                        del module
+                        with self.load_stats.measure(mod_path, 'reload'):
+                            module = self._import_recording_dependencies(mod_path)
+                    finally:
+                        n_released = releaseRetainedGrammars(module_name)
+                    if n_released:
+                        self.logger.debug(f'{mod_name}: unloaded {n_released} grammars that were not loaded again')
+                    self._fingerprints[mod_path] = fingerprint
                     self.loaded_modules[mod_path] = module
+                    self.compare_grammar_bins(module.__name__, old_grammar_bins)
+                    self.log_large_grammars(module.__name__)
                     self.logger.debug(f'loaded module: {module.__name__}')
                     return
                 # self.logger.debug(f'skipping unchanged loaded module: {mod_name}')
@@ -363,11 +740,53 @@ class NatlinkMain(metaclass=Singleton):
             self.logger.exception(traceback.format_exc())
             self.logger.debug(f'load_or_reload_module, exception, add to self.bad_modules {mod_path}')
             self.bad_modules.add(mod_path)
+            self._fingerprints.pop(mod_path, None)
             if mod_path in self.loaded_modules:
                 old_module = self.loaded_modules.pop(mod_path)
                 self.unload_module(old_module)
                 del old_module
-                importlib.invalidate_caches()
+                self._invalidate_import_caches([mod_path])
+
+    def compare_grammar_bins(self, mod_name: str, old_grammar_bins: Dict[str, bytes]) -> int:
+        """log which grammars of a reloaded module changed, return the number of unchanged grammars
+
+        old_grammar_bins are the binary grammars the module had loaded before the reload.
+        """
+        new_grammar_bins = loadedGrammarBins.get(mod_name, {})
+        unchanged = 0
+        for name, gram_bin in new_grammar_bins.items():
+            old_bin = old_grammar_bins.get(name)
+            if old_bin == gram_bin:
+                unchanged += 1
+            elif old_bin is None:
+                self.logger.debug(f'{mod_name}: new grammar {name}')
+            elif self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug(f'{mod_name}: grammar {name} changed: {"; ".join(diffGrammars(old_bin, gram_bin))}')
+        if new_grammar_bins:
+            self.logger.debug(f'{mod_name}: {unchanged} of {len(new_grammar_bins)} grammars loaded an identical binary')
+        return unchanged
+
+    def log_large_grammars(self, mod_name: str) -> List[str]:
+        """log the grammars of a module that accept more phrases than the setting max_grammar_phrases,
+        return their names
+        """
+        max_phrases = self.config.max_grammar_phrases
+        if not max_phrases:
+            return []
+        large = []
+        for name, gram_bin in loadedGrammarBins.get(mod_name, {}).items():
+            try:
+                analysis = GrammarAnalysis(unpackGrammar(gram_bin))
+                phrases = analysis.totalPhrases()
+            except GrammarError as exc:
+                self.logger.debug(f'{mod_name}: cannot count the phrases of grammar {name}: {exc}')
+                continue
+            if phrases > max_phrases:
+                large.append(name)
+                largest = max(analysis.metrics().values(), key=lambda metrics: metrics.phrases)
+                self.logger.warning(f'{mod_name}: grammar {name} accepts {phrases} phrases '
+                                    f'(max_grammar_phrases: {max_phrases}), largest rule {largest}')
+        return large
 
     def load_or_reload_modules(self, mod_paths: Iterable[Path], force_load: bool = None) -> None:
         for mod_path in mod_paths:
@@ -383,11 +802,15 @@ class NatlinkMain(metaclass=Singleton):
 
     def remove_modules_that_no_longer_exist(self) -> None:
         mod_paths = self.module_paths_for_user
+        removed = set(self.loaded_modules).difference(mod_paths)
        
-        for mod_path in set(self.loaded_modules).difference(mod_paths):
+        for mod_path in removed:
             self.logger.info(f'unloading removed or not-for-this-user module {mod_path.stem}')
             old_module = self.loaded_modules.pop(mod_path)
             self.load_attempt_times.pop(mod_path)
+            self._fingerprints.pop(mod_path, None)
+            self._import_graph.pop(mod_path, None)
+            self._stale_modules.discard(mod_path)
             self.unload_module(old_module)
             del old_module
         for mod_path in self.bad_modules.difference(mod_paths):
@@ -395,10 +818,91 @@ class NatlinkMain(metaclass=Singleton):
             self.bad_modules.remove(mod_path)
             self.load_attempt_times.pop(mod_path)
 
-        importlib.invalidate_caches()
+        if self.grammar_finder is None or removed:
+            self._invalidate_import_caches(removed)
+
+    def start_file_watcher(self) -> None:
+        """start watching the directories, so trigger_load only handles changed files
+        """
+        if self.file_watcher is not None:
+            return
+        directories = [expand_path(d) for d in self.config.directories]
+        self.file_watcher = create_watcher(directories, interval=self.config.watch_interval)
+        self.file_watcher.start()
+        self.logger.info(f'started {self.file_watcher.__class__.__name__} for {len(directories)} directories')
+
+    def stop_file_watcher(self) -> None:
+        if self.file_watcher is None:
+            return
+        self.file_watcher.stop()
+        self.file_watcher = None
+        self._full_load_done = None
+
+    def _forget_module(self, mod_path: Path) -> None:
+        """unload a module that has been removed, and forget about it
+        """
+        if mod_path in self.loaded_modules:
+            self.logger.info(f'unloading removed module {mod_path.stem}')
+            old_module = self.loaded_modules.pop(mod_path)
+            self.unload_module(old_module)
+            del old_module
+        elif mod_path in self.bad_modules:
+            self.logger.debug(f'bad module was removed: {mod_path.stem}')
+        self.bad_modules.discard(mod_path)
+        self.load_attempt_times.pop(mod_path, None)
+        self._fingerprints.pop(mod_path, None)
+        self._import_graph.pop(mod_path, None)
+        self._stale_modules.discard(mod_path)
+
+    def _load_changed_files(self, watcher: FileWatcher) -> bool:
+        """load, reload or unload only the files the watcher reported
+        
+        return False if the watcher missed changes, a full load is needed then
+        """
+        changed, overflow = watcher.take_changes()
+        if overflow:
+            self.logger.debug('trigger_load: file watcher missed changes, do a full load')
+            return False
+        self._reload_changed_helpers()
+        if not (changed or self._stale_modules):
+            return True
+        user_dirs = {Path(expand_path(d)) for d in self.config.directories_for_user(self.user)}
+        removed = []
+        for mod_path in sorted(changed | self._stale_modules):
+            if self.grammar_finder is not None:
+                # also new or removed helper modules:
+                self.grammar_finder.invalidate(mod_path.parent)
+            if mod_path.parent not in user_dirs:
+                continue
+            if not mod_path.is_file():
+                self._forget_module(mod_path)
+                removed.append(mod_path)
+            elif self._is_script(mod_path) and mod_path not in self.seen:
+                self.load_or_reload_module(mod_path)
+                self.seen.add(mod_path)
+        if removed:
+            self._invalidate_import_caches(removed)
+        return True
 
     def trigger_load(self, force_load: bool = None) -> None:
+        with self.load_stats.measure_pass('trigger_load') as pass_stats:
+            self._trigger_load(force_load=force_load)
+        self.logger.debug(pass_stats.summary())
+
+    def _trigger_load(self, force_load: bool = None) -> None:
         self.seen.clear()
+        watcher = self.file_watcher
+        # the watcher only reports changed files, a full load is needed for another user:
+        load_state = self.user
+        pre_load_done = False
+        if watcher is not None and not force_load and self._full_load_done == load_state:
+            self._pre_load_callback.run()
+            pre_load_done = True
+            # the pre_load callbacks can write grammar files (Vocola), so take the changes afterwards:
+            if self._load_changed_files(watcher):
+                self._post_load_callback.run()
+                return
+            self.seen.clear()
         if force_load:
             self.logger.debug(f'triggering load/reload process (force_load: {force_load})')
         else:
@@ -413,20 +917,265 @@ class NatlinkMain(metaclass=Singleton):
                 raise OSError(f'NatlinkMain.trigger_load: no directories specified, and fallback_directory is invalid: "{str(fallback_directory)}"')
             mod_paths = self._module_paths_in_dirs([fallback_directory])
             print(f'Warning, no directories specified for Natlink grammars,\n\tfalling back to default configuration "{str(fallback_directory)}"')
-        self._pre_load_callback.run()
+        if not pre_load_done:
+            self._pre_load_callback.run()
+        self._reload_changed_helpers()
+        if self._snapshot is not None and not force_load:
+            mod_paths = self._apply_snapshot(mod_paths)
+        if watcher is not None:
+            # the full load below handles the changes reported until now:
+            watcher.take_changes()
+        mod_paths = self._order_by_priority(mod_paths)
+        if self.config.load_budget_ms > 0 and not force_load:
+            # the post_load callbacks run when the pending modules are handled:
+            self._start_pending_loads(mod_paths, load_state)
+            return
+        self._stop_pending_loads()
+        background: List[Path] = []
+        if not force_load:
+            background = [mod_path for mod_path in mod_paths if self.load_priority(mod_path) in ('low', 'lazy')]
+            mod_paths = mod_paths[:len(mod_paths) - len(background)]
+        if self.config.load_priorities:
+            critical = [mod_path for mod_path in mod_paths if self.load_priority(mod_path) == 'critical']
+            self.load_or_reload_modules(critical, force_load=force_load)
+            self._note_startup_time('critical')
+            mod_paths = mod_paths[len(critical):]
         self.load_or_reload_modules(mod_paths, force_load=force_load)
+        if background:
+            # the post_load callbacks run when the low priority modules are handled, and again after the lazy modules:
+            self._start_pending_loads(background, load_state, process_now=False)
+            return
         self._post_load_callback.run()
+        self._run_user_changed_callbacks()
+        self._full_load_finished(load_state)
+
+    def load_priority(self, mod_path: Path) -> str:
+        """the load priority of a module, from the [load priorities] section of natlink.ini (default "normal")
+
+        __init__.py is always loaded first.
+        """
+        if mod_path.stem == '__init__':
+            return 'critical'
+        return self.config.load_priorities.get(mod_path.stem.lower(), 'normal')
+
+    def _order_by_priority(self, mod_paths: List[Path]) -> List[Path]:
+        if not self.config.load_priorities:
+            return mod_paths
+        # sorted is stable, so the order within a priority is kept:
+        return sorted(mod_paths, key=lambda mod_path: LOAD_PRIORITIES[self.load_priority(mod_path)])
+
+    def _note_startup_time(self, key: str) -> None:
+        if self._startup_t0 is not None and key not in self.startup_timing:
+            self.startup_timing[key] = time.perf_counter() - self._startup_t0
+
+    def _full_load_finished(self, load_state: Any) -> None:
+        self._full_load_done = load_state
+        if self._startup_t0 is not None and 'complete' not in self.startup_timing:
+            self._note_startup_time('complete')
+            self.logger.info(f'all grammar files loaded {self.startup_timing["complete"]*1000:.0f} ms after the start of Natlink')
+        if self._startup_load_start is None:
+            return
+        # the startup load with warm start:
+        startup_time = time.perf_counter() - self._startup_load_start
+        self._startup_load_start = None
+        self.warm_start_info['startup_time'] = startup_time
+        info = self.warm_start_info
+        previous = info.get('previous_startup_time')
+        previous_text = f'{previous*1000:.0f} ms' if previous is not None else 'unknown'
+        self.logger.info(f'warm start: startup load took {startup_time*1000:.0f} ms (previous session: {previous_text}), '
+                         f'skipped {info.get("skipped_bad_modules", 0)} known bad module(s), '
+                         f'saving about {info.get("saved_time", 0.0)*1000:.0f} ms')
+        self.save_snapshot(startup_time=startup_time)
+
+    def start_warm_start(self) -> None:
+        """read the snapshot of the previous session, it is used at the next full load
+        """
+        if self.snapshot_path is None:
+            self.snapshot_path = Path(expand_natlink_settingsdir())/'loader_snapshot.json'
+        self._snapshot = LoadSnapshot.read(self.snapshot_path)
+        self.warm_start_info = {'previous_startup_time': self._snapshot.startup_time if self._snapshot else None,
+                                'skipped_bad_modules': 0, 'saved_time': 0.0}
+        self._startup_load_start = time.perf_counter()
+
+    def _apply_snapshot(self, mod_paths: List[Path]) -> List[Path]:
+        """mark the unchanged known bad modules as bad without importing them, and order by previous load time
+        """
+        snapshot, self._snapshot = self._snapshot, None
+        now = time.time()
+        for mod_path in mod_paths:
+            if mod_path in self.loaded_modules or mod_path in self.bad_modules:
+                continue
+            if snapshot.is_known_bad(mod_path, self._fingerprint):
+                self.logger.info(f'skipping known bad module (unchanged since the previous session): {mod_path.stem}')
+                self.bad_modules.add(mod_path)
+                self.load_attempt_times[mod_path] = now
+                self.warm_start_info['skipped_bad_modules'] += 1
+                self.warm_start_info['saved_time'] += snapshot.load_time(mod_path) or 0.0
+        return snapshot.order_by_cost(mod_paths)
+
+    def save_snapshot(self, startup_time: float = None) -> None:
+        """write the state of the loaded and bad modules to the snapshot file (if warm start is on)
+        """
+        if self.snapshot_path is None:
+            return
+        previous = LoadSnapshot.read(self.snapshot_path)
+        if startup_time is None and previous is not None:
+            startup_time = previous.startup_time
+        snapshot = LoadSnapshot(startup_time=startup_time)
+        mod_paths = list(self.loaded_modules) + sorted(self.bad_modules)
+        for order, mod_path in enumerate(mod_paths):
+            bad = mod_path in self.bad_modules
+            load_time = self.load_stats.last_load_time(mod_path)
+            if load_time is None and previous is not None:
+                load_time = previous.load_time(mod_path)
+            try:
+                fingerprint = self._fingerprints.get(mod_path) or self._fingerprint(mod_path)
+            except OSError:
+                continue
+            snapshot.add_module(mod_path, fingerprint, order, load_time, bad)
+        try:
+            snapshot.write(self.snapshot_path)
+        except OSError as exc:
+            self.logger.warning(f'could not write the loader snapshot "{self.snapshot_path}": {exc}')
+
+    def _foreground_prog_name(self) -> str:
+        if not self.prev_module_info:
+            return ''
+        return Path(self.prev_module_info[0].lower()).stem
+
+    def _start_pending_loads(self, mod_paths: List[Path], load_state: Any, process_now: bool = True) -> None:
+        """queue the modules by load priority, the grammars of the foreground program first, and start processing them
+
+        Lazy modules that were never loaded wait for the next begin callback.
+        process_now: if False, leave the processing to the natlinktimer ticks and begin callbacks
+        """
+        foreground = self._foreground_prog_name()
+
+        def priority(mod_path: Path) -> Tuple[int, int]:
+            load_priority = LOAD_PRIORITIES[self.load_priority(mod_path)]
+            if mod_path.stem == '__init__':
+                return load_priority, 0
+            if foreground and not mod_path.stem.startswith('_') and foreground in self._prog_names_of(mod_path.stem):
+                return load_priority, 1
+            return load_priority, 2
+
+        ordered = sorted(mod_paths, key=priority)
+        lazy = {mod_path for mod_path in ordered
+                if self.load_priority(mod_path) == 'lazy' and mod_path not in self.loaded_modules}
+        self._pending_loads = deque(mod_path for mod_path in ordered if mod_path not in lazy)
+        self._lazy_loads = deque(mod_path for mod_path in ordered if mod_path in lazy)
+        self._pending_load_state = load_state
+        # background loading gets its own budget, not one module per natlinktimer tick:
+        self._pending_budget_ms = self.config.load_budget_ms if process_now \
+                                  else self.config.load_budget_ms or self.background_load_budget_ms
+        self._post_load_pending = True
+        if process_now:
+            self.process_pending_loads()
+        elif self._pending_loads:
+            self._set_pending_timer(True)
+
+    def _stop_pending_loads(self) -> None:
+        self._pending_loads.clear()
+        self._lazy_loads.clear()
+        self._set_pending_timer(False)
+
+    @property
+    def pending_loads(self) -> List[Path]:
+        """the modules that still have to be loaded or reloaded, with budgeted loading or in the background
+        """
+        return list(self._pending_loads)
+
+    @property
+    def lazy_loads(self) -> List[Path]:
+        """the modules with load priority "lazy", that wait for the next begin callback
+        """
+        return list(self._lazy_loads)
+
+    def process_pending_loads(self, budget_ms: float = None) -> bool:
+        """load or reload the pending modules until the budget (milliseconds) is spent
+
+        At least one module is handled per call. When the queue is drained, the post_load
+        callbacks are run, and True is returned if no lazy modules wait for a begin callback.
+        """
+        if not self._pending_loads:
+            return not self._lazy_loads
+        if budget_ms is None:
+            budget_ms = self._pending_budget_ms
+        deadline = time.perf_counter() + budget_ms/1000
+        with self.load_stats.measure_pass('pending loads') as pass_stats:
+            while self._pending_loads:
+                mod_path = self._pending_loads.popleft()
+                if mod_path not in self.seen:
+                    self.load_or_reload_module(mod_path)
+                    self.seen.add(mod_path)
+                if time.perf_counter() >= deadline:
+                    break
+        if self._pending_loads:
+            self.logger.debug(f'{pass_stats.summary()}, {len(self._pending_loads)} module(s) still pending')
+            self._set_pending_timer(True)
+            return False
+        self._set_pending_timer(False)
+        if self._post_load_pending:
+            self._post_load_pending = False
+            self._post_load_callback.run()
+        self._run_user_changed_callbacks()
+        if self._lazy_loads:
+            return False
+        self._full_load_finished(self._pending_load_state)
+        return True
+
+    def _run_user_changed_callbacks(self) -> None:
+        if self._user_changed_pending:
+            self._user_changed_pending = False
+            self._on_user_changed_callback.run()
+
+    def _on_pending_timer(self) -> None:
+        self.process_pending_loads()
+
+    def _set_pending_timer(self, on: bool) -> None:
+        if on == self._pending_timer_on:
+            return
+        # natlinktimer imports this module, so import it here:
+        from natlinkcore import natlinktimer   #pylint:disable=C0415
+        if on:
+            natlinktimer.setTimerCallback(self._on_pending_timer, self.pending_load_interval)
+        else:
+            natlinktimer.removeTimerCallback(self._on_pending_timer)
+        self._pending_timer_on = on
+
+    def switch_user_modules(self, old_user: str) -> None:
+        """after a user change, unload and load only the modules that differ between the old and the new user
+
+        The modules of the directories shared by both users (like the global directories) stay loaded,
+        they are notified via the on_user_changed callbacks.
+        """
+        old_dirs = set(self.config.directories_for_user(old_user))
+        new_dirs = set(self.config.directories_for_user(self.user))
+        before = set(self.loaded_modules)
+        # a normal (not forced) load pass, which unloads the modules that are not for this user:
+        self.trigger_load()
+        after = set(self.loaded_modules)
+        self.logger.info(f'user switch "{old_user}" -> "{self.user}": {len(old_dirs - new_dirs)} directories removed, '
+                         f'{len(new_dirs - old_dirs)} added; unloaded {len(before - after)} modules, '
+                         f'loaded {len(after - before)}, kept {len(before & after)}')
 
     def on_change_callback(self, change_type: str, args: Any) -> None:
         """on_change_callback, when another user profile is chosen, or when the mic state changes
         """
         if change_type == 'user':
+            old_user = self.user
             self.set_user_language(args)
             self.logger.debug(f'on_change_callback, user "{self.user}", profile: "{self.profile}", language: "{self.language}"')
+            self._user_changed_pending = True
             if self.config.load_on_user_changed:
-                # added line, QH, 2023-10-08
-                self.unload_all_loaded_modules()
-                self.trigger_load(force_load=True)
+                if self.config.diff_on_user_changed:
+                    self.switch_user_modules(old_user)
+                else:
+                    # added line, QH, 2023-10-08
+                    self.unload_all_loaded_modules()
+                    self.trigger_load(force_load=True)
+            if not self._pending_loads:
+                self._run_user_changed_callbacks()
         elif change_type == 'mic' and args == 'on':
             self.logger.debug('on_change_callback called with: "mic", "on"')
             self._on_mic_on_callback.run()
@@ -449,12 +1198,23 @@ class NatlinkMain(metaclass=Singleton):
             self.logger.debug('-on_begin_callback, same moduleInfo')
             
         self._on_begin_utterance_callback.run()
+        if self._lazy_loads:
+            self._pending_loads.extend(self._lazy_loads)
+            self._lazy_loads.clear()
+            self._post_load_pending = True
+        # with budgeted or background loading, an utterance first continues the pending loads, instead of a new load pass:
+        loading_pending = bool(self._pending_loads)
+        if loading_pending:
+            self.process_pending_loads()
        
         prog_name = Path(module_info[0].lower()).stem
         if prog_name not in self.prog_names_visited:
             self.prog_names_visited.add(prog_name)
-            self.trigger_load()
-        elif self.load_on_begin_utterance:
+            if self.load_on_begin_utterance and not loading_pending:
+                self.trigger_load()
+            else:
+                self.load_modules_for_program(prog_name)
+        elif self.load_on_begin_utterance and not loading_pending:
             # manipulate this setting:
             value = self.load_on_begin_utterance
             if isinstance(value, bool):
@@ -463,6 +1223,10 @@ class NatlinkMain(metaclass=Singleton):
                 value -= 1
                 self.load_on_begin_utterance = value
             self.trigger_load()
+        # the lazy grammars (natlinkutils.LazyGrammarBase) of this program or window are loaded now:
+        n_lazy = checkLazyGrammars(module_info)
+        if n_lazy:
+            self.logger.debug(f'-on_begin_callback, loaded {n_lazy} lazy grammar(s) for "{prog_name}"')
 
     def on_message_window_callback(self, event):
         if event == idd_reload:
@@ -530,6 +1294,8 @@ class NatlinkMain(metaclass=Singleton):
             self.language = 'enx'
 
     def start(self) -> None:
+        self._startup_t0 = time.perf_counter()
+        self.startup_timing.clear()
         self.logger.info(f'Starting natlink loader from config file:\n\t"{self.config.config_path}"')
         nsd = os.getenv('natlink_settingsdir')
         if nsd:
@@ -554,11 +1320,27 @@ class NatlinkMain(metaclass=Singleton):
             return
         
         # self.logger.debug(f'directories: {self.config.directories}')
-        self._add_dirs_to_path(self.config.directories)  
+        if self.config.grammar_finder:
+            self.install_grammar_finder(self.config.directories)
+        else:
+            self._add_dirs_to_path(self.config.directories)  
+        if self.config.watch_directories:
+            self.start_file_watcher()
+        if self.config.warm_start:
+            self.start_warm_start()
+        if self.config.grammar_cache:
+            grammar_cache.directory = Path(expand_natlink_settingsdir())/'grammarcache'
+        grammar_cache.optimize = self.config.optimize_grammars
         if self.config.load_on_startup:
             # set language property:
             self.set_user_language()
+            if self.config.precompile:
+                self.precompile_modules()
             self.trigger_load()
+            self._note_startup_time('ready')
+            timing = self.startup_timing
+            critical_text = f' (critical grammars after {timing["critical"]*1000:.0f} ms)' if 'critical' in timing else ''
+            self.logger.info(f'time to first command: {timing["ready"]*1000:.0f} ms{critical_text}')
         natlink.setBeginCallback(self.on_begin_callback)
         natlink.setChangeCallback(self.on_change_callback)
         try:
@@ -575,7 +1357,12 @@ class NatlinkMain(metaclass=Singleton):
             pass
         natlink.setChangeCallback(None)
         natlink.setBeginCallback(None)
+        self.stop_file_watcher()
+        self._stop_pending_loads()
+        if self.config.warm_start:
+            self.save_snapshot()
         self.unload_all_loaded_modules()
+        self.uninstall_grammar_finder()
         self._del_dirs_from_path(self.config.directories)
         natlink.active_loader = None
         self.logger.info('Stopping natlink loader')
@@ -594,7 +1381,8 @@ class NatlinkMain(metaclass=Singleton):
         """get a setting from possibly an inifile other than natlink.ini
         
         Take a string as input, which is obtained from readwritefile.py, handling
-        different encodings and possible BOM marks.
+        different encodings and possible BOM marks. The parsed file is cached (configcache.py),
+        and read again only when it changes.
         
         When no "option" is passed, the contents of the section are returned (a list of options)
         
@@ -605,10 +1393,7 @@ class NatlinkMain(metaclass=Singleton):
         filepath = filepath or config_locations()[0]
         if not isfile(filepath):
             raise OSError(f'getconfigsetting, no valid filepath: "{filepath}"')
-        rwfile = ReadWriteFile()
-        self.config_text = rwfile.readAnything(filepath)
-        Config = configparser.ConfigParser()
-        Config.read_string(self.config_text)
+        self.config_text, Config = config_cache.get_text_and_config(filepath)
         
         if option is None:
             return Config.options(section)
@@ -0,0 +1,89 @@
+"""LoadSnapshot keeps the state of the loader across Dragon sessions (for natlinkmain)
+
+At the end of the startup load, and when Natlink finishes, the loader writes for each module:
+the size, mtime and content hash of the source, the load order, the previous load time
+and whether the module was bad. At the next start this snapshot is used to order the
+loading by historical cost, and to skip known bad modules that did not change.
+"""
+#pylint:disable=C0115, C0116
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+SNAPSHOT_VERSION = 1
+
+class LoadSnapshot:
+    """the modules of the previous session, keyed on str(mod_path)
+    """
+    def __init__(self, modules: Dict[str, Dict[str, Any]] = None, startup_time: Optional[float] = None):
+        self.modules = modules or {}
+        self.startup_time = startup_time    # seconds of the startup load of that session
+
+    def add_module(self, mod_path: Path, fingerprint: Tuple[int, int, bytes], order: int,
+                   load_time: Optional[float], bad: bool) -> None:
+        size, mtime_ns, digest = fingerprint
+        self.modules[str(mod_path)] = {'size': size, 'mtime_ns': mtime_ns, 'hash': digest.hex(),
+                                       'order': order, 'load_time': load_time, 'bad': bad}
+
+    def load_time(self, mod_path: Path) -> Optional[float]:
+        entry = self.modules.get(str(mod_path))
+        return entry.get('load_time') if entry else None
+
+    def is_known_bad(self, mod_path: Path, fingerprint: Callable[[Path], Tuple[int, int, bytes]]) -> bool:
+        """return True if the module was bad, and its source did not change since
+
+        Compare size and mtime first, and the hash (with the fingerprint function) only when the mtime differs.
+        """
+        entry = self.modules.get(str(mod_path))
+        if not (entry and entry.get('bad')):
+            return False
+        try:
+            st = mod_path.stat()
+        except OSError:
+            return False
+        if st.st_size != entry['size']:
+            return False
+        if st.st_mtime_ns == entry['mtime_ns']:
+            return True
+        return fingerprint(mod_path)[2].hex() == entry['hash']
+
+    def order_by_cost(self, mod_paths: Iterable[Path]) -> List[Path]:
+        """return the modules ordered by previous load time, the cheapest first
+
+        __init__.py stays first, modules without a previous load time go last, keeping their order.
+        """
+        def cost(item: Tuple[int, Path]) -> Tuple[int, float, int]:
+            index, mod_path = item
+            if mod_path.stem == '__init__':
+                return 0, 0.0, index
+            load_time = self.load_time(mod_path)
+            if load_time is None:
+                return 2, 0.0, index
+            return 1, load_time, index
+
+        return [mod_path for _index, mod_path in sorted(enumerate(mod_paths), key=cost)]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {'version': SNAPSHOT_VERSION, 'startup_time': self.startup_time, 'modules': self.modules}
+
+    @classmethod
+    def read(cls, path: Path) -> Optional['LoadSnapshot']:
+        """return the snapshot, or None if there is no (valid) snapshot
+        """
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or data.get('version') != SNAPSHOT_VERSION:
+            return None
+        return cls(modules=data.get('modules', {}), startup_time=data.get('startup_time'))
+
+    def write(self, path: Path) -> None:
+        """write via a temporary file, so a crash does not leave a half written snapshot
+        """
+        tmp_path = Path(str(path) + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.as_dict(), f, indent=1)
+        os.replace(tmp_path, path)
@@ -0,0 +1,165 @@
+"""LoadStats instances keep timing statistics of loading grammar modules (for natlinkmain)
+
+For every import, unload and reload of a module the wall time, the cpu time
+and the change in the number of allocated memory blocks are recorded, per module path.
+Reloads that are skipped because the source did not change are counted as "elided".
+Each load pass (trigger_load) also gets a summary of its own total cost.
+"""
+#pylint:disable=C0115, C0116
+import sys
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+OPERATIONS = ('import', 'reload', 'unload', 'elided')
+
+class OperationStats:
+    """rolling statistics of one operation (import, reload or unload) of one module
+    """
+    def __init__(self):
+        self.count = 0
+        self.wall = 0.0     # total seconds
+        self.cpu = 0.0      # total seconds
+        self.blocks = 0     # total change in allocated memory blocks
+        self.max_wall = 0.0
+        self.last_wall = 0.0
+
+    def add(self, wall: float, cpu: float, blocks: int) -> None:
+        self.count += 1
+        self.wall += wall
+        self.cpu += cpu
+        self.blocks += blocks
+        self.max_wall = max(self.max_wall, wall)
+        self.last_wall = wall
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {'count': self.count, 'wall': self.wall, 'cpu': self.cpu, 'blocks': self.blocks,
+                'max_wall': self.max_wall, 'last_wall': self.last_wall}
+
+
+class PassStats:
+    """the cost of one load pass, like a trigger_load
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.counts = dict.fromkeys(OPERATIONS, 0)
+        self.wall = self.cpu = 0.0
+        self.blocks = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {'name': self.name, 'wall': self.wall, 'cpu': self.cpu, 'blocks': self.blocks,
+                'counts': dict(self.counts)}
+
+    def summary(self) -> str:
+        counts = ', '.join(f'{op}: {n}' for op, n in self.counts.items() if n)
+        return (f'{self.name}: {self.wall*1000:.1f} ms (cpu {self.cpu*1000:.1f} ms, '
+                f'blocks {self.blocks:+d}){", " + counts if counts else ""}')
+
+
+class LoadStats:
+    """collect the OperationStats per module, and the PassStats of the latest load passes
+
+    ```
+    with stats.measure(mod_path, 'import'):
+        module = import_it(mod_path)
+    ```
+    """
+    def __init__(self, max_passes: int = 20):
+        self.modules: Dict[str, Dict[str, OperationStats]] = {}
+        self.passes: Deque[PassStats] = deque(maxlen=max_passes)
+        self._current_pass: Optional[PassStats] = None
+        self._last_load: Dict[str, float] = {}    # the latest import or reload wall time per module
+
+    def clear(self) -> None:
+        self.modules.clear()
+        self.passes.clear()
+        self._last_load.clear()
+
+    def last_load_time(self, module_key: Any) -> Optional[float]:
+        """return the wall time of the latest import or reload of the module (None if never loaded)
+        """
+        return self._last_load.get(str(module_key))
+
+    def count(self, module_key: Any, operation: str) -> int:
+        """return how often the operation is done on this module (0 if never)
+        """
+        op_stats = self.modules.get(str(module_key), {}).get(operation)
+        return op_stats.count if op_stats else 0
+
+    def note(self, module_key: Any, operation: str) -> None:
+        """count an operation without cost, like an elided reload
+        """
+        per_module = self.modules.setdefault(str(module_key), {})
+        per_module.setdefault(operation, OperationStats()).add(0.0, 0.0, 0)
+        if self._current_pass is not None:
+            self._current_pass.counts[operation] = self._current_pass.counts.get(operation, 0) + 1
+
+    @contextmanager
+    def measure(self, module_key: Any, operation: str) -> Iterator[None]:
+        """record the cost of the enclosed operation, also when it raises an exception
+        """
+        blocks0, cpu0, wall0 = sys.getallocatedblocks(), time.process_time(), time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall0
+            cpu = time.process_time() - cpu0
+            blocks = sys.getallocatedblocks() - blocks0
+            per_module = self.modules.setdefault(str(module_key), {})
+            per_module.setdefault(operation, OperationStats()).add(wall, cpu, blocks)
+            if operation in ('import', 'reload'):
+                self._last_load[str(module_key)] = wall
+            if self._current_pass is not None:
+                self._current_pass.counts[operation] = self._current_pass.counts.get(operation, 0) + 1
+
+    @contextmanager
+    def measure_pass(self, name: str) -> Iterator[PassStats]:
+        """record the total cost of a load pass, nested passes are counted in the outer pass
+        """
+        if self._current_pass is not None:
+            yield self._current_pass
+            return
+        pass_stats = self._current_pass = PassStats(name)
+        blocks0, cpu0, wall0 = sys.getallocatedblocks(), time.process_time(), time.perf_counter()
+        try:
+            yield pass_stats
+        finally:
+            pass_stats.wall = time.perf_counter() - wall0
+            pass_stats.cpu = time.process_time() - cpu0
+            pass_stats.blocks = sys.getallocatedblocks() - blocks0
+            self._current_pass = None
+            self.passes.append(pass_stats)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {'modules': {key: {op: s.as_dict() for op, s in ops.items()}
+                            for key, ops in self.modules.items()},
+                'passes': [p.as_dict() for p in self.passes]}
+
+    def total_wall(self, module_key: str) -> float:
+        return sum(s.wall for s in self.modules.get(module_key, {}).values())
+
+    def report(self, max_lines: int = 0) -> str:
+        """return a text report, the most expensive modules first
+
+        max_lines: if > 0, only report this number of modules
+        """
+        L: List[str] = ['--- module load statistics (times in ms, blocks: change in allocated memory blocks):']
+        keys = sorted(self.modules, key=self.total_wall, reverse=True)
+        if max_lines > 0:
+            keys = keys[:max_lines]
+        for key in keys:
+            L.append(f'{key}: total {self.total_wall(key)*1000:.1f}')
+            for op in OPERATIONS:
+                s = self.modules[key].get(op)
+                if s is None:
+                    continue
+                if op == 'elided':
+                    L.append(f'    elided reloads (source unchanged): {s.count}x')
+                    continue
+                L.append(f'    {op}: {s.count}x, wall {s.wall*1000:.1f} (max {s.max_wall*1000:.1f}, '
+                         f'last {s.last_wall*1000:.1f}), cpu {s.cpu*1000:.1f}, blocks {s.blocks:+d}')
+        if self.passes:
+            L.append('--- latest load passes:')
+            L.extend(p.summary() for p in self.passes)
+        return '\n'.join(L)
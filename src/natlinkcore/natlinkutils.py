@@ -11,6 +11,9 @@ Grammar classes
   GrammarBase - base class for all command and control grammars.
       See documentation below just before the class definition.
 
+  LazyGrammarBase - GrammarBase, which is only parsed and loaded into Dragon
+      when its program (or window title) first gets the focus.
+
   DictGramBase - base class for all pure dictation grammars.
       See documentation below just before the class definition.
 
@@ -46,8 +49,10 @@ import struct
 import sys
 import traceback
 import time
+import weakref
 import natlink
 from natlinkcore import gramparser
+from natlinkcore.gramcache import grammar_cache
 
 # was set in config program, and passed via natlinkstatus.py but now removed...
 debugLoad = 0
@@ -326,15 +331,49 @@ And forget about `natlinkutils.playString`!!
  
 #Classes--------------------------------------------------------------------
 
+# the binary grammars loaded with GramClassBase.load, by module name and by grammar name (or class name,
+# with #2, #3, ... for the next unnamed grammars of the class).
+# natlinkmain compares them when a module is reloaded (see gramparser.diffGrammars):
+loadedGrammarBins = {}
+
+# while natlinkmain reloads a module (see retainGrammars), the grammars it unloads stay loaded in the engine,
+# by (module name, grammar name). When the reloaded module loads the same binary, the gramObj is taken over,
+# with its rules deactivated and its lists emptied, so the reload behaves like a fresh load:
+_retainingModules = set()
+_retainedGrammars = {}
+# the number of loaded grammars without a name, by (module name, class name), see GramClassBase.grammarKey:
+_unnamedGrammarCounts = {}
+
+def retainGrammars(moduleName):
+    """keep the grammars of moduleName loaded in the engine when they are unloaded, until releaseRetainedGrammars
+    """
+    _retainingModules.add(moduleName)
+    # the unnamed grammars of the reloaded module are numbered from 0 again:
+    for key in [key for key in _unnamedGrammarCounts if key[0] == moduleName]:
+        del _unnamedGrammarCounts[key]
+
+def releaseRetainedGrammars(moduleName):
+    """unload the retained grammars of moduleName that were not taken over, return their number
+    """
+    _retainingModules.discard(moduleName)
+    keys = [key for key in _retainedGrammars if key[0] == moduleName]
+    for key in keys:
+        _retainedGrammars.pop(key)['gramObj'].unload()
+    return len(keys)
+
 class GramClassBase:
     """shared base class for all Grammar base classes.
     
     Do not use this class directly.  See GrammarBase, DictGramBase or SelectGramBase.
     """
+    # keep the gramObj loaded while the module is reloaded, see retainGrammars (GrammarBase only):
+    retainable = False
 
     def __init__(self):
         self.gramObj = natlink.GramObj()
         self.grammarName = ''
+        self.grammarNumber = None
+        self.gramBin = None
 
     def __del__(self):
         try:
@@ -342,8 +381,42 @@ class GramClassBase:
         except AttributeError:
             pass
 
+    def grammarKey(self):
+        """the key of this grammar among the grammars of its module: the module name and the grammar name,
+        or, without a name, the class name and the number of the grammar among the loaded grammars of its class
+        """
+        moduleName, className = self.__class__.__module__, self.__class__.__name__
+        if self.grammarName:
+            return moduleName, self.grammarName
+        if self.grammarNumber is None:
+            self.grammarNumber = _unnamedGrammarCounts.get((moduleName, className), 0)
+            _unnamedGrammarCounts[moduleName, className] = self.grammarNumber + 1
+        return moduleName, className, self.grammarNumber
+
+    def loadedBinName(self):
+        """the name of this grammar in loadedGrammarBins
+        """
+        key = self.grammarKey()
+        return self.grammarName or self.__class__.__name__ + (f'#{key[2] + 1}' if key[2] else '')
+
     def load(self, gramSpec, allResults=0, hypothesis=0, grammarName=None):
         self.grammarName = grammarName or self.grammarName
+        # the same grammar of the previous version of a module that is being reloaded:
+        key = self.grammarKey()
+        retained = _retainedGrammars.pop(key, None) if self.retainable else None
+        if retained and (retained['gramBin'], retained['allResults'], retained['hypothesis']) != (gramSpec, allResults, hypothesis):
+            retained['gramObj'].unload()
+            retained = None
+        if retained:
+            self.gramObj = retained['gramObj']
+            # only the binary is taken over, the reloaded module activates its own rules and fills its own
+            # lists, as after a fresh load:
+            for ruleName in retained['activeRules']:
+                self.gramObj.deactivate(ruleName)
+            if retained['exclusiveState']:
+                self.gramObj.setExclusive(0)
+            for listName in retained['lists']:
+                self.gramObj.emptyList(listName)
         try:
             self.gramObj.setBeginCallback(self.beginCallback)
             self.gramObj.setResultsCallback(self.resultsCallback)
@@ -351,18 +424,40 @@ class GramClassBase:
         except Exception as exc:
             print("GramClassBase.load, Error at setting Callback functions")
             raise Exception from exc
-        try:
-            self.gramObj.load(gramSpec, allResults, hypothesis)
-        except natlink.NatError as exc:
-            print(f'GramClassBase.load, Error at loading the grammar: {exc}')
-            raise natlink.BadGrammar from exc
+        if not retained:
+            try:
+                self.gramObj.load(gramSpec, allResults, hypothesis)
+            except natlink.NatError as exc:
+                print(f'GramClassBase.load, Error at loading the grammar: {exc}')
+                raise natlink.BadGrammar from exc
+        self.gramBin, self.allResults, self.hypothesis = gramSpec, allResults, hypothesis
+        moduleBins = loadedGrammarBins.setdefault(self.__class__.__module__, {})
+        moduleBins[self.loadedBinName()] = gramSpec
         
         
     def unload(self):        
-        self.gramObj.unload()
         self.gramObj.setBeginCallback(None)
         self.gramObj.setResultsCallback(None)
         self.gramObj.setHypothesisCallback(None)
+        if self.retainable and self.gramBin is not None and self.__class__.__module__ in _retainingModules:
+            # keep the grammar loaded for the reloaded module, which deactivates these rules and empties these lists:
+            key = self.grammarKey()
+            if key in _retainedGrammars:
+                _retainedGrammars.pop(key)['gramObj'].unload()
+            _retainedGrammars[key] = {'gramObj': self.gramObj, 'gramBin': self.gramBin,
+                                      'allResults': self.allResults, 'hypothesis': self.hypothesis,
+                                      'activeRules': dict(getattr(self, 'activeRules', {})),
+                                      'exclusiveState': getattr(self, 'exclusiveState', 0),
+                                      'lists': list(getattr(self, 'validLists', []))}
+            self.gramObj = natlink.GramObj()
+        else:
+            self.gramObj.unload()
+            moduleBins = loadedGrammarBins.get(self.__class__.__module__)
+            if self.gramBin is not None and moduleBins:
+                moduleBins.pop(self.loadedBinName(), None)
+                if not moduleBins:
+                    del loadedGrammarBins[self.__class__.__module__]
+        self.gramBin = None
 
     def activate(self,window=0,exclusive=None):
         self.gramObj.activate('',window)
@@ -675,6 +770,8 @@ will be made (in the order indicated).
 #   gotResults( ['this','big','red','object','is','good'], ... )
 #     """
 
+    retainable = True
+
     def __init__(self):
         GramClassBase.__init__(self)
         self.is_loaded = False
@@ -698,24 +795,23 @@ will be made (in the order indicated).
             if not isinstance(gramSpec, (str, list)):
                 raise TypeError( "grammar definition of %s must be a string or a list of strings, not %s"% (grammarName, type(gramSpec)))
 
-            parser = gramparser.GramParser(gramSpec, grammarName=grammarName)
-            parser.doParse()
-            parser.checkForErrors()
-            gramBin = gramparser.packGrammar(parser)
+            # parse and pack, or take the result from the grammar cache (when the gramSpec did not change):
+            compiled = grammar_cache.get(gramSpec, grammarName=grammarName)
+            gramBin = compiled.gramBin
             # self.scanObj = parser.scanObj  # for later error messages 
             #              no mention to GrammarError after the loading now..
             try:
-                GramClassBase.load(self,gramBin,allResults,hypothesis)
+                GramClassBase.load(self,gramBin,allResults,hypothesis,grammarName=grammarName)
             except natlink.BadGrammar:
                 self.is_loaded = False
                 return self.is_loaded
             # we want to keep a list of the rules which can be activated and the
             # known lists so we can catch errors earlier
-            self.validRules = list(parser.exportRules.keys())
-            self.validLists = list(parser.knownLists.keys())
+            self.validRules = list(compiled.exportRules.keys())
+            self.validLists = list(compiled.knownLists.keys())
             # we reverse the rule dictionary so we can convert rule numbers back
             # to rule names during recognition
-            for ruleNum, knownRule in parser.knownRules.items():
+            for ruleNum, knownRule in compiled.knownRules.items():
                 self.ruleMap[ knownRule ] = ruleNum
             self.is_loaded = True
 
@@ -1047,6 +1143,146 @@ will be made (in the order indicated).
             self.callIfExists( 'gotResults_'+ruleName, (ruleWords, fullResults) )
 
 
+#---------------------------------------------------------------------------
+# LazyGrammarBase
+#
+# the lazy grammars that are not loaded yet, checked by checkLazyGrammars
+# (weak references, so a grammar that is deleted is dropped automatically):
+_lazyGrammars = weakref.WeakSet()
+
+class LazyGrammarBase(GrammarBase):
+    """GrammarBase, which postpones parsing, packing and loading the grammar
+
+  until the first utterance in a program or window that matches the filter:
+
+  lazyPrograms: program names (like "calc", lowercase, as getCurrentApplicationName returns them),
+      empty: all programs
+  lazyTitle: text that must be in the window title, empty: all titles
+
+  load() records the gramSpec (and returns True), calls to activate, deactivate,
+  setExclusive and the list functions are recorded as well. At the first begin callback
+  (natlinkmain calls checkLazyGrammars) that matches the filter, the grammar is loaded,
+  the recorded calls are done and gotBegin is called.
+
+  For a more complex filter, override matchesContext(moduleInfo).
+
+  Example:
+
+  class ThisGrammar(LazyGrammarBase):
+      lazyPrograms = ('excel',)
+      gramSpec = ...
+  """
+    lazyPrograms = ()
+    lazyTitle = ''
+
+    def __init__(self):
+        GrammarBase.__init__(self)
+        self.lazySpec = None     # the arguments of load, while the grammar is not loaded yet
+        self.lazyCalls = []      # (function name, args, kwargs) of the calls while waiting
+
+    def load(self, gramSpec, allResults=0, hypothesis=0, grammarName=None):
+        if self.is_loaded:
+            return GrammarBase.load(self, gramSpec, allResults, hypothesis, grammarName)
+        self.lazySpec = (gramSpec, allResults, hypothesis, grammarName)
+        self.lazyCalls = []
+        _lazyGrammars.add(self)
+        return True
+
+    def isWaiting(self):
+        """return True if the grammar is not loaded, waiting for a matching begin callback
+        """
+        return self.lazySpec is not None
+
+    def matchesContext(self, moduleInfo):
+        """return True if the grammar must be loaded at a begin callback with this moduleInfo
+        """
+        if self.lazyPrograms and getCurrentApplicationName(moduleInfo) not in self.lazyPrograms:
+            return False
+        if self.lazyTitle and (len(moduleInfo) < 2 or moduleInfo[1].find(self.lazyTitle) == -1):
+            return False
+        return True
+
+    def loadNow(self, moduleInfo=None):
+        """parse and load the grammar, do the recorded calls, and call gotBegin if moduleInfo is given
+        """
+        if self.lazySpec is None:
+            return self.is_loaded
+        gramSpec, allResults, hypothesis, grammarName = self.lazySpec
+        calls, self.lazySpec, self.lazyCalls = self.lazyCalls, None, []
+        _lazyGrammars.discard(self)
+        if not GrammarBase.load(self, gramSpec, allResults, hypothesis, grammarName):
+            return False
+        for funcName, args, kwargs in calls:
+            getattr(self, funcName)(*args, **kwargs)
+        if moduleInfo is not None:
+            self.callIfExists( "gotBegin", (moduleInfo,) )
+        return True
+
+    def unload(self):
+        if self.lazySpec is not None:
+            self.lazySpec, self.lazyCalls = None, []
+            _lazyGrammars.discard(self)
+            return
+        GrammarBase.unload(self)
+
+    def _recordOrCall(self, funcName, args, kwargs):
+        if self.lazySpec is not None:
+            self.lazyCalls.append( (funcName, args, kwargs) )
+            return None
+        return getattr(GrammarBase, funcName)(self, *args, **kwargs)
+
+    def activate(self, *args, **kwargs):
+        return self._recordOrCall('activate', args, kwargs)
+
+    def deactivate(self, *args, **kwargs):
+        return self._recordOrCall('deactivate', args, kwargs)
+
+    def activateSet(self, *args, **kwargs):
+        return self._recordOrCall('activateSet', args, kwargs)
+
+    def deactivateSet(self, *args, **kwargs):
+        return self._recordOrCall('deactivateSet', args, kwargs)
+
+    def activateAll(self, *args, **kwargs):
+        return self._recordOrCall('activateAll', args, kwargs)
+
+    def deactivateAll(self, *args, **kwargs):
+        return self._recordOrCall('deactivateAll', args, kwargs)
+
+    def setExclusive(self, *args, **kwargs):
+        return self._recordOrCall('setExclusive', args, kwargs)
+
+    def emptyList(self, *args, **kwargs):
+        return self._recordOrCall('emptyList', args, kwargs)
+
+    def appendList(self, *args, **kwargs):
+        return self._recordOrCall('appendList', args, kwargs)
+
+    def setList(self, *args, **kwargs):
+        return self._recordOrCall('setList', args, kwargs)
+
+def checkLazyGrammars(moduleInfo):
+    """load the lazy grammars whose filter matches moduleInfo, return the number of grammars loaded
+
+    Called by natlinkmain at the start of each utterance.
+    """
+    if not _lazyGrammars:
+        return 0
+    matching = [gram for gram in list(_lazyGrammars) if gram.matchesContext(moduleInfo)]
+    for gram in matching:
+        try:
+            gram.loadNow(moduleInfo)
+        except:
+            print(f'Unexpected error loading lazy grammar "{gram.__class__.__name__}":', sys.exc_info())
+            print(traceback.print_exc())
+    return len(matching)
+
+def getLazyGrammarCount():
+    """return the number of lazy grammars that are not loaded yet
+    """
+    return len(_lazyGrammars)
+
+
 #---------------------------------------------------------------------------
 # DictGramBase
 #        
@@ -0,0 +1,103 @@
+"""compile python files to bytecode (__pycache__) in a process pool
+
+With a cold __pycache__ (after a pip upgrade or a regeneration of the grammar files) the loader
+would compile every grammar file on the thread of Dragon. Precompiling them in parallel, before the
+first load, leaves only the execution of the cached bytecode to the loader.
+
+The .pyc files are written as the import system does (py_compile, timestamp based), so they are used
+by importlib.util.spec_from_file_location/SourceFileLoader.
+
+```
+result = precompile(paths)
+print(result['compiled'], result['fresh'], result['errors'])
+```
+"""
+#pylint:disable=C0116
+import concurrent.futures
+import importlib.util
+import multiprocessing
+import os
+import py_compile
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+def bytecode_is_fresh(path: Any) -> bool:
+    """return True if the cached bytecode of the source file is valid (as the import system checks it)
+    """
+    try:
+        st = os.stat(path)
+        with open(importlib.util.cache_from_source(str(path)), 'rb') as f:
+            header = f.read(16)
+    except (OSError, NotImplementedError, ValueError):
+        return False
+    if len(header) < 16 or header[:4] != importlib.util.MAGIC_NUMBER:
+        return False
+    flags = int.from_bytes(header[4:8], 'little')
+    if flags != 0:
+        # hash based pyc, checked or not, leave it alone
+        return True
+    mtime = int.from_bytes(header[8:12], 'little')
+    size = int.from_bytes(header[12:16], 'little')
+    return mtime == (int(st.st_mtime) & 0xFFFFFFFF) and size == (st.st_size & 0xFFFFFFFF)
+
+def compile_file(path: str) -> Optional[str]:
+    """compile one file, return the error message, or None when all went well
+
+    Runs in the worker processes, so it is a module level function.
+    """
+    try:
+        py_compile.compile(path, doraise=True)
+    except py_compile.PyCompileError as exc:
+        return exc.msg
+    except OSError as exc:
+        return str(exc)
+    return None
+
+def python_executable() -> str:
+    """the python interpreter for the worker processes
+
+    Inside Dragon sys.executable is not python itself, take python(w).exe from sys.exec_prefix then.
+    """
+    exe = sys.executable or ''
+    if Path(exe).stem.lower().startswith('python'):
+        return exe
+    for name in ('python.exe', 'pythonw.exe', 'python3', 'python'):
+        candidate = Path(sys.exec_prefix)/name
+        if candidate.is_file():
+            return str(candidate)
+    return exe
+
+def _compile_in_pool(paths: List[str], max_workers: Optional[int]) -> Dict[str, Optional[str]]:
+    ctx = multiprocessing.get_context('spawn')
+    ctx.set_executable(python_executable())
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx) as executor:
+        return dict(zip(paths, executor.map(compile_file, paths, chunksize=max(1, len(paths)//32))))
+
+def precompile(paths: Iterable[Any], max_workers: Optional[int] = None, force: bool = False,
+               min_parallel: int = 4) -> Dict[str, Any]:
+    """compile the source files that have no valid bytecode, in parallel when there are enough
+
+    force: compile all files, also when the bytecode is valid
+    min_parallel: with fewer files to compile, compile them in this process
+
+    Return a dict with the number of 'compiled' and 'fresh' files, the 'errors' ({path: message}),
+    'parallel' (True if a process pool was used) and the wall 'time' in seconds.
+    """
+    t0 = time.perf_counter()
+    paths = [str(p) for p in paths]
+    to_compile = paths if force else [p for p in paths if not bytecode_is_fresh(p)]
+    parallel = len(to_compile) >= min_parallel and max_workers != 1
+    results: Dict[str, Optional[str]] = {}
+    if parallel:
+        try:
+            results = _compile_in_pool(to_compile, max_workers)
+        except (OSError, concurrent.futures.process.BrokenProcessPool, RuntimeError):
+            # no worker processes possible, compile here
+            parallel = False
+    if not parallel:
+        results = {p: compile_file(p) for p in to_compile}
+    errors = {p: msg for p, msg in results.items() if msg is not None}
+    return {'compiled': len(to_compile) - len(errors), 'fresh': len(paths) - len(to_compile),
+            'errors': errors, 'parallel': parallel, 'time': time.perf_counter() - t0}
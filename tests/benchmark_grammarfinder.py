@@ -0,0 +1,73 @@
+"""benchmark: import latency with the grammar directories in sys.path, versus the GrammarFinder
+
+Not collected by pytest, run it directly:
+
+    python benchmark_grammarfinder.py [number_of_directories] [modules_per_directory]
+
+For each setup, it measures importlib.util.find_spec for
+ - stdlib modules (not in the grammar directories, probed in every grammar directory with sys.path)
+ - helper modules in the grammar directories
+"""
+#pylint:disable=C0116
+import importlib
+import importlib.util
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from natlinkcore.grammarfinder import GrammarFinder
+
+STDLIB_NAMES = ['colorsys', 'fractions', 'statistics', 'shlex', 'difflib', 'textwrap', 'csv', 'wave']
+
+def make_grammar_dirs(root: Path, n_dirs: int, n_modules: int):
+    directories = []
+    for i in range(n_dirs):
+        d = root/f'grammars{i}'
+        d.mkdir()
+        for j in range(n_modules):
+            (d/f'_grammar_{i}_{j}.py').write_text('x = 0\n')
+            (d/f'bench_helper_{i}_{j}.py').write_text('x = 0\n')
+        directories.append(str(d))
+    return directories
+
+def time_find_spec(names, repeat):
+    find_spec = importlib.util.find_spec
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for name in names:
+            find_spec(name)
+    return (time.perf_counter() - t0) / (repeat*len(names)) * 1e6
+
+def run(n_dirs=12, n_modules=30, repeat=200):
+    with tempfile.TemporaryDirectory() as tmp:
+        directories = make_grammar_dirs(Path(tmp), n_dirs, n_modules)
+        helper_names = [f'bench_helper_{i}_0' for i in range(n_dirs)]
+        # find_spec does not look in sys.modules for these names, so there is no caching effect
+        results = {}
+        original_path = list(sys.path)
+        for d in directories:
+            sys.path.insert(0, d)
+        importlib.invalidate_caches()
+        time_find_spec(STDLIB_NAMES + helper_names, 1)    # warm up the FileFinder caches
+        results['sys.path'] = (time_find_spec(STDLIB_NAMES, repeat), time_find_spec(helper_names, repeat))
+        sys.path[:] = original_path
+        importlib.invalidate_caches()
+
+        finder = GrammarFinder(directories)
+        finder.install()
+        try:
+            time_find_spec(STDLIB_NAMES + helper_names, 1)
+            results['GrammarFinder'] = (time_find_spec(STDLIB_NAMES, repeat), time_find_spec(helper_names, repeat))
+        finally:
+            finder.uninstall()
+
+    print(f'{n_dirs} grammar directories, {2*n_modules} modules each; microseconds per find_spec:')
+    print(f'{"":15} {"stdlib":>10} {"helpers":>10}')
+    for name, (stdlib, helpers) in results.items():
+        print(f'{name:15} {stdlib:10.1f} {helpers:10.1f}')
+    return results
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    run(*args)
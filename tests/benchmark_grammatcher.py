@@ -0,0 +1,78 @@
+"""benchmark: utterances per second of the offline GrammarMatcher, on a stack of generated grammars
+
+Not collected by pytest, run it directly:
+
+    python benchmark_grammatcher.py [number_of_grammars] [number_of_utterances]
+
+Every utterance is matched against all grammars of the stack, like Dragon does with the active grammars.
+The utterances are generated from the grammars themselves (so they match one of them), a quarter is
+changed so it matches none.
+"""
+#pylint:disable=C0116
+import random
+import sys
+import time
+
+from natlinkcore import gramparser
+from natlinkcore.gramast import Alt, List, Opt, Rep, RuleRef, Seq, Word
+from natlinkcore.grammatcher import GrammarMatcher
+
+def make_grammar(i, n_rules=20, n_words=15):
+    lines = ['<dgndictation> imported;', f'<number{i}> = one | two | three | four | five;']
+    for r in range(n_rules):
+        words = ' | '.join(f'word{r}x{j}' for j in range(n_words))
+        lines.append(f'<rule{r}> exported = command{i} ({words}) [<number{i}>] | go{i} {{list{i}}}+ | note{i} <dgndictation>;')
+    return lines
+
+def random_phrase(node, parser, rnd, lists):
+    if isinstance(node, Word):
+        return [node.name]
+    if isinstance(node, List):
+        return [rnd.choice(lists[node.name])]
+    if isinstance(node, RuleRef):
+        if node.name in parser.ruleAsts:
+            return random_phrase(parser.ruleAsts[node.name], parser, rnd, lists)
+        return ['some', 'dictated', 'words'][:rnd.randint(1, 3)]
+    if isinstance(node, Opt):
+        return random_phrase(node.item, parser, rnd, lists) if rnd.random() < 0.5 else []
+    if isinstance(node, Rep):
+        return [w for _ in range(rnd.randint(1, 3)) for w in random_phrase(node.item, parser, rnd, lists)]
+    if isinstance(node, Alt):
+        return random_phrase(rnd.choice(node.items), parser, rnd, lists)
+    assert isinstance(node, Seq)
+    return [w for item in node.items for w in random_phrase(item, parser, rnd, lists)]
+
+def run(n_grammars=30, n_utterances=3000, seed=1):
+    rnd = random.Random(seed)
+    matchers, utterances = [], []
+    t0 = time.perf_counter()
+    for i in range(n_grammars):
+        parser = gramparser.GramParser(make_grammar(i))
+        parser.doParse()
+        lists = {f'list{i}': [f'item{k}' for k in range(50)]}
+        matcher = GrammarMatcher(parser)
+        matcher.setList(f'list{i}', lists[f'list{i}'])
+        matchers.append(matcher)
+        for _ in range(n_utterances // n_grammars):
+            words = random_phrase(parser.ruleAsts[f'rule{rnd.randrange(20)}'], parser, rnd, lists)
+            if rnd.random() < 0.25:
+                words = words + ['unknown']
+            utterances.append(words)
+    build = time.perf_counter() - t0
+    n_states = sum(len(m.epsilon) for m in matchers)
+    print(f'{n_grammars} grammars, {n_states} states, built in {build*1000:.0f} ms')
+
+    t0 = time.perf_counter()
+    recognized = 0
+    for words in utterances:
+        for matcher in matchers:
+            if matcher.match(words) is not None:
+                recognized += 1
+                break
+    elapsed = time.perf_counter() - t0
+    print(f'{len(utterances)} utterances, {recognized} recognized, {elapsed*1000:.0f} ms: '
+          f'{len(utterances)/elapsed:.0f} utterances per second')
+
+
+if __name__ == "__main__":
+    run(*[int(arg) for arg in sys.argv[1:3]])
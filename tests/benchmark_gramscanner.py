@@ -0,0 +1,205 @@
+"""benchmark: the regex GramScanner versus the previous character by character scanner
+
+Not collected by pytest, run it directly:
+
+    python benchmark_gramscanner.py [number_of_rules] [words_per_list_line]
+
+Before timing, both scanners are run on the benchmark grammar and on random (often invalid)
+grammars, and must give the same tokens, values, whitespace, error messages and error positions.
+"""
+#pylint:disable=C0116
+import random
+import sys
+import time
+
+from natlinkcore import gramparser
+from natlinkcore.gramparser import GramScanner, GramScannerReverse, GrammarParserError, LexicalError, isCharOrDigit
+
+class CharScanner(GramScanner):
+    """the previous implementation, one character at a time
+    """
+    def skipWhiteSpace(self) -> None:
+        """skip whitespace and comments, but keeps the leading comment/whitespace
+        in variable self.lastWhiteSpace (QH, july 2012)
+        """
+        ch = self.char
+        oldPos = ch
+        oldLine = self.line
+        while 1:
+            ln = self.text[self.line]
+            lnLen = len(ln)
+            while ch < lnLen and not ln[ch].strip():  # in string.whitespace:
+                ch = ch + 1
+            if ch < lnLen and ln[ch] != '#':
+                break
+            self.line = self.line + 1
+            self.text[self.line] = self.text[self.line].replace('\t', ' ')
+            self.text[self.line] = self.text[self.line].replace('\n', ' ')
+            ch = 0
+        self.char = ch
+        if self.line == oldLine:
+            self.lastWhiteSpace = ln[oldPos:ch]
+        else:
+            L = [self.text[oldLine][oldPos:]]
+            for l in range(oldLine + 1, self.line):
+                L.append(self.text[l])
+            L.append(self.text[self.line][:ch])
+            self.lastWhiteSpace = '\n'.join(L)
+
+    def getAnotherToken(self) -> None:
+        """return a token and (if appropriate) the corresponding value
+        
+        token can be '=', '|', '+', ';', '(', ')', '[', ']' (with value None)
+        or 'list' (value without {})
+        or 'rule' (value without <>)
+        or 'sqword', 'dqword', 'word'  (a word, in single quotes, double quotes or unquoted)
+        Note "exported" and "imported" and list names and rule names must have token 'word'
+        Grammar words can have dqword or sqword too. (dqword and sqword added by QH, july 2012)
+        
+        """
+
+        if self.token == '\0':
+            return
+
+        self.value = None
+
+        self.skipWhiteSpace()  # now leaves self.lastWhiteSpace
+        ch = self.char
+        ln = self.text[self.line]
+        lnLen = len(ln)
+
+        self.start = ch
+
+        if ln[ch] in ['(', ')', '[', ']', '|', '+', '=', ';', '\0']:
+            self.token = ln[ch]
+            ch = ch + 1
+
+        elif ln[ch] == '"':
+            self.token = 'dqword'
+            ch = ch + 1
+            while ch < lnLen and ln[ch] != '"':
+                ch = ch + 1
+            if ch >= lnLen:
+                raise LexicalError("expecting closing quote in word name", self)
+            self.value = ln[self.start + 1:ch]
+            ch = ch + 1
+
+        elif ln[ch] == "'":
+            self.token = 'sqword'
+            ch = ch + 1
+            while ch < lnLen and ln[ch] != "'":
+                ch = ch + 1
+            if ch >= lnLen:
+                raise LexicalError("expecting closing quote in word name", self)
+            self.value = ln[self.start + 1:ch]
+            ch = ch + 1
+
+        elif ln[ch] == '<':
+            self.token = 'rule'
+            ch = ch + 1
+            while ch < lnLen and ln[ch] != '>':
+                ch = ch + 1
+            if ch >= lnLen:
+                raise LexicalError("expecting closing angle bracket in rule name", self)
+            self.value = ln[self.start + 1:ch]
+            ch = ch + 1
+
+        elif ln[ch] == '{':
+            self.token = 'list'
+            ch = ch + 1
+            while ch < lnLen and ln[ch] != '}':
+                ch = ch + 1
+            if ch >= lnLen:
+                raise LexicalError("expecting closing brace in list name", self)
+            self.value = ln[self.start + 1:ch]
+            ch = ch + 1
+
+        elif isCharOrDigit(ln[ch]):
+            self.token = 'word'
+            while ch < lnLen and isCharOrDigit(ln[ch]):
+                ch = ch + 1
+            self.value = ln[self.start:ch]
+
+        else:
+            raise LexicalError("unknown character found", self)
+
+        self.char = ch
+
+def scan_all(scanner_class, lines):
+    scanner = scanner_class(list(lines), grammarName='bench')
+    scanner.phase = 'scanning'
+    tokens = []
+    try:
+        while scanner.token != '\0':
+            scanner.getAnotherToken()
+            tokens.append((scanner.token, scanner.value, scanner.lastWhiteSpace))
+    except GrammarParserError as exc:
+        tokens.append((type(exc).__name__, str(exc), scanner.token, scanner.line, scanner.start, scanner.char))
+    return tokens, scanner.text
+
+def make_grammar(n_rules, n_words):
+    lines = ['# a generated grammar, like the output of Vocola', '<dgndictation> imported;']
+    for i in range(n_rules):
+        words = ' | '.join(f'word{i}x{j} "quoted {j}"' for j in range(n_words))
+        lines.append(f'<rule{i}> exported = \t(open | close) [<sub{i}>] ({words}) {{list{i}}}+ ;  # comment {i}')
+        lines.append(f"<sub{i}> = 'single quoted' | élève{i} | <dgndictation>;")
+    return lines
+
+FUZZ_CHARS = ['a', 'b', 'é', '5', '½', ' ', ' ', '\t', '\n', '\xa0', '#', '"', "'", '<', '>', '{', '}',
+              '(', ')', '[', ']', '|', '+', '=', ';', '-', '_', '.']
+
+def fuzz(n_grammars, seed=1):
+    rnd = random.Random(seed)
+    for _ in range(n_grammars):
+        lines = [''.join(rnd.choice(FUZZ_CHARS) for _ in range(rnd.randint(0, 30))) for _ in range(rnd.randint(1, 5))]
+        if rnd.random() < 0.5:
+            lines = [ln.replace('#', '').replace('"', '').replace("'", '') for ln in lines]
+        yield lines
+
+def check(lines_list):
+    n = 0
+    for lines in lines_list:
+        if scan_all(CharScanner, lines) != scan_all(GramScanner, lines):
+            raise AssertionError(f'different result for grammar {lines!r}')
+        n += 1
+    return n
+
+def check_whitespace_class():
+    for i in range(sys.maxunicode + 1):
+        c = chr(i)
+        if (not c.strip()) != bool(gramparser.reWhiteSpace.fullmatch(c)):
+            raise AssertionError(f'whitespace differs for {c!r}')
+
+def time_scanner(scanner_class, lines, repeat):
+    """the best time of repeat scans, in milliseconds
+    """
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        scanner = scanner_class(list(lines))
+        scanner.phase = 'scanning'
+        while scanner.token != '\0':
+            scanner.getAnotherToken()
+        times.append(time.perf_counter() - t0)
+    return min(times) * 1000
+
+def run(n_rules=200, n_words=20, repeat=10):
+    lines = make_grammar(n_rules, n_words)
+    check_whitespace_class()
+    n_checked = check([lines]) + check(fuzz(3000))
+    reverse = GramScannerReverse(lines)
+    for item in reverse.gramscannergen():
+        reverse.appendToReturnList(*item)
+    assert reverse.mergeReturnList().split('\n') == [ln.replace('\t', ' ') if i else ln for i, ln in enumerate(lines)]
+    print(f'{n_checked} grammars give equal results with both scanners')
+
+    n_chars = sum(len(ln) for ln in lines)
+    old = time_scanner(CharScanner, lines, repeat)
+    new = time_scanner(GramScanner, lines, repeat)
+    print(f'grammar of {len(lines)} lines, {n_chars} characters:')
+    print(f'character scanner: {old:8.1f} ms')
+    print(f'regex scanner:     {new:8.1f} ms  ({old/new:.1f}x faster)')
+
+
+if __name__ == "__main__":
+    run(*[int(arg) for arg in sys.argv[1:3]])
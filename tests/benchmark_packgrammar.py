@@ -0,0 +1,125 @@
+"""benchmark: packGrammar with one preallocated buffer versus the previous join of packed pieces
+
+Not collected by pytest, run it directly:
+
+    python benchmark_packgrammar.py [number_of_words] [number_of_rules]
+
+Before timing, the output of both packers is compared byte for byte. The second grammar has more rule
+and list names than the cache of encoded names (gramparser.encodedNames) keeps.
+"""
+#pylint:disable=C0116
+import sys
+import time
+from struct import pack
+
+from natlinkcore import gramparser
+from natlinkcore.gramparser import GramParser, packGrammar, preferredencoding
+
+def packGrammarJoined(parseObj):
+    """the previous implementation, a bytes object per word and per rule element
+    """
+    output = [pack("LL", 0, 0)]
+    if parseObj.exportRules:
+        output.append(packGrammarChunkJoined(4, parseObj.exportRules))
+    if parseObj.importRules:
+        output.append(packGrammarChunkJoined(5, parseObj.importRules))
+    if parseObj.knownLists:
+        output.append(packGrammarChunkJoined(6, parseObj.knownLists))
+    if parseObj.knownWords:
+        output.append(packGrammarChunkJoined(2, parseObj.knownWords))
+    if parseObj.ruleDefines:
+        output.append(packGrammarRulesJoined(3, parseObj.knownRules, parseObj.ruleDefines))
+    return b"".join(output)
+
+def packGrammarChunkJoined(chunktype, chunkdict):
+    output = []
+    totalLen = 0
+    for word, value in chunkdict.items():
+        if isinstance(word, str):
+            word = word.encode(preferredencoding)
+        paddedLen = (len(word) + 4) & 0xFFFC
+        output.append(pack("LL%ds" % paddedLen, paddedLen + 8, value, word))
+        totalLen = totalLen + paddedLen + 8
+    output.insert(0, pack("LL", chunktype, totalLen))
+    return b"".join(output)
+
+def packGrammarRulesJoined(chunktype, names, chunkdict):
+    output = []
+    totalLen = 0
+    elemType = {'start': 1, 'end': 2, 'word': 3, 'rule': 4, 'list': 6}
+    for word, _ in chunkdict.items():
+        ruleDef = []
+        ruleLen = 0
+        for element in chunkdict[word]:
+            ruleDef.append(pack("HHL", elemType[element[0]], 0, element[1]))
+            ruleLen = ruleLen + 8
+        output.append(pack("LL", ruleLen + 8, names[word]))
+        output.append(b"".join(ruleDef))
+        totalLen = totalLen + ruleLen + 8
+    output.insert(0, pack("LL", chunktype, totalLen))
+    return b"".join(output)
+
+def make_grammar(n_words, n_rules):
+    per_rule = max(1, n_words // n_rules)
+    lines = ['<dgndictation> imported;']
+    for i in range(n_rules):
+        words = ' | '.join(f'word{i}x{j} [élève{j}]' if j % 10 == 0 else f'"word {i} {j}"' for j in range(per_rule))
+        lines.append(f'<rule{i}> exported = ({words}) {{list{i}}}+ [<dgndictation>];')
+    return lines
+
+def parse(lines):
+    parser = GramParser(lines)
+    parser.doParse()
+    parser.checkForErrors()
+    return parser
+
+def best_time(func, arg, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func(arg)
+        times.append(time.perf_counter() - t0)
+    return min(times) * 1000
+
+def compare(parser, repeat):
+    n_elements = sum(map(len, parser.ruleDefines.values()))
+    old = best_time(packGrammarJoined, parser, repeat)
+    new = best_time(packGrammar, parser, repeat)
+    print(f'grammar of {len(parser.knownWords)} words, {len(parser.ruleDefines)} rules, '
+          f'{len(parser.knownLists)} lists, {n_elements} rule elements, {len(packGrammar(parser))} bytes:')
+    print(f'joined packer:    {old:8.1f} ms')
+    print(f'buffer packer:    {new:8.1f} ms  ({old/new:.1f}x faster)')
+
+def run(n_words=20000, n_rules=100, repeat=10):
+    for spec in ('<start> exported = a;', '<a> imported; <start> exported = <a> {l} "b c"+;',
+                 make_grammar(300, 7)):
+        parser = parse(spec)
+        assert packGrammar(parser) == packGrammarJoined(parser)
+        for name in ('exportRules', 'knownWords'):
+            chunk = getattr(parser, name)
+            assert gramparser.packGrammarChunk(2, chunk) == packGrammarChunkJoined(2, chunk)
+    parser = parse(make_grammar(n_words, n_rules))
+    gramBin = packGrammar(parser)
+    assert gramBin == packGrammarJoined(parser)
+    if gramparser.elementsAsLongs:
+        gramparser.elementsAsLongs = False
+        assert packGrammar(parser) == gramBin
+        gramparser.elementsAsLongs = True
+    print('both packers give the same bytes')
+
+    compare(parser, repeat)
+    # more rule and list names than the cache of encoded names keeps:
+    n_rules = gramparser.encodedNames.maxEntries
+    parser = parse(make_grammar(max(n_words, n_rules), n_rules))
+    assert packGrammar(parser) == packGrammarJoined(parser)
+    compare(parser, repeat)
+    # the cost of evicting, compared with a cache that keeps all names:
+    table = gramparser.encodedNames
+    table.maxEntries = 2*n_rules
+    cached = best_time(packGrammar, parser, repeat)
+    table.maxEntries = n_rules
+    print(f'all names cached: {cached:8.1f} ms')
+
+
+if __name__ == "__main__":
+    run(*[int(arg) for arg in sys.argv[1:3]])
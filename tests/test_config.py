@@ -103,6 +103,7 @@ def test_settings_2(mock_syspath,settings2):
     assert test_cfg.load_on_begin_utterance is True
     assert test_cfg.load_on_startup is False
     assert test_cfg.load_on_user_changed is False
+    assert test_cfg.load_priorities == {'_critical_grammar': 'critical', '_slow_grammar': 'low'}
 
 
 def test_dap_settings(dap_settings1,dap_settings2,dap_settings3):
@@ -0,0 +1,57 @@
+#pylint:disable= C0114, C0116
+import os
+
+import pytest
+
+from natlinkcore.configcache import ConfigCache
+
+def write_ini(path, text, mtime_ns):
+    path.write(text)
+    os.utime(path.strpath, ns=(mtime_ns, mtime_ns))
+
+def test_cache_hits_and_invalidation(tmpdir):
+    cache = ConfigCache()
+    ini = tmpdir.join('test.ini')
+    write_ini(ini, '[settings]\nlog_level = INFO\n', 123456000000000)
+
+    Config = cache.get_config(ini.strpath)
+    assert Config.get('settings', 'log_level') == 'INFO'
+    assert cache.get_config(ini.strpath) is Config
+    assert cache.get_text(ini.strpath) == '[settings]\nlog_level = INFO\n'
+    assert cache.info() == {'hits': 2, 'misses': 1, 'size': 1, 'maxsize': 16}
+
+    # a changed file is read again:
+    write_ini(ini, '[settings]\nlog_level = DEBUG\n', 123457000000000)
+    text, Config2 = cache.get_text_and_config(ini.strpath)
+    assert Config2 is not Config
+    assert Config2.get('settings', 'log_level') == 'DEBUG'
+    assert text.endswith('DEBUG\n')
+    assert cache.info()['misses'] == 2
+
+    cache.clear()
+    assert cache.info() == {'hits': 0, 'misses': 0, 'size': 0, 'maxsize': 16}
+
+def test_cache_is_bounded(tmpdir):
+    cache = ConfigCache(maxsize=2)
+    paths = []
+    for name in 'abc':
+        ini = tmpdir.join(f'{name}.ini')
+        write_ini(ini, f'[section]\nname = {name}\n', 123456000000000)
+        paths.append(ini.strpath)
+    cache.get_config(paths[0])
+    cache.get_config(paths[1])
+    cache.get_config(paths[0])   # now paths[1] is the least recently used
+    cache.get_config(paths[2])
+    assert cache.info()['size'] == 2
+    cache.get_config(paths[0])
+    assert cache.info()['hits'] == 2
+    cache.get_config(paths[1])
+    assert cache.info()['misses'] == 4
+
+def test_cache_missing_file(tmpdir):
+    cache = ConfigCache()
+    with pytest.raises(OSError):
+        cache.get_config(tmpdir.join('missing.ini').strpath)
+
+if __name__ == "__main__":
+    pytest.main(['test_configcache.py'])
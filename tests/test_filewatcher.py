@@ -0,0 +1,72 @@
+#pylint:disable= C0114, C0116, W0621
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from natlinkcore.filewatcher import PollingWatcher, InotifyWatcher, create_watcher
+
+def wait_for_changes(watcher, timeout=3.0):
+    end = time.time() + timeout
+    while time.time() < end:
+        if watcher.has_changes():
+            # give the watcher the chance to collect related events too:
+            time.sleep(0.2)
+            return watcher.take_changes()
+        time.sleep(0.02)
+    return watcher.take_changes()
+
+def check_watcher(watcher, tmpdir):
+    a_path = Path(tmpdir.strpath)/'_a.py'
+    watcher.start()
+    try:
+        time.sleep(0.2)
+        assert watcher.take_changes() == (set(), False)
+        a_path.write_text('x=0')
+        changed, overflow = wait_for_changes(watcher)
+        assert changed == {a_path}
+        assert overflow is False
+
+        # other files are ignored:
+        (Path(tmpdir.strpath)/'notes.txt').write_text('text')
+        time.sleep(0.3)
+        assert watcher.take_changes() == (set(), False)
+
+        a_path.unlink()
+        changed, overflow = wait_for_changes(watcher)
+        assert changed == {a_path}
+    finally:
+        watcher.stop()
+    assert not watcher.is_running()
+
+def test_polling_watcher(tmpdir):
+    check_watcher(PollingWatcher([tmpdir.strpath], interval=0.05), tmpdir)
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify is only available on Linux')
+def test_inotify_watcher(tmpdir):
+    check_watcher(InotifyWatcher([tmpdir.strpath]), tmpdir)
+
+def test_create_watcher(tmpdir):
+    watcher = create_watcher([tmpdir.strpath])
+    if sys.platform.startswith('linux'):
+        assert isinstance(watcher, InotifyWatcher)
+        watcher.stop()
+    else:
+        assert isinstance(watcher, PollingWatcher)
+
+def test_polling_watcher_missing_directory(tmpdir):
+    missing = tmpdir.join('missing')
+    missing.mkdir()
+    watcher = PollingWatcher([missing.strpath], interval=0.05)
+    watcher.start()
+    try:
+        time.sleep(0.1)
+        missing.remove()
+        _changed, overflow = wait_for_changes(watcher)
+        assert overflow is True
+    finally:
+        watcher.stop()
+
+if __name__ == "__main__":
+    pytest.main(['test_filewatcher.py'])
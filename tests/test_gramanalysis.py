@@ -0,0 +1,80 @@
+#pylint:disable= C0114, C0116
+import itertools
+
+import pytest
+
+from natlinkcore import gramparser
+from natlinkcore.gramanalysis import GrammarAnalysis, countGrammarPhrases
+
+gramSpec = """
+    <dgndictation> imported;
+    <start> exported = (open | close) <thing> [now];
+    <thing> = file | window | tab {names};
+    <repeat> exported = go (left | right)+;
+    <dictate> exported = say <dgndictation>;
+"""
+
+def parse(spec):
+    parser = gramparser.GramParser(spec)
+    parser.doParse()
+    parser.checkForErrors()
+    return parser
+
+
+def test_count_and_sentences():
+    analysis = GrammarAnalysis(parse(gramSpec))
+    # (2 * 3 * 2), 2 + 4 with at most two repetitions, 1:
+    assert countGrammarPhrases(parse(gramSpec)) == {'start': 12, 'repeat': 6, 'dictate': 1}
+    assert analysis.totalPhrases() == 19
+    for ruleName in analysis.exportRules:
+        assert len(list(analysis.sentences(ruleName))) == analysis.countPhrases(ruleName)
+    assert list(itertools.islice(analysis.sentences('start'), 3)) == [('open', 'file'), ('open', 'file', 'now'),
+                                                                     ('open', 'window')]
+    assert ('close', 'tab', '{names}', 'now') in analysis.sentences('start')
+    assert list(analysis.sentences('dictate')) == [('say', '<dgndictation>')]
+    assert list(analysis.sentences('repeat'))[2:] == [('go', 'left', 'left'), ('go', 'left', 'right'),
+                                                      ('go', 'right', 'left'), ('go', 'right', 'right')]
+
+
+def test_lists_and_caps():
+    analysis = GrammarAnalysis(parse(gramSpec), maxRepeat=3, lists={'names': ['one', 'two', 'three']})
+    assert analysis.countPhrases('start') == 2*5*2
+    assert analysis.countPhrases('repeat') == 2 + 4 + 8
+    assert ('close', 'tab', 'three') in set(analysis.sentences('start'))
+    with pytest.raises(ValueError):
+        GrammarAnalysis(parse(gramSpec), maxRepeat=0)
+
+
+def test_metrics():
+    analysis = GrammarAnalysis(parse(gramSpec), lists={'names': ['one', 'two', 'three']})
+    start = analysis.ruleMetrics('start')
+    assert (start.phrases, start.depth, start.branching, start.vocabulary) == (20, 3, 3, 9)
+    assert start.words == {'open', 'close', 'file', 'window', 'tab', 'now', 'one', 'two', 'three'}
+    assert str(analysis.ruleMetrics('repeat')) == '<repeat>: 6 phrases, depth 3, branching 2, 3 words'
+    assert analysis.report().splitlines()[0].startswith('<start>: 20 phrases')
+    assert list(analysis.metrics()) == ['start', 'repeat', 'dictate']
+
+
+def test_unpacked_and_recursive():
+    parser = parse(gramSpec)
+    unpacked = GrammarAnalysis(gramparser.unpackGrammar(gramparser.packGrammar(parser)))
+    analysis = GrammarAnalysis(parser)
+    assert {name: unpacked.countPhrases(name) for name in unpacked.exportRules} == countGrammarPhrases(parser)
+    assert set(unpacked.sentences('start')) == set(analysis.sentences('start'))
+
+    recursive = GrammarAnalysis(parse('<start> exported = a <other>; <other> = b | c <start>;'))
+    with pytest.raises(gramparser.GrammarError):
+        recursive.countPhrases('start')
+    with pytest.raises(gramparser.GrammarError):
+        list(recursive.sentences('start'))
+
+
+def test_large_grammar_is_lazy():
+    words = ' | '.join(f'w{i}' for i in range(100))
+    analysis = GrammarAnalysis(parse(f'<w> = {words}; <start> exported = <w> <w> <w> <w> <w>;'))
+    assert analysis.countPhrases('start') == 100**5
+    assert next(analysis.sentences('start')) == ('w0',)*5
+
+
+if __name__ == "__main__":
+    pytest.main(['test_gramanalysis.py'])
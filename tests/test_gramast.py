@@ -0,0 +1,57 @@
+#pylint:disable= C0114, C0116
+import pytest
+
+from natlinkcore.gramast import Alt, List, Opt, Rep, RuleRef, Seq, Word, flatten, unflatten
+from natlinkcore.gramparser import GramParser
+
+
+def parse(gramSpec):
+    parser = GramParser(gramSpec)
+    parser.doParse()
+    return parser
+
+
+def test_rule_tree():
+    parser = parse('<start> exported = hello (world | [big]+ {names}) | <other>; <other> = a (b | c) | d;')
+    assert parser.ruleAsts['start'] == Alt(Seq(Word('hello', 1), Alt(Word('world', 2),
+                                                                      Seq(Rep(Opt(Word('big', 3))), List('names', 1)))),
+                                           RuleRef('other', 2))
+    assert parser.ruleAsts['other'] == Alt(Seq(Word('a', 4), Alt(Word('b', 5), Word('c', 6))), Word('d', 7))
+    for ruleName, tree in parser.ruleAsts.items():
+        assert flatten(tree) == parser.ruleDefines[ruleName]
+
+
+def test_flatten_markers():
+    assert flatten(Word('a', 1)) == [('word', 1)]
+    assert flatten(Opt(Seq(Word('a', 1), List('l', 1)))) == [('start', 4), ('start', 1), ('word', 1), ('list', 1),
+                                                             ('end', 1), ('end', 4)]
+    tree = parse('<start> exported = a | (b c)+;').ruleAsts['start']
+    assert [type(node).__name__ for node in tree.walk()] == ['Alt', 'Word', 'Rep', 'Seq', 'Word', 'Word']
+    with pytest.raises(AttributeError):
+        tree.extra = 1
+
+
+def test_unflatten():
+    parser = parse('<start> exported = hello (world | [big]+ {names}) | <other>; <other> = a (b | c) | d;')
+    names = {'word': {number: name for name, number in parser.knownWords.items()},
+             'list': {number: name for name, number in parser.knownLists.items()},
+             'rule': {number: name for name, number in parser.knownRules.items()}}
+    for ruleName, definition in parser.ruleDefines.items():
+        assert unflatten(definition, names) == parser.ruleAsts[ruleName]
+    assert unflatten([('word', 9)], names) == Word('#9', 9)
+    for definition in ([], [('word', 1), ('word', 2)], [('start', 1), ('word', 1)], [('start', 1), ('end', 2)],
+                       [('start', 5), ('end', 5)], [('dictation', 1)]):
+        with pytest.raises(ValueError):
+            unflatten(definition, names)
+
+
+def test_long_alternatives():
+    n = 2000
+    parser = parse('<start> exported = ' + ' | '.join(f'w{i} x{i}' for i in range(n)) + ';')
+    definition = parser.ruleDefines['start']
+    assert len(definition) == 2 + 4*n
+    assert definition[:4] == [('start', 2), ('start', 1), ('word', 1), ('word', 2)]
+
+
+if __name__ == "__main__":
+    pytest.main(['test_gramast.py'])
@@ -0,0 +1,91 @@
+#pylint:disable= C0114, C0116
+from pathlib import Path
+
+import pytest
+
+from natlinkcore import gramparser
+from natlinkcore.gramcache import GrammarCache
+
+gramSpec = """
+    <start> exported = hello <name> | goodbye {names};
+    <name> = world | everybody;
+"""
+
+def compile_directly(spec):
+    parser = gramparser.GramParser(spec)
+    parser.doParse()
+    parser.checkForErrors()
+    return parser, gramparser.packGrammar(parser)
+
+def test_memory_hits():
+    cache = GrammarCache()
+    parser, gramBin = compile_directly(gramSpec)
+    compiled = cache.get(gramSpec)
+    assert compiled.gramBin == gramBin
+    assert compiled.exportRules == parser.exportRules
+    assert compiled.knownLists == parser.knownLists
+    assert compiled.knownRules == parser.knownRules
+    assert cache.get(gramSpec) is compiled
+    # the same grammar with other indentation, or as a list of lines:
+    assert cache.get(gramSpec.replace('    ', '        ')) is compiled
+    assert cache.get([line for line in gramSpec.split('\n') if line.strip()]) is compiled
+    info = cache.info()
+    assert (info['memory_hits'], info['disk_hits'], info['misses']) == (3, 0, 1)
+    assert info['saved_time'] == pytest.approx(3*compiled.compileTime)
+    assert 'hit rate 75%' in cache.report()
+
+def test_lru_and_errors():
+    cache = GrammarCache(maxsize=2)
+    specs = [f'<start> exported = word{i};' for i in range(3)]
+    for spec in specs:
+        cache.get(spec)
+    assert cache.info()['size'] == 2
+    cache.get(specs[0])
+    assert cache.misses == 4
+
+    with pytest.raises(gramparser.GrammarError):
+        cache.get('<start> = no exported rule;')
+    with pytest.raises(gramparser.GrammarError):
+        cache.get('<start> = no exported rule;')
+    assert cache.misses == 4
+
+def test_disk_store(tmpdir):
+    directory = Path(tmpdir.strpath)/'grammarcache'
+    cache = GrammarCache(directory=directory)
+    compiled = cache.get(gramSpec)
+    assert len(list(directory.glob('*.json'))) == 1
+
+    # a next session:
+    cache2 = GrammarCache(directory=directory)
+    compiled2 = cache2.get(gramSpec)
+    assert (cache2.disk_hits, cache2.misses) == (1, 0)
+    assert compiled2.gramBin == compiled.gramBin
+    assert compiled2.knownRules == compiled.knownRules
+    # the names read from disk are the interned names:
+    assert next(iter(compiled2.exportRules)) is next(iter(compiled.exportRules))
+    cache2.get(gramSpec)
+    assert cache2.memory_hits == 1
+
+    # a damaged file is compiled again:
+    next(directory.glob('*.json')).write_text('{"version": 1, "gramBin": 12')
+    cache3 = GrammarCache(directory=directory)
+    assert cache3.get(gramSpec).gramBin == compiled.gramBin
+    assert (cache3.disk_errors, cache3.misses) == (1, 1)
+
+    cache3.clear(disk=True)
+    assert not list(directory.glob('*.json'))
+
+def test_optimize():
+    cache = GrammarCache(optimize=True)
+    spec = '<start> exported = (open | close) (file | window) | (open | close) (file | window) | open tab;'
+    compiled = cache.get(spec, 'optimized')
+    plain = GrammarCache().get(spec)
+    assert len(compiled.gramBin) < len(plain.gramBin) == compiled.unoptimizedSize
+    assert compiled.knownRules == plain.knownRules
+    assert cache.optimized_sizes == {'optimized': (len(plain.gramBin), len(compiled.gramBin))}
+    assert f'optimized: {len(plain.gramBin)} -> {len(compiled.gramBin)} bytes' in cache.optimize_report()
+    assert cache.key(spec) != GrammarCache().key(spec)
+
+
+if __name__ == "__main__":
+    pytest.main(['test_gramcache.py'])
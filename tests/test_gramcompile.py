@@ -0,0 +1,90 @@
+#pylint:disable= C0114, C0116
+from pathlib import Path
+
+import pytest
+
+from natlinkcore import gramparser
+from natlinkcore.gramcache import GrammarCache
+from natlinkcore.gramcompile import compile_grammars, compile_report, find_grammars, gramspecs_of_source
+
+source = '''
+from natlinkcore import natlinkutils
+NUMBERS = "<number> = one | two | three;"
+
+class ThisGrammar(natlinkutils.GrammarBase):
+    gramSpec = """<start> exported = open <number>;""" + NUMBERS
+
+    def initialize(self):
+        self.load(self.gramSpec)
+        self.load(['<a> exported = a;', '<b> exported = b;'], grammarName='letters')
+        self.load(self.makeSpec())
+
+class OtherGrammar(natlinkutils.GrammarBase):
+    def initialize(self):
+        natlinkutils.GrammarBase.load(self, gramSpec='<bad> exported = (open;')
+        json.load(f)
+'''
+
+def test_gramspecs_of_source():
+    found, skipped = gramspecs_of_source(source, '_this')
+    assert found == [('_this.ThisGrammar', '<start> exported = open <number>;<number> = one | two | three;'),
+                     ('letters', ['<a> exported = a;', '<b> exported = b;']),
+                     ('_this.OtherGrammar', '<bad> exported = (open;')]
+    assert skipped == ['_this.ThisGrammar, line 11: self.makeSpec()']
+
+def write_grammars(tmpdir, n):
+    paths = [Path(tmpdir.join('_this.py').strpath)]
+    paths[0].write_text(source)
+    for i in range(n):
+        path = Path(tmpdir.join(f'spec{i}.gram').strpath)
+        path.write_text(f'<start> exported = hello{i} | world;')
+        paths.append(path)
+    bad_path = Path(tmpdir.join('_bad.py').strpath)
+    bad_path.write_text('def f(:\n')
+    return paths + [bad_path]
+
+def test_compile_and_warm_cache(tmpdir):
+    sources, skipped = find_grammars(write_grammars(tmpdir, 1))
+    assert [name for name, _ in sources] == ['_this.ThisGrammar', 'letters', '_this.OtherGrammar', 'spec0']
+    assert list(skipped)[1].endswith('_bad.py') and 'SyntaxError' in list(skipped.values())[1]
+
+    cache_directory = tmpdir.join('cache').strpath
+    result = compile_grammars(sources, max_workers=1, cache_directory=cache_directory)
+    assert not result['parallel']
+    assert list(result['errors']) == ['_this.OtherGrammar']
+    assert 'expecting' in result['errors']['_this.OtherGrammar'].lower()
+    results = {item['name']: item for item in result['results']}
+    assert results['spec0']['size'] > 0 and results['spec0']['parse'] > 0
+
+    cache = GrammarCache(directory=cache_directory)
+    for name, gramspec in sources:
+        if name != '_this.OtherGrammar':
+            assert cache.get(gramspec).gramBin
+    assert (cache.disk_hits, cache.misses) == (3, 0)
+    # with optimize, the grammars are other entries in the cache:
+    assert GrammarCache(directory=cache_directory, optimize=True).get(sources[0][1]) is not None
+    report = compile_report(result).splitlines()
+    assert report[0].split() == ['parse', 'ms', 'pack', 'ms', 'bytes', 'grammar']
+    assert report[-1].endswith('total of 4 grammars, 1 errors, ' + f'{result["time"]:.2f} seconds')
+    assert len(compile_report(result, max_lines=1).splitlines()) == 3
+
+def test_parallel(tmpdir):
+    sources, _ = find_grammars(write_grammars(tmpdir, 6))
+    result = compile_grammars(sources, max_workers=2, optimize=True)
+    assert result['parallel']
+    assert len(result['results']) == 9 and list(result['errors']) == ['_this.OtherGrammar']
+    serial = compile_grammars(sources, max_workers=1, optimize=True)
+    assert not serial['parallel']
+    assert sorted((item['name'], item['size']) for item in result['results']) == \
+           sorted((item['name'], item['size']) for item in serial['results'])
+
+
+if __name__ == "__main__":
+    pytest.main(['test_gramcompile.py'])
+
+def test_grammar_that_cannot_be_encoded(monkeypatch):
+    monkeypatch.setattr(gramparser, 'preferredencoding', 'cp1252')
+    result = compile_grammars([('a', '<s> exported = 中文;'), ('b', '<s> exported = ok;')], max_workers=1)
+    assert list(result['errors']) == ['a'] and result['errors']['a'].startswith('UnicodeEncodeError: ')
+    results = {item['name']: item for item in result['results']}
+    assert results['b']['size'] > 0 and results['a']['size'] == 0
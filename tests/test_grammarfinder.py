@@ -0,0 +1,62 @@
+#pylint:disable= C0114, C0116, W0621
+import importlib
+import sys
+
+import pytest
+
+from natlinkcore.grammarfinder import GrammarFinder
+
+@pytest.fixture()
+def grammar_dirs(tmpdir):
+    first = tmpdir.mkdir('first')
+    second = tmpdir.mkdir('second')
+    first.join('gf_helper.py').write('origin = "first"')
+    first.join('gf_only_first.py').write('x = 1')
+    second.join('gf_helper.py').write('origin = "second"')
+    package = second.mkdir('gf_package')
+    package.join('__init__.py').write('')
+    package.join('sub.py').write('y = 2')
+    second.mkdir('gf_not_a_package').join('z.py').write('')
+    return first, second
+
+@pytest.fixture()
+def finder(grammar_dirs):
+    finder = GrammarFinder([d.strpath for d in grammar_dirs])
+    finder.install()
+    yield finder
+    finder.uninstall()
+    for name in list(sys.modules):
+        if name.startswith('gf_'):
+            del sys.modules[name]
+
+def test_find_modules_and_packages(finder, grammar_dirs):
+    assert finder in sys.meta_path
+    assert sys.meta_path.index(finder) < sys.meta_path.index(importlib.machinery.PathFinder)
+    # as with sys.path.insert(0, ...) for each directory, the later directory goes first:
+    assert importlib.import_module('gf_helper').origin == 'second'
+    assert importlib.import_module('gf_only_first').x == 1
+    assert importlib.import_module('gf_package.sub').y == 2
+    assert finder.module_names() == ['gf_helper', 'gf_only_first', 'gf_package']
+    assert grammar_dirs[0].strpath not in sys.path
+    with pytest.raises(ImportError):
+        importlib.import_module('gf_not_a_package')
+    # other imports fall through:
+    assert finder.find_spec('json') is None
+
+def test_invalidate_single_directory(finder, grammar_dirs):
+    first, second = grammar_dirs
+    assert finder.find_spec('gf_new') is None
+    rescans = finder.rescans
+    first.join('gf_new.py').write('x = 3')
+    # not seen before invalidation:
+    assert finder.find_spec('gf_new') is None
+    finder.invalidate(first.strpath)
+    assert finder.find_spec('gf_new') is not None
+    assert finder.rescans == rescans + 1
+    second.join('gf_helper.py').remove()
+    importlib.invalidate_caches()
+    assert importlib.import_module('gf_helper').origin == 'first'
+    assert finder.rescans == rescans + 3
+
+if __name__ == "__main__":
+    pytest.main(['test_grammarfinder.py'])
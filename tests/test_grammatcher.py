@@ -0,0 +1,80 @@
+#pylint:disable= C0114, C0116
+import pytest
+
+from natlinkcore import gramparser
+from natlinkcore.grammatcher import GrammarMatcher
+
+gramSpec = """
+    <dgndictation> imported;
+    <dgnletters> imported;
+    <start> exported = open <file> [now] | close {windows}+;
+    <file> = file (one | two) | <number>;
+    <number> = one | two | three;
+    <dictate> exported = dictate <dgndictation> [stop];
+    <spell> exported = spell <dgnletters>;
+"""
+
+@pytest.fixture
+def matcher():
+    m = GrammarMatcher.fromGramSpec(gramSpec)
+    m.setList('windows', ['this', 'that one'])
+    return m
+
+def test_words_and_rule_numbers(matcher):
+    # dgndictation 1, dgnletters 2, start 3, file 4, number 5, dictate 6, spell 7
+    assert matcher.match(['open', 'file', 'two']) == [('open', 3), ('file', 4), ('two', 4)]
+    assert matcher.match(['open', 'three', 'now']) == [('open', 3), ('three', 5), ('now', 3)]
+    assert matcher.match(['open', 'file']) is None
+    assert matcher.match(['open', 'two', 'now', 'now']) is None
+    assert matcher.match([]) is None
+
+def test_lists_and_repeats(matcher):
+    assert matcher.match(['close', 'this']) == [('close', 3), ('this', 3)]
+    assert matcher.match(['close', 'that one', 'this', 'this']) == [('close', 3), ('that one', 3), ('this', 3),
+                                                                    ('this', 3)]
+    assert matcher.match(['close', 'other']) is None
+    matcher.appendList('windows', 'other')
+    assert matcher.match(['close', 'other']) == [('close', 3), ('other', 3)]
+    matcher.emptyList('windows')
+    assert matcher.match(['close', 'this']) is None
+    with pytest.raises(gramparser.GrammarError):
+        matcher.setList('unknown', ['a'])
+
+def test_imported_rules(matcher):
+    assert matcher.match(['dictate', 'hello', 'stop', 'world']) == [('dictate', 6), ('hello', 1), ('stop', 1),
+                                                                    ('world', 1)]
+    assert matcher.match(['dictate', 'hello', 'stop']) == [('dictate', 6), ('hello', 1), ('stop', 6)]
+    assert matcher.match(['dictate']) is None
+    assert matcher.match(['spell', 'a', 'b\\bravo']) == [('spell', 7), ('a', 2), ('b\\bravo', 2)]
+    assert matcher.match(['spell', 'alpha']) is None
+
+def test_active_rules_and_binary(matcher):
+    assert matcher.match(['spell', 'a'], activeRules=['start', 'dictate']) is None
+    assert matcher.match(['open', 'one'], activeRules=['start']) == [('open', 3), ('one', 5)]
+
+    parser = gramparser.GramParser(gramSpec)
+    parser.doParse()
+    from_binary = GrammarMatcher.fromBinary(gramparser.packGrammar(parser))
+    from_binary.setList('windows', ['this'])
+    for words in (['open', 'file', 'one', 'now'], ['close', 'this', 'this'], ['dictate', 'a', 'b'], ['open']):
+        assert from_binary.match(words) == matcher.match(words)
+
+def test_recursive_rule():
+    with pytest.raises(gramparser.GrammarError):
+        GrammarMatcher.fromGramSpec('<start> exported = a <start> | b;')
+
+def test_recognize(matcher):
+    class Grammar:
+        activeRules = {'start': 0}
+        def __init__(self):
+            self.results = []
+        def resultsCallback(self, wordsAndNums, resObj):
+            self.results.append((wordsAndNums, resObj))
+    grammar = Grammar()
+    assert matcher.recognize(grammar, ['open', 'one'], 'resObj') == [('open', 3), ('one', 5)]
+    assert matcher.recognize(grammar, ['spell', 'a']) is None
+    assert grammar.results == [([('open', 3), ('one', 5)], 'resObj')]
+
+
+if __name__ == "__main__":
+    pytest.main(['test_grammatcher.py'])
@@ -0,0 +1,86 @@
+#pylint:disable= C0114, C0116
+import random
+
+import pytest
+
+from natlinkcore import gramparser
+from natlinkcore.gramast import Alt, Opt, Rep, RuleRef, Seq, Word, flatten
+from natlinkcore.gramoptimizer import optimizeGrammar, optimizeNode
+
+
+def parse(gramSpec):
+    parser = gramparser.GramParser(gramSpec)
+    parser.doParse()
+    parser.checkForErrors()
+    return parser
+
+
+def phrases(node, limit=3):
+    """the set of word sequences of a tree, up to limit words
+    """
+    if isinstance(node, (Word, RuleRef)):
+        return {(node.name,)}
+    if isinstance(node, Opt):
+        return {()} | phrases(node.item, limit)
+    if isinstance(node, Rep):
+        once = phrases(node.item, limit)
+        result = current = once
+        for _ in range(limit):
+            current = {a + b for a in current for b in once if len(a + b) <= limit}
+            result = result | current
+        return result
+    if isinstance(node, Alt):
+        return set().union(*(phrases(item, limit) for item in node.items))
+    result = {()}
+    for item in node.items:
+        result = {a + b for a in result for b in phrases(item, limit) if len(a + b) <= limit}
+    return result
+
+
+def test_optimize_examples():
+    a, b, c, d = (Word(name, i) for i, name in enumerate('abcd', 1))
+    assert optimizeNode(Seq(a, Seq(b, c))) == Seq(a, b, c)
+    assert optimizeNode(Alt(Alt(a, b), c, a)) == Alt(a, b, c)
+    assert optimizeNode(Opt(Opt(a))) == Opt(a)
+    assert optimizeNode(Alt(Seq(a, b), Seq(a, c), a)) == Seq(a, Opt(Alt(b, c)))
+    assert optimizeNode(Alt(Seq(a, b, c), Seq(a, b, d), d)) == Alt(Seq(a, b, Alt(c, d)), d)
+
+
+def test_optimizeGrammar():
+    parser = parse('<start> exported = (open | close) (file | window) | open tab | (open | close) (file | window);'
+                   '<other> exported = go <start> | go <start> now;')
+    words, rules = dict(parser.knownWords), dict(parser.knownRules)
+    before = {name: phrases(tree) for name, tree in parser.ruleAsts.items()}
+    report = optimizeGrammar(parser, 'test')
+    assert parser.knownWords == words and parser.knownRules == rules
+    for name, tree in parser.ruleAsts.items():
+        assert phrases(tree) == before[name]
+        assert flatten(tree) == parser.ruleDefines[name]
+    assert report.bytesAfter == len(gramparser.packGrammar(parser))
+    assert report.bytesAfter < report.bytesBefore and report.elementsAfter < report.elementsBefore
+    assert str(report).startswith(f'test: {report.bytesBefore} -> {report.bytesAfter} bytes')
+
+
+def random_tree(rnd, depth=0):
+    r = rnd.random()
+    if depth > 3 or r < 0.3:
+        return Word(rnd.choice('abc'), 0)
+    if r < 0.55:
+        return Seq(*[random_tree(rnd, depth + 1) for _ in range(rnd.randint(2, 3))])
+    if r < 0.85:
+        return Alt(*[random_tree(rnd, depth + 1) for _ in range(rnd.randint(2, 4))])
+    return rnd.choice([Opt, Rep])(random_tree(rnd, depth + 1))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_optimize_keeps_phrases(seed):
+    rnd = random.Random(seed)
+    for _ in range(200):
+        tree = random_tree(rnd)
+        optimized = optimizeNode(tree)
+        assert phrases(optimized) == phrases(tree)
+        assert len(flatten(optimized)) <= len(flatten(tree))
+
+
+if __name__ == "__main__":
+    pytest.main(['test_gramoptimizer.py'])
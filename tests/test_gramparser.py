@@ -2,7 +2,8 @@
 #pylint:disable= C0114, C0116
 import pytest
 
-from natlinkcore.gramparser import GramParser, packGrammar, GrammarSyntaxError, splitApartLines
+from natlinkcore import gramparser
+from natlinkcore.gramparser import GramParser, GramScanner, packGrammar, GrammarSyntaxError, LexicalError, splitApartLines
 
 
 def test_packGrammar():
@@ -108,6 +109,104 @@ def test_recognition_mimic_grammar():
                                                         ('word', 18), ('end', 2)]}
 
 
+def test_packGrammar_buffer(monkeypatch):
+    parser = GramParser('<a> imported; <start> exported = <a> {l} ("b c" | [d])+; <other> exported = e;')
+    parser.doParse()
+    parser.checkForErrors()
+    gramBin = packGrammar(parser)
+    header = gramparser.headerStruct.pack(0, 0)
+    assert gramBin == b''.join([header, gramparser.packGrammarChunk(4, parser.exportRules),
+                                gramparser.packGrammarChunk(5, parser.importRules),
+                                gramparser.packGrammarChunk(6, parser.knownLists),
+                                gramparser.packGrammarChunk(2, parser.knownWords),
+                                gramparser.packGrammarRules(3, parser.knownRules, parser.ruleDefines)])
+    # the elements written with pack_into instead of as an array:
+    monkeypatch.setattr(gramparser, 'elementsAsLongs', False)
+    assert packGrammar(parser) == gramBin
+
+
+def test_encodedNames(monkeypatch):
+    monkeypatch.setattr(gramparser, 'encodedNames', gramparser.EncodedNames())
+    table = gramparser.encodedNames
+    parsers = []
+    for spec in ['<start> exported = hello {names} <other>; <other> = hello world;',
+                 '<other> exported = hello <start> | world; <start> = {names};']:
+        parser = GramParser(spec)
+        parser.doParse()
+        parsers.append(parser)
+    first, second = parsers
+    # the rule and list names of both grammars are the same objects, the words are not interned:
+    for attr in ('knownRules', 'knownLists'):
+        for name in getattr(second, attr):
+            assert name is next(key for key in getattr(first, attr) if key == name)
+    assert next(iter(second.exportRules)) is next(iter(first.knownRules.keys() - {'start'}))
+    assert table.info() == {'entries': 0, 'max_entries': 4096, 'retained_bytes': 0}
+
+    # the chunk entries of the rule and list names are encoded once, the words at each pack:
+    gramBin = packGrammar(first)
+    assert list(table.entries) == ['start', 'names']
+    entry = table.entries['names']
+    assert entry == (gramparser.entryStructs[8], 8, b'names')
+    assert packGrammar(second) and table.entries['names'] is entry
+    assert gramparser.unpackGrammar(gramBin).knownWords == first.knownWords
+    assert table.info()['retained_bytes'] > 0
+    # at most maxEntries are kept, the names encoded first are dropped:
+    table.maxEntries = 2
+    assert list(table.entries) == ['start', 'names', 'other']
+    table.entry('again', gramparser.preferredencoding)
+    assert list(table.entries) == ['other', 'again']
+    assert table.entry('hello', 'utf-16-le')[2] == 'hello'.encode('utf-16-le')
+    assert list(table.entries) == ['hello']
+    assert table.report().startswith('--- encoded grammar names: 1 of at most 2 cached, ')
+    table.clear()
+    assert table.info()['entries'] == table.info()['retained_bytes'] == 0
+
+
+def test_pack_more_names_than_the_cache_keeps(monkeypatch):
+    monkeypatch.setattr(gramparser, 'encodedNames', gramparser.EncodedNames(maxEntries=10))
+    spec = [f'<rule{i}> exported = word{i} {{list{i}}};' for i in range(20)]
+    parser = GramParser(spec)
+    parser.doParse()
+    gramBin = packGrammar(parser)
+    # the last names packed, the lists:
+    assert list(gramparser.encodedNames.entries) == [f'list{i}' for i in range(10, 20)]
+    grammar = gramparser.unpackGrammar(gramBin)
+    assert (grammar.exportRules, grammar.knownLists, grammar.knownWords) == \
+           (parser.exportRules, parser.knownLists, parser.knownWords)
+    assert packGrammar(parser) == gramBin
+
+
+def test_unpackGrammar():
+    parser = GramParser('<a> imported; <b> = x | y; <start> exported = <a> {l} ("b c" | [<b>])+;')
+    parser.doParse()
+    gramBin = packGrammar(parser)
+    grammar = gramparser.unpackGrammar(gramBin)
+    assert grammar.exportRules == parser.exportRules
+    assert grammar.importRules == parser.importRules
+    assert grammar.knownLists == parser.knownLists
+    assert grammar.knownWords == parser.knownWords
+    assert grammar.ruleDefines == {'start': parser.ruleDefines['start'], '#2': parser.ruleDefines['b']}
+    assert grammar.niceDefinitions()['#2'] == [('start', 'AltCode'), ('word', 'x'), ('word', 'y'), ('end', 'AltCode')]
+    assert packGrammar(grammar) == gramBin
+    with pytest.raises(gramparser.GrammarError):
+        gramparser.unpackGrammar(gramBin[:-3])
+
+
+def test_diffGrammars():
+    def compile_spec(gramSpec):
+        parser = GramParser(gramSpec)
+        parser.doParse()
+        return packGrammar(parser)
+    gramBin = compile_spec('<b> = x | y; <start> exported = {l} <b>;')
+    assert gramparser.diffGrammars(gramBin, compile_spec('<b> = x | y; <start> exported = {l} <b>;')) == []
+    assert gramparser.diffGrammars(gramBin, compile_spec('<b> = x | z; <start> exported = {m} <b>;')) == [
+        'lists removed: l', 'lists added: m', 'words removed: y', 'words added: z', 'rule changed: #1',
+        'rule changed: start']
+    assert gramparser.diffGrammars(compile_spec('<a> exported = x; <b> exported = y;'),
+                                   compile_spec('<b> exported = y; <a> exported = x;')) == [
+        'same grammar, with other numbers or order']
+
+
 def test_parse_error():
     gramSpec = "badvalue;"
     parser = GramParser(gramSpec)
@@ -115,6 +214,40 @@ def test_parse_error():
         parser.doParse()
 
 
+def scan_tokens(lines):
+    scanner = GramScanner(lines)
+    tokens = []
+    while scanner.token != '\0':
+        scanner.getAnotherToken()
+        tokens.append((scanner.token, scanner.value, scanner.lastWhiteSpace))
+    return tokens
+
+
+def test_scanner_tokens():
+    tokens = scan_tokens(["<start> exported = 'a b'  # comment", '\t"c" {list}+ word1|(x);'])
+    assert tokens == [('rule', 'start', ''), ('word', 'exported', ' '), ('=', None, ' '),
+                      ('sqword', 'a b', ' '), ('dqword', 'c', '  # comment\n '), ('list', 'list', ' '),
+                      ('+', None, ''), ('word', 'word1', ' '), ('|', None, ''), ('(', None, ''),
+                      ('word', 'x', ''), (')', None, ''), (';', None, ''), ('\0', None, '\n')]
+    # the newlines in the first line do not end it:
+    tokens = scan_tokens(['a "b\nc" # x\ny', 'z'])
+    assert tokens == [('word', 'a', ''), ('dqword', 'b\nc', ' '), ('word', 'z', ' # x\ny\n'), ('\0', None, '\n')]
+
+
+@pytest.mark.parametrize('lines, token, line, start',
+                         [(['<start> = a', ' "open'], 'dqword', 1, 1),
+                          (['<start> = a', '\t{open'], 'list', 1, 1),
+                          (['<start> = "open', 'close";'], 'dqword', 0, 10),
+                          (['<start> = a\xbd;'], 'word', 0, 11),
+                          (['<start> = a_b;'], 'word', 0, 11)])
+def test_scanner_error_positions(lines, token, line, start):
+    scanner = GramScanner(lines)
+    with pytest.raises(LexicalError):
+        while scanner.token != '\0':
+            scanner.getAnotherToken()
+    assert (scanner.token, scanner.line, scanner.start) == (token, line, start)
+
+
 def test_splitApartLines():
     actual = splitApartLines(["This is line one\nThis is line two", "This is line three"])
     expected = ["This is line one", "This is line two", "This is line three"]
@@ -519,6 +519,575 @@ def test_unload_all_loaded_modules(tmpdir, empty_config, logger, monkeypatch):
     assert main.bad_modules == set()
     
 
+def test_scan_cache_of_module_paths(tmpdir, empty_config, logger):
+    config = empty_config
+    config.directories_by_user[''] = [tmpdir.strpath]
+    a_script = tmpdir.join('_a.py')
+    a_path = Path(a_script.strpath)
+    a_script.write("""x=0""")
+    tmpdir.join('not_a_script.txt').write('')
+    os.utime(tmpdir.strpath, ns=(123456000000000, 123456000000000))
+
+    main = NatlinkMain(logger, config)
+    main.__init__(logger=logger, config=config)
+    assert main.module_paths_for_user == [a_path]
+    assert main.get_scan_cache_info() == {'hits': 0, 'misses': 1, 'directories': 1}
+    assert main.module_paths_for_user == [a_path]
+    assert main.get_scan_cache_info() == {'hits': 1, 'misses': 1, 'directories': 1}
+
+    # adding a file changes the mtime of the directory:
+    b_script = tmpdir.join('_b.py')
+    b_path = Path(b_script.strpath)
+    b_script.write("""x=1""")
+    os.utime(tmpdir.strpath, ns=(123457000000000, 123457000000000))
+    assert main.module_paths_for_user == [a_path, b_path]
+    assert main.get_scan_cache_info() == {'hits': 1, 'misses': 2, 'directories': 1}
+
+    # program specific files are filtered from the cached list:
+    c_script = tmpdir.join('calc_extra.py')
+    c_path = Path(c_script.strpath)
+    c_script.write("""x=2""")
+    os.utime(tmpdir.strpath, ns=(123458000000000, 123458000000000))
+    assert main.module_paths_for_user == [a_path, b_path]
+    main.prog_names_visited.add('calc')
+    assert main.module_paths_for_user == [a_path, b_path, c_path]
+    assert main.get_scan_cache_info() == {'hits': 2, 'misses': 3, 'directories': 1}
+    main.prog_names_visited.discard('calc')
+
+def test_load_modules_for_new_program(tmpdir, empty_config, logger, monkeypatch):
+    config = empty_config
+    config.directories_by_user[''] = [tmpdir.strpath]
+    mtime = 123456.0
+    paths = {}
+    for name in ['_a', 'calc', 'calc_extra', 'calculator', 'notepad_b']:
+        script = tmpdir.join(name + '.py')
+        script.write("""x=0""")
+        script.setmtime(mtime)
+        paths[name] = Path(script.strpath)
+    monkeypatch.setattr(time, 'time', lambda: mtime)
+
+    main = NatlinkMain(logger, config)
+    main.__init__(logger=logger, config=config)
+    main.trigger_load()
+    assert set(main.loaded_modules.keys()) == {paths['_a']}
+    assert main.module_paths_for_program('calc') == [paths['calc'], paths['calc_extra']]
+    assert main.module_paths_for_program('calc_extra') == [paths['calc_extra']]
+    assert main.module_paths_for_program('excel') == []
+
+    # a new program only loads its own modules, other modules are not checked:
+    monkeypatch.setattr(main, 'trigger_load', lambda *args, **kwargs: pytest.fail('no full load expected'))
+    main.on_begin_callback(('/programs/calc.exe', 'calculator', 1))
+    assert 'calc' in main.prog_names_visited
+    assert set(main.loaded_modules.keys()) == {paths['_a'], paths['calc'], paths['calc_extra']}
+    main.on_begin_callback(('/programs/notepad.exe', 'notepad', 2))
+    assert set(main.loaded_modules.keys()) == {paths['_a'], paths['calc'], paths['calc_extra'], paths['notepad_b']}
+    assert main.get_scan_cache_info()['misses'] == 1
+
+    # and the full module list agrees with the index:
+    assert set(main.module_paths_for_user) == set(main.loaded_modules.keys())
+    del_loaded_modules(main)
+
+def test_load_stats(tmpdir, empty_config, logger, monkeypatch):
+    config = empty_config
+    config.directories_by_user[''] = [tmpdir.strpath]
+    a_script = tmpdir.join('_a.py')
+    a_path = Path(a_script.strpath)
+    mtime = 123456.0
+    a_script.write("""import time\nx=0\ndef unload():\n    time.sleep(0.02)""")
+    a_script.setmtime(mtime)
+    monkeypatch.setattr(time, 'time', lambda: mtime)
+
+    main = NatlinkMain(logger, config)
+    main.__init__(logger=logger, config=config)
+    main.trigger_load()
+    mtime += 1.0
+    a_script.write("""import time\nx=1\ndef unload():\n    time.sleep(0.02)""")
+    a_script.setmtime(mtime)
+    main.trigger_load()
+
+    stats = main.get_load_stats()
+    a_stats = stats['modules'][str(a_path)]
+    assert a_stats['import']['count'] == 1
+    assert a_stats['reload']['count'] == 1
+    assert a_stats['unload']['count'] == 1
+    # the unload of a reload is counted once, not also in the reload time:
+    assert a_stats['reload']['wall'] < 0.02 <= a_stats['unload']['wall']
+    assert [p['name'] for p in stats['passes']] == ['trigger_load', 'trigger_load']
+    assert stats['passes'][1]['counts'] == {'import': 0, 'reload': 1, 'unload': 1, 'elided': 0}
+    assert str(a_path) in main.get_load_stats_string()
+    assert '--- encoded grammar names: ' in main.get_load_stats_string()
+    main.reset_load_stats()
+    assert main.get_load_stats() == {'modules': {}, 'passes': []}
+    del_loaded_modules(main)
+
+def test_budgeted_loading(tmpdir, empty_config, logger, monkeypatch):
+    config = empty_config
+    config.directories_by_user[''] = [tmpdir.strpath]
+    config.load_budget_ms = 1
+    mtime = 123456.0
+    paths = {}
+    for name in ['_a', '_b', 'calc']:
+        script = tmpdir.join(name + '.py')
+        # each module takes longer than the budget:
+        script.write("""import time\ntime.sleep(0.005)""")
+        script.setmtime(mtime)
+        paths[name] = Path(script.strpath)
+    monkeypatch.setattr(time, 'time', lambda: mtime)
+
+    main = NatlinkMain(logger, config)
+    main.__init__(logger=logger, config=config)
+    timer_states = []
+    monkeypatch.setattr(main, '_set_pending_timer', lambda on: timer_states.append(on))
+    post_loads = []
+    main.set_post_load_callback(lambda: post_loads.append(1))
+    calc_info = ('/programs/calc.exe', 'calculator', 1)
+    main.prev_module_info = calc_info
+    main.prog_names_visited.add('calc')
+
+    # the grammar of the foreground program goes first:
+    main.trigger_load()
+    assert set(main.loaded_modules.keys()) == {paths['calc']}
+    assert main.pending_loads == [paths['_a'], paths['_b']]
+    assert timer_states == [True]
+    assert post_loads == []
+
+    # a timer tick:
+    main._on_pending_timer()
+    assert set(main.loaded_modules.keys()) == {paths['calc'], paths['_a']}
+    assert post_loads == []
+
+    # a begin callback:
+    main.on_begin_callback(calc_info)
+    assert set(main.loaded_modules.keys()) == {paths['calc'], paths['_a'], paths['_b']}
+    assert main.pending_loads == []
+    assert timer_states == [True, True, False]
+    assert post_loads == [1]
+    del_loaded_modules(main)
+
+def test_load_priorities(tmpdir, empty_config, logger, monkeypatch):
+    config = empty_config
+    config.directories_by_user[''] = [tmpdir.strpath]
+    config.load_priorities = {'_z_critical': 'critical', '_a_low': 'low', '_d_low': 'low', '_b_lazy': 'lazy'}
+    mtime = 123456.0
+    paths = {}
+    for name in ['_a_low', '_b_lazy', '_c_normal', '_d_low', '_z_critical']:
+        script = tmpdir.join(name + '.py')
+        script.write("""import sys\nsys.natlink_test_load_order.append(__name__)""")
+        script.setmtime(mtime)
+        paths[name] = Path(script.strpath)
+    monkeypatch.setattr(time, 'time', lambda: mtime)
+    monkeypatch.setattr(sys, 'natlink_test_load_order', [], raising=False)
+
+    main = NatlinkMain(logger, config)
+    main.__init__(logger=logger, config=config)
+    timer_states = []
+    monkeypatch.setattr(main, '_set_pending_timer', lambda on: timer_states.append(on))
+    post_loads = []
+    main.set_post_load_callback(lambda: post_loads.append(1))
+
+    # critical and normal modules are loaded before trigger_load returns, the others in the background:
+    main.trigger_load()
+    assert sys.natlink_test_load_order == ['_z_critical', '_c_normal']
+    assert main.pending_loads == [paths['_a_low'], paths['_d_low']]
+    assert main.lazy_loads == [paths['_b_lazy']]
+    assert timer_states[-1] is True
+    assert post_loads == []
+
+    # one timer tick handles the low priority modules within the background budget,
+    # the post_load callbacks do not wait for the lazy module, that waits for an utterance:
+    main._on_pending_timer()
+    assert sys.natlink_test_load_order == ['_z_critical', '_c_normal', '_a_low', '_d_low']
+    assert main.lazy_loads == [paths['_b_lazy']]
+    assert post_loads == [1]
+
+    main.prog_names_visited.add('calc')
+    main.on_begin_callback(('/programs/calc.exe', 'calculator', 1))
+    assert sys.natlink_test_load_order == ['_z_critical', '_c_normal', '_a_low', '_d_low', '_b_lazy']
+    assert main.pending_loads == main.lazy_loads == []
+    assert post_loads == [1, 1]
+
+    # forced loading handles all modules at once, in priority order:
+    main.trigger_load(force_load=True)
+    assert sys.natlink_test_load_order[5:] == ['_z_critical', '_c_normal', '_a_low', '_d_low', '_b_lazy']
+    assert post_loads == [1, 1, 1]
+    del_loaded_modules(main)
+
+def test_reload_should_skip_touched_unchanged_script(tmpdir, empty_config, logger, monkeypatch):
+    config = empty_config
+    config.directories_by_user[''] = [tmpdir.strpath]
+    a_script = tmpdir.join('_a.py')
+    a_path = Path(a_script.strpath)
+    mtime = 123456.0
+    a_script.write("""x=0""")
+    a_script.setmtime(mtime)
+    monkeypatch.setattr(time, 'time', lambda: mtime)
+
+    main = NatlinkMain(logger, config)
+    main.__init__(logger=logger, config=config)
+    main.load_or_reload_modules(main.module_paths_for_user)
+    module = main.loaded_modules[a_path]
+
+    # same content, newer mtime (touched, or written again by Vocola):
+    mtime += 1.0
+    a_script.write("""x=0""")
+    a_script.setmtime(mtime)
+    main.seen.clear()
+    main.load_or_reload_modules(main.module_paths_for_user)
+    assert main.loaded_modules[a_path] is module
+    assert main.load_stats.count(a_path, 'elided') == 1
+    assert logger.messages['info'] == ['loading module: _a']
+
+    # same size, other content:
+    mtime += 1.0
+    a_script.write("""x=1""")
+    a_script.setmtime(mtime)
+    main.seen.clear()
+    main.load_or_reload_modules(main.module_paths_for_user)
+    assert main.loaded_modules[a_path].x == 1
+    assert main.load_stats.count(a_path, 'reload') == 1
+
+    # force_load always reloads:
+    main.seen.clear()
+    main.load_or_reload_modules(main.module_paths_for_user, force_load=True)
+    assert main.load_stats.count(a_path, 'reload') == 2
+    assert main.load_stats.count(a_path, 'elided') == 1
+    del_loaded_modules(main)
+
+def test_compare_grammar_bins_at_reload(tmpdir, empty_config, logger, monkeypatch):
+    config = empty_config
+    config.directories_by_user[''] = [tmpdir.strpath]
+    a_script = tmpdir.join('_a.py')
+    mtime = 123456.0
+    # a grammar module stores the binaries like GramClassBase.load does:
+    script = """from natlinkcore import gramparser, natlinkutils
+parser = gramparser.GramParser('<start> exported = hello {word};')
+parser.doParse()
+natlinkutils.loadedGrammarBins.setdefault(__name__, {})['same'] = gramparser.packGrammar(parser)
+parser = gramparser.GramParser('<start> exported = {word};')
+parser.doParse()
+natlinkutils.loadedGrammarBins[__name__]['other'] = gramparser.packGrammar(parser)
+"""
+    a_script.write(script)
+    a_script.setmtime(mtime)
+    monkeypatch.setattr(time, 'time', lambda: mtime)
+
+    main = NatlinkMain(logger, config)
+    main.__init__(logger=logger, config=config)
+    main.load_or_reload_modules(main.module_paths_for_user)
+
+    mtime += 1.0
+    a_script.write(script.replace("'<start> exported = {word};'", "'<start> exported = {word} world;'"))
+    a_script.setmtime(mtime)
+    main.seen.clear()
+    main.load_or_reload_modules(main.module_paths_for_user)
+    assert '_a: grammar other changed: words added: world; rule changed: start' in logger.messages['debug']
+    assert '_a: 1 of 2 grammars loaded an identical binary' in logger.messages['debug']
+    loadedGrammarBins.pop('_a', None)
+    del_loaded_modules(main)
+
+def test_grammar_bins_of_removed_module(tmpdir, empty_config, logger):
+    config = empty_config
+    config.directories_by_user[''] = [tmpdir.strpath]
+    a_script = tmpdir.join('_a.py')
+    a_script.write("""from natlinkcore import natlinkutils
+natlinkutils.loadedGrammarBins.setdefault(__name__, {})['grammar'] = b'bin'
+""")
+    main = NatlinkMain(logger, config)
+    main.__init__(logger=logger, config=config)
+    main.load_or_reload_modules(main.module_paths_for_user)
+    assert loadedGrammarBins['_a'] == {'grammar': b'bin'}
+    a_script.remove()
+    main.remove_modules_that_no_longer_exist()
+    assert '_a' not in loadedGrammarBins
+    del_loaded_modules(main)
+
+def test_log_large_grammars(tmpdir, empty_config, logger):
+    config = empty_config
+    config.directories_by_user[''] = [tmpdir.strpath]
+    config.max_grammar_phrases = 100
+    a_script = tmpdir.join('_a.py')
+    # (one | ... | twelve) twice gives 144 phrases, a list counts as one phrase:
+    a_script.write("""from natlinkcore import gramparser, natlinkutils
+numbers = ' | '.join(str(i) for i in range(12))
+for name, gramSpec in [('large', f'<n> = {numbers}; <start> exported = <n> <n>;'), ('small', '<start> exported = {l} <n>; <n> = a | b;')]:
+    parser = gramparser.GramParser(gramSpec)
+    parser.doParse()
+    natlinkutils.loadedGrammarBins.setdefault(__name__, {})[name] = gramparser.packGrammar(parser)
+""")
+    main = NatlinkMain(logger, config)
+    main.__init__(logger=logger, config=config)
+    main.load_or_reload_modules(main.module_paths_for_user)
+    assert logger.messages['warning'] == ['_a: grammar large accepts 144 phrases (max_grammar_phrases: 100), '
+                                          'largest rule <start>: 144 phrases, depth 2, branching 12, 12 words']
+    assert main.log_large_grammars('_a') == ['large']
+    config.max_grammar_phrases = 0
+    assert main.log_large_grammars('_a') == []
+    loadedGrammarBins.pop('_a', None)
+    del_loaded_modules(main)
+
+def test_reload_grammars_that_import_changed_helper(tmpdir, empty_config, logger, monkeypatch):
+    config = empty_config
+    config.directories_by_user[''] = [tmpdir.strpath]
+    monkeypatch.syspath_prepend(tmpdir.strpath)
+    mtime = 123456.0
+    sources = {'dep_base_helper': """VALUE = 1""",
+               'dep_mid_helper': """from dep_base_helper import VALUE\nDOUBLE = VALUE*2""",
+               '_a': """import dep_mid_helper\nx = dep_mid_helper.DOUBLE""",
+               '_b': """x = 0""",
+               '_c': """import dep_base_helper\nx = dep_base_helper.VALUE"""}
+    paths = {}
+    for name, source in sources.items():
+        script = tmpdir.join(name + '.py')
+        script.write(source)
+        script.setmtime(mtime)
+        paths[name] = Path(script.strpath)
+    monkeypatch.setattr(time, 'time', lambda: mtime)
+
+    main = NatlinkMain(logger, config)
+    main.__init__(logger=logger, config=config)
+    try:
+        main.trigger_load()
+        assert set(main.loaded_modules.keys()) == {paths['_a'], paths['_b'], paths['_c']}
+        assert main.loaded_modules[paths['_a']].x == 2
+
+        # change the helper that is imported by _c directly and by _a via dep_mid_helper:
+        mtime += 1.0
+        tmpdir.join('dep_base_helper.py').write("""VALUE = 5""")
+        tmpdir.join('dep_base_helper.py').setmtime(mtime)
+        main.trigger_load()
+        assert main.loaded_modules[paths['_a']].x == 10
+        assert main.loaded_modules[paths['_c']].x == 5
+        assert main.load_stats.count(paths['_a'], 'reload') == 1
+        assert main.load_stats.count(paths['_b'], 'reload') == 0
+        assert main.load_stats.count(paths['_c'], 'reload') == 1
+        helper_reloads = [msg for msg in logger.messages['info'] if msg.startswith('reloading helper')]
+        assert helper_reloads == ['reloading helper module: dep_base_helper', 'reloading helper module: dep_mid_helper']
+
+        # nothing changed, nothing reloaded:
+        main.trigger_load()
+        assert main.load_stats.count(paths['_a'], 'reload') == 1
+
+        # a helper that fails to reload is tried again at the next load pass, its importers are not reloaded:
+        n_messages = len(logger.messages['info'])
+        mtime += 1.0
+        tmpdir.join('dep_base_helper.py').write("""VALUE = (""")
+        tmpdir.join('dep_base_helper.py').setmtime(mtime)
+        main.trigger_load()
+        main.trigger_load()
+        helper_reloads = [msg for msg in logger.messages['info'][n_messages:] if msg.startswith('reloading helper')]
+        assert helper_reloads == ['reloading helper module: dep_base_helper']*2
+        assert main.load_stats.count(paths['_a'], 'reload') == main.load_stats.count(paths['_c'], 'reload') == 1
+
+        # fixed, the helpers and the grammars that import them are reloaded:
+        mtime += 1.0
+        tmpdir.join('dep_base_helper.py').write("""VALUE = 7""")
+        tmpdir.join('dep_base_helper.py').setmtime(mtime)
+        main.trigger_load()
+        assert main.loaded_modules[paths['_a']].x == 14
+        assert main.loaded_modules[paths['_c']].x == 7
+        assert main.load_stats.count(paths['_b'], 'reload') == 0
+    finally:
+        for name in ('dep_base_helper', 'dep_mid_helper'):
+            sys.modules.pop(name, None)
+        del_loaded_modules(main)
+
+def test_warm_start_snapshot(tmpdir, empty_config, logger, monkeypatch):
+    grammar_dir = tmpdir.mkdir('grammars')
+    config = empty_config
+    config.directories_by_user[''] = [grammar_dir.strpath]
+    mtime = 123456.0
+    paths = {}
+    for name, source in [('_a', """x=0"""), ('_bad', """x=; #a syntax error.""")]:
+        script = grammar_dir.join(name + '.py')
+        script.write(source)
+        script.setmtime(mtime)
+        paths[name] = Path(script.strpath)
+    monkeypatch.setattr(time, 'time', lambda: mtime)
+
+    main = NatlinkMain(logger, config)
+    main.__init__(logger=logger, config=config)
+    main.snapshot_path = Path(tmpdir.join('loader_snapshot.json').strpath)
+    main.start_warm_start()
+    assert main.warm_start_info['previous_startup_time'] is None
+    main.trigger_load()
+    assert main.bad_modules == {paths['_bad']}
+    assert main.warm_start_info['skipped_bad_modules'] == 0
+    assert main.snapshot_path.is_file()
+
+    # the next session skips the unchanged bad module:
+    main.__init__(logger=logger, config=config)
+    main.snapshot_path = Path(tmpdir.join('loader_snapshot.json').strpath)
+    main.start_warm_start()
+    assert main.warm_start_info['previous_startup_time'] is not None
+    errors = len(logger.messages['error'])
+    main.trigger_load()
+    assert set(main.loaded_modules.keys()) == {paths['_a']}
+    assert main.bad_modules == {paths['_bad']}
+    assert main.warm_start_info['skipped_bad_modules'] == 1
+    assert 'skipping known bad module (unchanged since the previous session): _bad' in logger.messages['info']
+    # the bad module is not imported again:
+    assert len(logger.messages['error']) == errors
+
+    # once changed, the bad module is tried again:
+    mtime += 1.0
+    grammar_dir.join('_bad.py').write("""x=1""")
+    grammar_dir.join('_bad.py').setmtime(mtime)
+    main.trigger_load()
+    assert set(main.loaded_modules.keys()) == {paths['_a'], paths['_bad']}
+    del_loaded_modules(main)
+
+def test_diff_on_user_changed(tmpdir, empty_config, logger, monkeypatch):
+    config = empty_config
+    config.diff_on_user_changed = True
+    mtime = 123456.0
+    paths = {}
+    for user, name in [('', '_shared'), ('usera', '_a'), ('userb', '_b')]:
+        user_dir = tmpdir.mkdir(user or 'global')
+        config.directories_by_user[user] = [user_dir.strpath]
+        script = user_dir.join(name + '.py')
+        script.write("""x=0\ndef unload():\n    pass""")
+        script.setmtime(mtime)
+        paths[name] = Path(script.strpath)
+    monkeypatch.setattr(time, 'time', lambda: mtime)
+
+    main = NatlinkMain(logger, config)
+    main.__init__(logger=logger, config=config)
+    user_changes = []
+    main.set_on_user_changed_callback(lambda: user_changes.append((main.user, main.language)))
+    main.on_change_callback('user', ('usera', str(tmpdir.join('no_profile'))))
+    assert set(main.loaded_modules.keys()) == {paths['_shared'], paths['_a']}
+    shared = main.loaded_modules[paths['_shared']]
+
+    main.on_change_callback('user', ('userb', str(tmpdir.join('no_profile'))))
+    assert set(main.loaded_modules.keys()) == {paths['_shared'], paths['_b']}
+    # the shared module is not imported again, but notified:
+    assert main.loaded_modules[paths['_shared']] is shared
+    assert main.load_stats.count(paths['_shared'], 'import') == 1
+    assert main.load_stats.count(paths['_shared'], 'unload') == 0
+    assert main.load_stats.count(paths['_a'], 'unload') == 1
+    assert user_changes == [('usera', 'enx'), ('userb', 'enx')]
+
+    # with budgeted loading, the callbacks run when the modules of the new user are loaded:
+    # (a budget that each module exceeds, so one module is loaded per call)
+    config.load_budget_ms = 1e-6
+    monkeypatch.setattr(main, '_set_pending_timer', lambda on: None)
+    main.set_on_user_changed_callback(lambda: user_changes.append(set(main.loaded_modules)))
+    main.on_change_callback('user', ('usera', str(tmpdir.join('no_profile'))))
+    assert main.pending_loads and len(user_changes) == 2
+    main._on_pending_timer()
+    assert main.pending_loads == []
+    assert user_changes[2:] == [('usera', 'enx'), {paths['_shared'], paths['_a']}]
+    del_loaded_modules(main)
+
+def test_grammar_finder(tmpdir, empty_config, logger, monkeypatch):
+    config = empty_config
+    config.directories_by_user[''] = [tmpdir.strpath]
+    mtime = 123456.0
+    tmpdir.join('finder_helper.py').write("""VALUE = 3""")
+    a_script = tmpdir.join('_a.py')
+    a_path = Path(a_script.strpath)
+    a_script.write("""import finder_helper\nx = finder_helper.VALUE""")
+    a_script.setmtime(mtime)
+    monkeypatch.setattr(time, 'time', lambda: mtime)
+
+    main = NatlinkMain(logger, config)
+    main.__init__(logger=logger, config=config)
+    path_before = list(sys.path)
+    main.install_grammar_finder(config.directories)
+    try:
+        assert main.grammar_finder in sys.meta_path
+        main.trigger_load()
+        assert main.loaded_modules[a_path].x == 3
+        assert sys.path == path_before
+
+        # a new helper, found after the next load pass scans the changed directory:
+        tmpdir.join('finder_helper2.py').write("""VALUE = 4""")
+        os.utime(tmpdir.strpath, ns=(123457000000000, 123457000000000))
+        mtime += 1.0
+        a_script.write("""import finder_helper2\nx = finder_helper2.VALUE""")
+        a_script.setmtime(mtime)
+        main.trigger_load()
+        assert main.loaded_modules[a_path].x == 4
+    finally:
+        main.uninstall_grammar_finder()
+        for name in ('finder_helper', 'finder_helper2'):
+            sys.modules.pop(name, None)
+    assert main.grammar_finder is None
+    del_loaded_modules(main)
+
+
+def test_precompile_modules(tmpdir, empty_config, logger, monkeypatch):
+    config = empty_config
+    config.directories_by_user[''] = [tmpdir.strpath]
+    tmpdir.join('_good.py').write("""x=0""")
+    tmpdir.join('_bad.py').write("""x=""")
+
+    main = NatlinkMain(logger, config)
+    main.__init__(logger=logger, config=config)
+    result = main.precompile_modules()
+    assert result['compiled'] == 1
+    assert list(result['errors']) == [tmpdir.join('_bad.py').strpath]
+    assert main.precompile_modules()['fresh'] == 1
+    assert len(logger.messages['warning']) == 2
+
+
+class ReportingWatcher:
+    """stands in for a FileWatcher, reports the changes that are set by the test"""
+    def __init__(self):
+        self.changes = set()
+        self.overflow = False
+
+    def take_changes(self):
+        changes, self.changes = self.changes, set()
+        overflow, self.overflow = self.overflow, False
+        return changes, overflow
+
+def test_trigger_load_with_file_watcher(tmpdir, empty_config, logger, monkeypatch):
+    config = empty_config
+    config.directories_by_user[''] = [tmpdir.strpath]
+    a_script = tmpdir.join('_a.py')
+    a_path = Path(a_script.strpath)
+    mtime = 123456.0
+    a_script.write("""x=0""")
+    a_script.setmtime(mtime)
+    monkeypatch.setattr(time, 'time', lambda: mtime)
+
+    main = NatlinkMain(logger, config)
+    main.__init__(logger=logger, config=config)
+    watcher = ReportingWatcher()
+    main.file_watcher = watcher
+
+    # the first trigger does a full load:
+    main.trigger_load()
+    assert set(main.loaded_modules.keys()) == {a_path}
+
+    # only reported files are handled, without scanning the directory:
+    b_script = tmpdir.join('_b.py')
+    b_path = Path(b_script.strpath)
+    b_script.write("""x=1""")
+    b_script.setmtime(mtime)
+    misses = main.get_scan_cache_info()['misses']
+    main.trigger_load()
+    assert set(main.loaded_modules.keys()) == {a_path}
+    watcher.changes = {b_path}
+    main.trigger_load()
+    assert set(main.loaded_modules.keys()) == {a_path, b_path}
+    assert main.get_scan_cache_info()['misses'] == misses
+
+    # removed files are unloaded:
+    b_script.remove()
+    watcher.changes = {b_path}
+    main.trigger_load()
+    assert set(main.loaded_modules.keys()) == {a_path}
+    assert b_path not in main.load_attempt_times
+
+    # overflow of the watcher gives a full load:
+    watcher.overflow = True
+    main.trigger_load()
+    assert main.get_scan_cache_info()['misses'] == misses + 1
+    main.file_watcher = None
+    del_loaded_modules(main)
+
 
 
 if __name__ == "__main__":
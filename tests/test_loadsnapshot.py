@@ -0,0 +1,54 @@
+#pylint:disable= C0114, C0116
+import hashlib
+import os
+from pathlib import Path
+
+import pytest
+
+from natlinkcore.loadsnapshot import LoadSnapshot
+
+def fingerprint(mod_path: Path):
+    st = mod_path.stat()
+    return st.st_size, st.st_mtime_ns, hashlib.blake2b(mod_path.read_bytes(), digest_size=16).digest()
+
+def test_write_and_read(tmpdir):
+    bad_path = Path(tmpdir.join('_bad.py').strpath)
+    bad_path.write_text('x=')
+    snapshot = LoadSnapshot(startup_time=1.5)
+    snapshot.add_module(bad_path, fingerprint(bad_path), 0, 0.25, True)
+    snapshot_path = Path(tmpdir.join('snapshot.json').strpath)
+    snapshot.write(snapshot_path)
+
+    read_back = LoadSnapshot.read(snapshot_path)
+    assert read_back.startup_time == 1.5
+    assert read_back.load_time(bad_path) == 0.25
+    assert read_back.is_known_bad(bad_path, fingerprint)
+
+    # only the mtime changed:
+    st = bad_path.stat()
+    os.utime(bad_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert read_back.is_known_bad(bad_path, fingerprint)
+
+    # the content changed:
+    bad_path.write_text('x=1')
+    assert not read_back.is_known_bad(bad_path, fingerprint)
+
+def test_read_missing_or_invalid(tmpdir):
+    assert LoadSnapshot.read(Path(tmpdir.join('missing.json').strpath)) is None
+    invalid = tmpdir.join('invalid.json')
+    invalid.write('{not json')
+    assert LoadSnapshot.read(Path(invalid.strpath)) is None
+    other_version = tmpdir.join('other.json')
+    other_version.write('{"version": 0, "modules": {}}')
+    assert LoadSnapshot.read(Path(other_version.strpath)) is None
+
+def test_order_by_cost():
+    snapshot = LoadSnapshot()
+    paths = [Path(f'/grammars/{name}.py') for name in ['__init__', '_slow', '_new', '_fast', '_medium']]
+    for mod_path, load_time in zip(paths, [0.5, 0.3, None, 0.01, 0.1]):
+        if load_time is not None:
+            snapshot.modules[str(mod_path)] = {'load_time': load_time}
+    assert [p.stem for p in snapshot.order_by_cost(paths)] == ['__init__', '_fast', '_medium', '_slow', '_new']
+
+if __name__ == "__main__":
+    pytest.main(['test_loadsnapshot.py'])
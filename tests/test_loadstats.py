@@ -0,0 +1,59 @@
+#pylint:disable= C0114, C0116
+import time
+
+import pytest
+
+from natlinkcore.loadstats import LoadStats
+
+def test_measure_operations():
+    stats = LoadStats()
+    with stats.measure('a.py', 'import'):
+        time.sleep(0.01)
+    with stats.measure('a.py', 'reload'):
+        pass
+    with stats.measure('b.py', 'import'):
+        pass
+    with pytest.raises(ValueError):
+        with stats.measure('b.py', 'import'):
+            raise ValueError('recorded anyway')
+
+    assert stats.count('a.py', 'import') == 1
+    assert stats.count('a.py', 'reload') == 1
+    assert stats.count('a.py', 'unload') == 0
+    assert stats.count('b.py', 'import') == 2
+    assert stats.count('c.py', 'import') == 0
+    stats.note('c.py', 'elided')
+    assert stats.count('c.py', 'elided') == 1
+    a_import = stats.as_dict()['modules']['a.py']['import']
+    assert a_import['wall'] >= 0.01
+    assert a_import['max_wall'] == a_import['last_wall'] == a_import['wall']
+
+    # most expensive module first:
+    report = stats.report()
+    assert report.index('a.py') < report.index('b.py')
+    assert 'b.py' not in stats.report(max_lines=1)
+
+def test_measure_pass():
+    stats = LoadStats(max_passes=2)
+    with stats.measure_pass('first') as pass_stats:
+        with stats.measure('a.py', 'import'):
+            pass
+        # nested passes count in the outer pass:
+        with stats.measure_pass('nested') as nested:
+            assert nested is pass_stats
+            with stats.measure('a.py', 'reload'):
+                pass
+    assert pass_stats.counts == {'import': 1, 'reload': 1, 'unload': 0, 'elided': 0}
+    assert pass_stats.wall >= 0.0
+    assert pass_stats.summary().startswith('first: ')
+    for name in ('second', 'third'):
+        with stats.measure_pass(name):
+            pass
+    assert [p['name'] for p in stats.as_dict()['passes']] == ['second', 'third']
+    assert 'third: ' in stats.report()
+
+    stats.clear()
+    assert stats.as_dict() == {'modules': {}, 'passes': []}
+
+if __name__ == "__main__":
+    pytest.main(['test_loadstats.py'])
@@ -0,0 +1,63 @@
+#pylint:disable= C0114, C0116
+import importlib.util
+import os
+from pathlib import Path
+
+import pytest
+
+from natlinkcore.precompile import bytecode_is_fresh, precompile
+
+def make_files(tmpdir, n):
+    paths = []
+    for i in range(n):
+        path = Path(tmpdir.join(f'_grammar{i}.py').strpath)
+        path.write_text(f'value = {i}\n')
+        paths.append(path)
+    return paths
+
+def test_serial_compile_and_skip(tmpdir):
+    paths = make_files(tmpdir, 2)
+    assert not any(bytecode_is_fresh(p) for p in paths)
+    result = precompile(paths)
+    assert (result['compiled'], result['fresh'], result['errors'], result['parallel']) == (2, 0, {}, False)
+    assert all(bytecode_is_fresh(p) for p in paths)
+    assert all(os.path.isfile(importlib.util.cache_from_source(str(p))) for p in paths)
+
+    result = precompile(paths)
+    assert (result['compiled'], result['fresh']) == (0, 2)
+    result = precompile(paths, force=True)
+    assert (result['compiled'], result['fresh']) == (2, 0)
+
+def test_changed_source_is_stale(tmpdir):
+    path = make_files(tmpdir, 1)[0]
+    precompile([path])
+    path.write_text('value = 12345\n')
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 2*10**9))
+    assert not bytecode_is_fresh(path)
+    assert precompile([path])['compiled'] == 1
+    assert bytecode_is_fresh(path)
+
+def test_errors(tmpdir):
+    paths = make_files(tmpdir, 1)
+    bad_path = Path(tmpdir.join('_bad.py').strpath)
+    bad_path.write_text('x=\n')
+    result = precompile(paths + [bad_path])
+    assert result['compiled'] == 1
+    assert list(result['errors']) == [str(bad_path)]
+    assert 'SyntaxError' in result['errors'][str(bad_path)]
+    assert not bytecode_is_fresh(bad_path)
+
+def test_parallel(tmpdir):
+    paths = make_files(tmpdir, 6)
+    bad_path = Path(tmpdir.join('_bad.py').strpath)
+    bad_path.write_text('def f(:\n')
+    result = precompile(paths + [bad_path], max_workers=2)
+    assert result['parallel']
+    assert result['compiled'] == 6
+    assert list(result['errors']) == [str(bad_path)]
+    assert all(bytecode_is_fresh(p) for p in paths)
+
+
+if __name__ == "__main__":
+    pytest.main(['test_precompile.py'])